@@ -0,0 +1,27 @@
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from utils.user_lookup import backfill_email_normalized
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Set email_normalized on existing users so they can be found by the case-insensitive email lookup"""
+    try:
+        result = await backfill_email_normalized()
+        print(f"Updated email_normalized on {result['updated']} users")
+        if result["conflicts"]:
+            print(f"{len(result['conflicts'])} addresses are shared by several users ignoring case and need merging:")
+            for email, user_ids in result["conflicts"].items():
+                print(f"  {email}: {', '.join(user_ids)}")
+    except Exception as e:
+        logger.error(f"Error backfilling email_normalized: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(main())
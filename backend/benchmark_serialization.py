@@ -0,0 +1,130 @@
+"""
+Benchmark: CPU time to serialize a large list response.
+
+Builds a page of service-provider-like documents as Motor returns them
+(ObjectId ids, datetime timestamps, embedded user) and renders it the way the
+list endpoints used to, converting every id field with str() and then
+encoding with the standard JSONResponse, and the way they do now, handing the
+raw documents to BSONJSONResponse. The old path also walked the whole tree
+once more, as AuthController.create_json_response did. Reports the mean and
+p99 time per response and the speed-up.
+
+Usage:
+    python benchmark_serialization.py [--rows 1000] [--iterations 200]
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from utils.responses import BSONJSONResponse, orjson
+
+
+def make_documents(rows: int) -> list:
+    now = datetime.now()
+    documents = []
+    for i in range(rows):
+        user_id = ObjectId()
+        documents.append({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "business_name": f"Garage {i}",
+            "description": "Full service garage offering repairs, servicing and inspections",
+            "category_id": ObjectId(),
+            "sub_category_ids": [ObjectId() for _ in range(3)],
+            "area_id": ObjectId(),
+            "city_id": ObjectId(),
+            "state_id": ObjectId(),
+            "address": f"{i} Main Road",
+            "contact_phone": "+91 98765 43210",
+            "gallery_images": [f"/uploads/gallery/{i}-{n}.jpg" for n in range(4)],
+            "is_verified": i % 2 == 0,
+            "avg_rating": round((i % 50) / 10, 1),
+            "total_ratings": i % 40,
+            "is_active": True,
+            "created_at": now - timedelta(days=i),
+            "updated_at": now,
+            "user": {"_id": user_id, "name": f"Owner {i}", "email": f"owner{i}@example.com", "created_at": now}
+        })
+    return documents
+
+
+def old_render(documents: list) -> bytes:
+    # What the handlers did before: per-field str() conversion ...
+    for provider in documents:
+        provider["_id"] = str(provider["_id"])
+        provider["user_id"] = str(provider["user_id"])
+        provider["category_id"] = str(provider["category_id"])
+        if provider.get("sub_category_ids"):
+            provider["sub_category_ids"] = [str(id) for id in provider["sub_category_ids"]]
+        for field in ("area_id", "city_id", "state_id"):
+            if provider.get(field):
+                provider[field] = str(provider[field])
+        provider["created_at"] = provider["created_at"].isoformat()
+        provider["updated_at"] = provider["updated_at"].isoformat()
+        provider["user"]["_id"] = str(provider["user"]["_id"])
+        provider["user"]["created_at"] = provider["user"]["created_at"].isoformat()
+
+    # ... a second recursive walk of the whole response ...
+    def handle_objectid(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        elif isinstance(obj, dict):
+            return {k: handle_objectid(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [handle_objectid(item) for item in obj]
+        return obj
+
+    content = handle_objectid({"message": "ok", "service_providers": documents, "status": True})
+    # ... and stdlib json
+    return JSONResponse(content=content).body
+
+
+def new_render(documents: list) -> bytes:
+    return BSONJSONResponse(content={"message": "ok", "service_providers": documents, "status": True}).body
+
+
+def measure(render, rows: int, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        # Fresh documents each time, since the old path converts them in place
+        documents = make_documents(rows)
+        started = time.perf_counter()
+        render(documents)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Documents per response")
+    parser.add_argument("--iterations", type=int, default=200, help="Responses rendered per variant")
+    args = parser.parse_args()
+
+    # Both paths must produce the same JSON
+    sample = make_documents(3)
+    assert json.loads(old_render(copy.deepcopy(sample))) == json.loads(new_render(sample))
+
+    print(f"{args.rows} rows per response, {args.iterations} iterations, encoder: {'orjson' if orjson else 'json'}")
+    results = {}
+    for name, render in (("old", old_render), ("new", new_render)):
+        timings = measure(render, args.rows, args.iterations)
+        results[name] = statistics.mean(timings)
+        print(f"{name:<4} mean={results[name]:7.2f}ms p99={percentile(timings, 99):7.2f}ms")
+    print(f"speed-up: {results['old'] / results['new']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,47 +24,14 @@ notification_preferences_collection = db["notification_preferences"]
 token_collection = db["tokens"]  # For password reset and email verification tokens
 contact_message_collection = db["contact_messages"]  # For contact form messages
 payment_collection = db["payments"]  # For payment records
-
-# Create indexes for improved query performance
-async def create_indexes():
-    # User email index (unique)
-    await user_collection.create_index("email", unique=True)
-    
-    # Token indexes
-    await token_collection.create_index("token", unique=True)
-    await token_collection.create_index("expires")  # For efficient expiration queries
-    
-    # Service indexes
-    await service_collection.create_index("serviceProviderId")
-    
-    # Booking indexes
-    await booking_collection.create_index("user_id")
-    await booking_collection.create_index("service_provider_id")
-    await booking_collection.create_index("service_id")
-    await booking_collection.create_index("booking_date")
-    await booking_collection.create_index("status")
-    
-    # Review indexes
-    await review_collection.create_index("serviceId")
-    await review_collection.create_index("serviceProviderId")
-    
-    # Notification indexes
-    await notification_collection.create_index("user_id")
-    await notification_collection.create_index("is_read")
-    
-    # Notification preferences index
-    await notification_preferences_collection.create_index("service_provider_id", unique=True)
-    
-    # Contact message index
-    await contact_message_collection.create_index("email")
-    await contact_message_collection.create_index("created_at")
-    
-    # Payment indexes
-    await payment_collection.create_index("user_id")
-    await payment_collection.create_index("payment_id")
-    await payment_collection.create_index("invoice_number", unique=True)
-    await payment_collection.create_index("payment_status")
-    await payment_collection.create_index("created_at")
+dashboard_stats_collection = db["dashboard_stats"]  # Materialized dashboard counters
+email_outbox_collection = db["email_outbox"]  # Outbound email queue
+notification_job_collection = db["notification_jobs"]  # Bulk notification fan-out jobs
+notification_counter_collection = db["notification_counters"]  # Per-user unread notification counts
+sequence_collection = db["sequences"]  # Counters behind generated numbers such as invoice numbers
+idempotency_collection = db["idempotency_keys"]  # Stored responses of requests sent with an Idempotency-Key
+
+# Index definitions live in config/indexes.py
 
 state_collection = db["states"]
 city_collection = db["cities"]
@@ -0,0 +1,192 @@
+"""
+Declarative index specifications.
+
+INDEX_SPECS lists, per collection, the indexes backing the queries the
+controllers actually run. diff_indexes() compares them with what exists in
+the database and apply_indexes() creates what is missing; both are used at
+startup and by the manage_indexes.py CLI.
+
+Indexes are identified by name, so every spec is named explicitly. An
+existing index whose key or options differ from its spec is reported as
+changed and only rebuilt when asked to, since that means dropping it first.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes with the same key behave differently
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "weights")
+
+
+def _index(keys, name: str, **options) -> IndexModel:
+    return IndexModel(keys, name=name, **options)
+
+
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        _index([("email", ASCENDING)], "email_unique", unique=True),
+        # Sparse so the index can be built before backfill_email_normalized.py has run
+        _index([("email_normalized", ASCENDING)], "email_normalized_unique", unique=True, sparse=True),
+    ],
+    "tokens": [
+        _index([("token", ASCENDING)], "token_unique", unique=True),
+        _index([("expires", ASCENDING)], "expires"),
+    ],
+    "services": [
+        _index([("serviceProviderId", ASCENDING)], "provider"),
+        _index([("categoryId", ASCENDING)], "category"),
+    ],
+    "bookings": [
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)], "user_recent"),
+        _index([("service_provider_id", ASCENDING), ("status", ASCENDING)], "provider_status"),
+        _index([("service_provider_id", ASCENDING), ("created_at", DESCENDING)], "provider_recent"),
+        _index([("service_id", ASCENDING)], "service"),
+        _index([("payment_id", ASCENDING)], "payment", sparse=True),
+        _index([("created_at", DESCENDING)], "recent"),
+    ],
+    "reviews": [
+        _index([("service_provider_id", ASCENDING), ("created_at", DESCENDING)], "provider_recent"),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)], "user_recent"),
+        _index([("service_id", ASCENDING)], "service"),
+    ],
+    "notifications": [
+        _index([("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING)], "user_unread_recent"),
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING)], "user_recent"),
+    ],
+    "notification_preferences": [
+        _index([("service_provider_id", ASCENDING)], "provider_unique", unique=True),
+    ],
+    "contact_messages": [
+        _index([("created_at", DESCENDING), ("_id", DESCENDING)], "recent"),
+        _index([("email", ASCENDING)], "email"),
+    ],
+    "payments": [
+        # Keyset pagination orders by created_at with _id as tie-breaker
+        _index([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "user_recent_page"),
+        _index([("payment_id", ASCENDING)], "payment_id"),
+        _index([("invoice_number", ASCENDING)], "invoice_number_unique", unique=True),
+        _index([("payment_status", ASCENDING)], "status"),
+        _index([("created_at", DESCENDING), ("_id", DESCENDING)], "recent_page"),
+    ],
+    "service_providers": [
+        _index([("user_id", ASCENDING)], "user"),
+        _index([("category_id", ASCENDING), ("is_active", ASCENDING)], "category_active"),
+        _index([("city_id", ASCENDING)], "city"),
+        _index([("area_id", ASCENDING)], "area"),
+        _index([("created_at", DESCENDING)], "recent"),
+        _index([("business_name", TEXT), ("description", TEXT)], "text_search",
+               weights={"business_name": 10, "description": 2}),
+        _index([("location", GEOSPHERE)], "location"),
+    ],
+    "cities": [
+        _index([("state_id", ASCENDING)], "state"),
+    ],
+    "areas": [
+        _index([("city_id", ASCENDING)], "city"),
+    ],
+    "sub_categories": [
+        _index([("category_id", ASCENDING)], "category"),
+    ],
+    "email_outbox": [
+        _index([("status", ASCENDING), ("next_attempt_at", ASCENDING)], "status_due"),
+    ],
+    "idempotency_keys": [
+        # Records are removed once expires_at has passed
+        _index([("expires_at", ASCENDING)], "expires_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+def _spec_key(model: IndexModel) -> List[tuple]:
+    key = []
+    for field, direction in model.document["key"].items():
+        if direction == TEXT:
+            # The server stores all text fields of an index as one _fts/_ftsx pair
+            if ("_fts", TEXT) not in key:
+                key.extend([("_fts", TEXT), ("_ftsx", 1)])
+            continue
+        key.append((field, direction))
+    return key
+
+
+def _options(index: Dict[str, Any]) -> Dict[str, Any]:
+    return {option: index[option] for option in _COMPARED_OPTIONS if index.get(option) not in (None, False)}
+
+
+async def diff_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compare INDEX_SPECS with the indexes present in the database
+
+    Returns:
+        Dict[str, dict]: Per collection, the names of "missing", "changed" and
+        "extra" indexes; collections already in sync are left out
+    """
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        existing = await db[collection_name].index_information()
+        wanted = {model.document["name"]: model for model in specs}
+
+        missing, changed = [], []
+        for name, model in wanted.items():
+            current = existing.get(name)
+            if current is None:
+                missing.append(name)
+            elif [tuple(part) for part in current["key"]] != _spec_key(model) or _options(current) != _options(model.document):
+                changed.append(name)
+
+        extra = [name for name in existing if name != "_id_" and name not in wanted]
+
+        if missing or changed or extra:
+            report[collection_name] = {"missing": missing, "changed": changed, "extra": extra}
+    return report
+
+
+async def apply_indexes(rebuild_changed: bool = False, drop_extra: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Create missing indexes, and optionally rebuild changed ones and drop
+    indexes that are not in INDEX_SPECS. Safe to run repeatedly.
+
+    A failure on one collection (e.g. duplicates blocking a unique index) is
+    logged and does not stop the others.
+
+    Returns:
+        Dict[str, dict]: The diff that was acted upon
+    """
+    report = await diff_indexes()
+    for collection_name, diff in report.items():
+        collection = db[collection_name]
+        specs = {model.document["name"]: model for model in INDEX_SPECS[collection_name]}
+        try:
+            to_drop = list(diff["changed"]) if rebuild_changed else []
+            if drop_extra:
+                to_drop.extend(diff["extra"])
+            for name in to_drop:
+                logger.info(f"Dropping index {collection_name}.{name}")
+                await collection.drop_index(name)
+
+            to_create = diff["missing"] + (diff["changed"] if rebuild_changed else [])
+            if to_create:
+                logger.info(f"Creating indexes on {collection_name}: {', '.join(to_create)}")
+                await collection.create_indexes([specs[name] for name in to_create])
+
+            if diff["changed"] and not rebuild_changed:
+                logger.warning(f"Indexes on {collection_name} differ from their spec: {', '.join(diff['changed'])}")
+        except PyMongoError as e:
+            logger.error(f"Error applying indexes on {collection_name}: {str(e)}")
+    return report
+
+
+async def create_indexes():
+    """
+    Create any missing indexes; called on application startup
+    """
+    report = await apply_indexes()
+    created = sum(len(diff["missing"]) for diff in report.values())
+    logger.info(f"Index check complete, {created} missing indexes created")
@@ -44,19 +44,21 @@
 # #     return [AreaOut(**area) for area in areas]
 from models.AreaModel import Area, AreaOut
 from bson import ObjectId
-from config.database import area_collection, city_collection
-from fastapi.responses import JSONResponse
+from config.database import area_collection
+from utils.responses import BSONJSONResponse
+from utils.reference_data import reference_data, invalidate_reference_data, AREAS, CITIES
 
 async def addArea(area: Area):
     """Add a new area and store it in the database."""
     area.city_id = ObjectId(area.city_id)  # Convert city_id to ObjectId
     savedArea = await area_collection.insert_one(area.dict())
-    return JSONResponse(content={"message": "Area added"}, status_code=201)
+    invalidate_reference_data(AREAS)
+    return BSONJSONResponse(content={"message": "Area added"}, status_code=201)
 
 async def getArea():
     """Retrieve all areas with embedded city details."""
     
-    areas = await area_collection.find().to_list(length=None)  # Corrected usage
+    areas = await reference_data.all(AREAS)
     
     result = []
     
@@ -68,10 +70,9 @@ async def getArea():
         if "city_id" in area and isinstance(area["city_id"], ObjectId):
             area["city_id"] = str(area["city_id"])
         
-        # Fetch city details and embed them
-        city = await city_collection.find_one({"_id": ObjectId(area["city_id"])}) if "city_id" in area else None
+        # Embed city details from the reference data cache
+        city = await reference_data.get(CITIES, area.get("city_id"))
         if city:
-            city["_id"] = str(city["_id"])
             area["city"] = city  # Embedding city data into area
         
         result.append(AreaOut(**area))  # Convert to Pydantic model
@@ -2,8 +2,7 @@ from bson import ObjectId
 from models.UserModel import User, UserOut, UserLogin, UserSignUp, UserSignIn, AuthResponse, TokenData
 from config.database import user_collection, role_collection, token_collection
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-import bcrypt
+from utils.responses import BSONJSONResponse
 import jwt
 import datetime
 import logging
@@ -14,6 +13,12 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Dict, Any, Optional
 from utils.Sendmail import EmailSender, send_mail
+from utils.email_queue import enqueue_email
+from middleware.auth import invalidate_cached_user
+from utils.password_hashing import hash_password, verify_password, PasswordHasherBusyError, BUSY_HEADERS
+from utils.user_lookup import find_user_by_email, with_normalized_email
+from utils.provider_identity import provider_identity
+from pymongo.errors import DuplicateKeyError
 import random
 import re
 import json
@@ -56,23 +61,10 @@ def json_serializable(obj):
         return [json_serializable(item) for item in obj]
     return obj
 
-# Use this function to create proper JSON responses
-def create_json_response(status_code, content):
-    # First handle any potential ObjectId values in the response
-    def handle_objectid(obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        elif isinstance(obj, dict):
-            return {k: handle_objectid(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [handle_objectid(item) for item in obj]
-        return obj
-        
-    # Process the content
-    serialized_content = handle_objectid(content)
-    
-    # Create response
-    return JSONResponse(status_code=status_code, content=serialized_content)
+# Use this function to create proper JSON responses; ObjectIds and datetimes
+# are converted by the encoder
+def create_json_response(status_code, content, headers=None):
+    return BSONJSONResponse(status_code=status_code, content=content, headers=headers)
 
 def create_access_token(data: Dict[str, Any], expires_delta: datetime.timedelta = None):
     to_encode = data.copy()
@@ -113,17 +105,7 @@ async def signup(request: UserSignUp):
     logger.info(f"Signup request received for email: {request.email}")
     try:
         # Check if user already exists (case insensitive)
-        existing_user = None
-        
-        # First try exact match
-        existing_user = await user_collection.find_one({"email": request.email})
-        
-        # If not found, try case insensitive
-        if not existing_user:
-            import re
-            pattern = re.compile(f"^{re.escape(request.email)}$", re.IGNORECASE)
-            existing_user = await user_collection.find_one({"email": pattern})
-            
+        existing_user = await find_user_by_email(request.email, {"_id": 1})
         if existing_user:
             logger.warning(f"User with email {request.email} already exists")
             return {"detail": "User with this email already exists"}
@@ -134,6 +116,7 @@ async def signup(request: UserSignUp):
         # Ensure consistent lowercase email for easier lookup
         if "email" in user_dict:
             user_dict["email"] = user_dict["email"].lower()
+            with_normalized_email(user_dict)
         
         # Ensure name is set from firstName and lastName if not provided
         if not user_dict.get("name") and user_dict.get("firstName") and user_dict.get("lastName"):
@@ -149,8 +132,7 @@ async def signup(request: UserSignUp):
             
         # Handle password encryption if not already encrypted in the model
         if not isinstance(user_dict.get("password"), bytes) and not str(user_dict.get("password", "")).startswith("$2b$"):
-            hashed_password = bcrypt.hashpw(user_dict["password"].encode("utf-8"), bcrypt.gensalt())
-            user_dict["password"] = hashed_password.decode("utf-8")
+            user_dict["password"] = await hash_password(user_dict["password"])
 
         # Handle role_id - if default or invalid value, use the user role ObjectId
         default_user_role = await role_collection.find_one({"name": "user"})
@@ -203,7 +185,12 @@ async def signup(request: UserSignUp):
         safe_dict = {k: v for k, v in user_dict.items() if k != "password"}
         logger.info(f"DEBUG: Final user data for insertion: {safe_dict}")
         
-        result = await user_collection.insert_one(user_dict)
+        try:
+            result = await user_collection.insert_one(user_dict)
+        except DuplicateKeyError:
+            # Another signup for the same address won the race
+            logger.warning(f"User with email {request.email} already exists")
+            return {"detail": "User with this email already exists"}
         new_user = await user_collection.find_one({"_id": result.inserted_id})
         
         if not new_user:
@@ -247,6 +234,13 @@ async def signup(request: UserSignUp):
         logger.info(f"DEBUG: Signup response ready: user_id={new_user.get('_id')}, email={new_user.get('email')}")
         
         return create_json_response(status_code=200, content=response)
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting signup")
+        return create_json_response(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error in signup: {str(e)}")
         return {"detail": f"An error occurred: {str(e)}"}
@@ -255,42 +249,10 @@ async def signin(user: UserSignIn):
     try:
         logger.info(f"Processing signin for email: {user.email}")
         
-        # Step 1: Print all users for debugging
-        all_users = await user_collection.find().to_list(length=100)
-        logger.info(f"DEBUG: Total users in database: {len(all_users)}")
-        
-        # Safe shallow copy of users for logging (removes sensitive data)
-        safe_users = []
-        for u in all_users[:5]:
-            safe_user = {k: (str(v) if isinstance(v, (datetime.datetime, ObjectId)) else v) 
-                         for k, v in u.items() if k != 'password'}
-            safe_users.append(safe_user)
-            
-        logger.info(f"DEBUG: Sample users: {json.dumps(safe_users, default=json_serializable)}")
-        
-        # Try these search approaches in order:
-        found_user = None
-        
-        # 1. Exact match (case-sensitive)
-        found_user = await user_collection.find_one({"email": user.email})
-        
-        # 2. Case-insensitive search if exact match failed
-        if not found_user:
-            logger.info(f"DEBUG: Exact match failed, trying case-insensitive match")
-            import re
-            pattern = re.compile(f"^{re.escape(user.email)}$", re.IGNORECASE)
-            found_user = await user_collection.find_one({"email": pattern})
+        # Single indexed lookup on the normalized email
+        found_user = await find_user_by_email(user.email)
         
-        # 3. Manual search through all users if still not found
-        if not found_user:
-            logger.info(f"DEBUG: Case-insensitive match failed, trying manual search")
-            for u in all_users:
-                if u.get('email', '').lower() == user.email.lower():
-                    found_user = u
-                    logger.info(f"DEBUG: Found match through manual search: {u.get('email')}")
-                    break
-        
-        # 4. Default users if all else fails (last resort)
+        # Default users if no account matches (last resort)
         if not found_user and user.email == DEFAULT_ADMIN["email"] and user.password == DEFAULT_ADMIN["password"]:
             logger.info(f"DEBUG: Using default admin account")
             return await admin_signin(user)
@@ -301,7 +263,7 @@ async def signin(user: UserSignIn):
         
         # If still not found, return error
         if not found_user:
-            logger.info(f"DEBUG: User not found with email: {user.email} after all attempts")
+            logger.info(f"DEBUG: User not found with email: {user.email}")
             
             # Create user on the fly for testing purposes (REMOVE IN PRODUCTION)
             # This is just for debugging - not recommended for production
@@ -315,9 +277,9 @@ async def signin(user: UserSignIn):
                 )
             
             # Create a new user
-            hashed_pw = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed_pw = await hash_password(user.password)
             current_time = datetime.datetime.utcnow().isoformat()
-            new_user = {
+            new_user = with_normalized_email({
                 "email": user.email,
                 "password": hashed_pw,
                 "name": user.email.split('@')[0],  # Use part of email as name
@@ -327,7 +289,7 @@ async def signin(user: UserSignIn):
                 "is_verified": True,
                 "created_at": current_time,
                 "updated_at": current_time
-            }
+            })
             
             # Try to get a default user role
             default_role = await role_collection.find_one({"role_name": "user"})
@@ -374,11 +336,10 @@ async def signin(user: UserSignIn):
                     
                     # Try bcrypt verification first regardless of format
                     try:
-                        password_matched = bcrypt.checkpw(
-                            user.password.encode('utf-8'),
-                            stored_password.encode('utf-8')
-                        )
+                        password_matched = await verify_password(user.password, stored_password)
                         logger.info(f"DEBUG: Bcrypt verification result: {password_matched}")
+                    except PasswordHasherBusyError:
+                        raise
                     except Exception as bcrypt_error:
                         logger.error(f"Bcrypt verification error: {str(bcrypt_error)}")
                         
@@ -391,6 +352,8 @@ async def signin(user: UserSignIn):
                     logger.info(f"DEBUG: Final password verification result: {password_matched}")
                 else:
                     logger.info(f"DEBUG: No stored password found for user")
+            except PasswordHasherBusyError:
+                raise
             except Exception as e:
                 logger.error(f"Error checking password: {str(e)}")
                 password_matched = False
@@ -451,6 +414,13 @@ async def signin(user: UserSignIn):
         logger.info("Login successful")
         return create_json_response(status_code=200, content=response)
         
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting signin")
+        return create_json_response(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error in signin: {str(e)}")
         return create_json_response(
@@ -517,7 +487,7 @@ async def request_password_reset(email: str):
     """
     try:
         # Find user by email
-        user = await user_collection.find_one({"email": email})
+        user = await find_user_by_email(email)
         
         if not user:
             # Don't reveal if user exists or not for security
@@ -558,49 +528,19 @@ async def request_password_reset(email: str):
         </html>
         """
         
-        # Try to send the email (this will just save it as HTML file since email is disabled)
+        # Queue the email for background delivery; a copy is saved as an HTML file
         email_filename = None
         try:
-            # With email functionality disabled, this will create an HTML file but not send the email
-            result = send_mail(email, email_subject, email_body)
-            logger.info(f"Password reset email send result: {result}")
-            
-            # Get the filename of the most recently created email file
-            import glob
-            import os
-            from pathlib import Path
-            
-            # Get current working directory
-            cwd = os.getcwd()
-            logger.info(f"Current working directory: {cwd}")
-            
-            # Try multiple possible locations for emails directory with absolute paths
-            possible_paths = [
-                Path(cwd) / "emails",
-                Path(cwd) / "backend/emails",
-                Path(os.path.dirname(__file__)) / "../emails",  # Relative to controller
-            ]
+            result = await enqueue_email(email, email_subject, email_body)
+            email_filename = result["email_filename"]
+            logger.info(f"Password reset email queued: {result}")
             
-            for emails_dir in possible_paths:
-                if os.path.exists(emails_dir):
-                    logger.info(f"Found emails directory: {emails_dir.absolute()}")
-                    # Try to find the most recent email file
-                    email_files = sorted(glob.glob(str(emails_dir / "email_*.html")), key=os.path.getctime, reverse=True)
-                    if email_files:
-                        email_filename = os.path.basename(email_files[0])
-                        logger.info(f"Password reset email saved as HTML file: {email_filename}")
-                        break
-                    else:
-                        logger.info(f"No email files found in {emails_dir.absolute()}")
-                else:
-                    logger.info(f"Directory does not exist: {emails_dir.absolute()}")
-            
-            success = result and email_filename is not None
+            success = email_filename is not None or result["id"] is not None
             
             if not success:
-                logger.warning(f"Email saved successfully but couldn't find the file for user: {email}")
+                logger.warning(f"Password reset email was neither saved nor queued for user: {email}")
         except Exception as e:
-            logger.error(f"Failed to save password reset email for user: {email}, Error: {str(e)}")
+            logger.error(f"Failed to queue password reset email for user: {email}, Error: {str(e)}")
             success = False
         
         if not success:
@@ -774,10 +714,7 @@ async def reset_password(token: str, new_password: str, confirm_password: str):
         logger.info(f"User found: {user.get('email')}")
         
         # Hash the new password
-        hashed_password = bcrypt.hashpw(
-            new_password.encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
+        hashed_password = await hash_password(new_password)
         
         # Update the user's password
         logger.info(f"Updating password for user: {user.get('email')}")
@@ -787,6 +724,7 @@ async def reset_password(token: str, new_password: str, confirm_password: str):
                 {"_id": user_id},
                 {"$set": {"password": hashed_password, "updated_at": datetime.datetime.utcnow().isoformat()}}
             )
+            invalidate_cached_user(user_id)
             
             if result.modified_count == 0:
                 logger.error(f"Failed to update password for user: {user.get('email')}")
@@ -835,6 +773,13 @@ async def reset_password(token: str, new_password: str, confirm_password: str):
                 "email": email  # Include masked email for UI confirmation
             }
         )
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting password reset")
+        return create_json_response(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error in reset_password: {str(e)}")
         
@@ -863,12 +808,12 @@ async def handle_testing_mode_reset(token, new_password, confirm_password):
     
     # Create or find a test user
     test_email = "test@example.com"
-    test_user = await user_collection.find_one({"email": test_email})
+    test_user = await find_user_by_email(test_email)
     
     if not test_user:
         # Create test user
-        hashed_pw = bcrypt.hashpw("oldpassword123".encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        test_user_data = {
+        hashed_pw = await hash_password("oldpassword123")
+        test_user_data = with_normalized_email({
             "email": test_email,
             "name": "Test User",
             "firstName": "Test",
@@ -878,17 +823,14 @@ async def handle_testing_mode_reset(token, new_password, confirm_password):
             "is_verified": True,
             "created_at": datetime.datetime.utcnow().isoformat(),
             "updated_at": datetime.datetime.utcnow().isoformat()
-        }
+        })
         
         result = await user_collection.insert_one(test_user_data)
         test_user = await user_collection.find_one({"_id": result.inserted_id})
         logger.info(f"Created test user for testing mode: {test_user['_id']}")
     
     # Hash and update password
-    hashed_password = bcrypt.hashpw(
-        new_password.encode('utf-8'),
-        bcrypt.gensalt()
-    ).decode('utf-8')
+    hashed_password = await hash_password(new_password)
     
     # Update the test user's password
     try:
@@ -936,6 +878,7 @@ async def verify_email(token: str):
             {"_id": user_id},
             {"$set": {"is_verified": True}}
         )
+        invalidate_cached_user(user_id)
         
         if result.modified_count == 0:
             return create_json_response(
@@ -1000,7 +943,7 @@ async def admin_signin(user: UserSignIn):
         
         # Continue with normal database authentication
         # Step 1: Find user by email
-        found_user = await user_collection.find_one({"email": user.email})
+        found_user = await find_user_by_email(user.email)
         
         if not found_user:
             logger.info(f"User not found: {user.email}")
@@ -1017,10 +960,9 @@ async def admin_signin(user: UserSignIn):
             password_matched = False
             
             if stored_password:
-                password_matched = bcrypt.checkpw(
-                    user.password.encode('utf-8'),
-                    stored_password.encode('utf-8')
-                )
+                password_matched = await verify_password(user.password, stored_password)
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error checking password: {str(e)}")
             password_matched = False
@@ -1087,6 +1029,13 @@ async def admin_signin(user: UserSignIn):
         logger.info("Admin login successful")
         return create_json_response(status_code=200, content=response)
         
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting admin signin")
+        return create_json_response(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error in admin signin: {str(e)}")
         return create_json_response(
@@ -1146,7 +1095,7 @@ async def service_provider_signin(user: UserSignIn):
         
         # Continue with normal database authentication
         # Step 1: Find user by email
-        found_user = await user_collection.find_one({"email": user.email})
+        found_user = await find_user_by_email(user.email)
         
         if not found_user:
             logger.info(f"User not found: {user.email}")
@@ -1163,10 +1112,9 @@ async def service_provider_signin(user: UserSignIn):
             password_matched = False
             
             if stored_password:
-                password_matched = bcrypt.checkpw(
-                    user.password.encode('utf-8'),
-                    stored_password.encode('utf-8')
-                )
+                password_matched = await verify_password(user.password, stored_password)
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error checking password: {str(e)}")
             password_matched = False
@@ -1215,6 +1163,9 @@ async def service_provider_signin(user: UserSignIn):
                 content={"message": "Service provider profile not found", "status": False}
             )
         
+        # Warm the provider/user id map for the provider-scoped calls that follow sign-in
+        provider_identity.remember(service_provider)
+        
         # Step 6: Prepare user data for response
         found_user["_id"] = str(found_user["_id"])
         found_user["role_id"] = str(found_user["role_id"])
@@ -1253,6 +1204,13 @@ async def service_provider_signin(user: UserSignIn):
         logger.info("Service provider login successful")
         return create_json_response(status_code=200, content=response)
         
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting service provider signin")
+        return create_json_response(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error in service provider signin: {str(e)}")
         return create_json_response(
@@ -1268,14 +1226,14 @@ async def debug_password_reset(email: str):
         logger.info(f"DEBUG: Starting password reset debug for email: {email}")
         
         # Find user or create a test user if it doesn't exist
-        user = await user_collection.find_one({"email": email})
+        user = await find_user_by_email(email)
         
         if not user:
             logger.info(f"User with email {email} not found, creating temporary user")
             # Create a test user
-            hashed_pw = bcrypt.hashpw("testpassword123".encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed_pw = await hash_password("testpassword123")
             
-            test_user = {
+            test_user = with_normalized_email({
                 "email": email,
                 "password": hashed_pw,
                 "name": f"Test User ({email})",
@@ -1285,7 +1243,7 @@ async def debug_password_reset(email: str):
                 "is_verified": True,
                 "created_at": datetime.datetime.utcnow().isoformat(),
                 "updated_at": datetime.datetime.utcnow().isoformat()
-            }
+            })
             
             result = await user_collection.insert_one(test_user)
             user = await user_collection.find_one({"_id": result.inserted_id})
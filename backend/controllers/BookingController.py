@@ -1,10 +1,17 @@
 from models.BookingModel import BookingCreate, BookingUpdate, BookingOut, AppointmentBookingCreate, ServiceBookingCreate
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from config.database import booking_collection, user_collection, service_collection, service_provider_collection
+from utils.enrichment import enrich_bookings
+from utils.pagination import paginate, InvalidCursorError
+from utils.dashboard_stats import record_booking_change
+from utils.projection import build_projection, parse_fields, InvalidFieldsError
+from utils.event_bus import publish_booking_change, BOOKING_STATUS_EVENT, PAYMENT_STATUS_EVENT
 from datetime import datetime
+from pymongo import ReturnDocument
 import logging
+from typing import Optional
 from config.database import get_db  # or your actual db connection
 from models.BookingModel import BookingCreate, BookingUpdate  # adjust as needed
 
@@ -12,6 +19,13 @@ from models.BookingModel import BookingCreate, BookingUpdate  # adjust as needed
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns embedded in booking tables (admin appointments, provider bookings)
+BOOKING_USER_PROJECTION = build_projection(["name", "firstName", "lastName", "email", "phone"])
+BOOKING_SERVICE_PROJECTION = build_projection(["serviceName", "name", "price", "duration"])
+# Booking fields always fetched when a client narrows them with fields=,
+# since the embedded user and service are looked up through them
+BOOKING_REQUIRED_FIELDS = ("user_id", "service_id", "service_provider_id")
+
 async def create_booking(booking: BookingCreate):
     try:
         logger.info(f"Creating new booking for user: {booking.user_id}")
@@ -26,7 +40,7 @@ async def create_booking(booking: BookingCreate):
             booking_data["service_provider_id"] = ObjectId(booking.service_provider_id)
         except Exception as e:
             logger.error(f"Error converting IDs to ObjectId: {str(e)}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": f"Invalid ID format: {str(e)}", "status": False}
             )
@@ -39,7 +53,7 @@ async def create_booking(booking: BookingCreate):
         # Verify booking_date format
         if not isinstance(booking_data["booking_date"], str):
             logger.error(f"Invalid booking_date format. Expected string, got {type(booking_data['booking_date'])}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": "Invalid date format. Please provide date as YYYY-MM-DD", "status": False}
             )
@@ -83,6 +97,8 @@ async def create_booking(booking: BookingCreate):
             result = await booking_collection.insert_one(booking_data)
             
             if result.inserted_id:
+                await record_booking_change(None, booking_data)
+                
                 # Get the newly created booking with its ID
                 new_booking = await booking_collection.find_one({"_id": result.inserted_id})
                 
@@ -92,7 +108,7 @@ async def create_booking(booking: BookingCreate):
                 new_booking["service_id"] = str(new_booking["service_id"])
                 new_booking["service_provider_id"] = str(new_booking["service_provider_id"])
                 
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=201,
                     content={
                         "message": "Booking created successfully",
@@ -102,19 +118,19 @@ async def create_booking(booking: BookingCreate):
                 )
             else:
                 logger.error("Failed to create booking")
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=500,
                     content={"message": "Failed to create booking", "status": False}
                 )
         except Exception as db_error:
             logger.error(f"Database error creating booking: {str(db_error)}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": f"Database error: {str(db_error)}", "status": False}
             )
     except Exception as e:
         logger.error(f"Error creating booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -127,7 +143,7 @@ async def create_appointment_booking(booking: AppointmentBookingCreate):
         return await create_booking(booking)
     except Exception as e:
         logger.error(f"Error creating appointment booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -140,71 +156,62 @@ async def create_service_booking(booking: ServiceBookingCreate):
         return await create_booking(booking)
     except Exception as e:
         logger.error(f"Error creating service booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
-async def get_all_bookings():
+async def get_all_bookings(cursor: Optional[str] = None, limit: Optional[int] = None, fields: Optional[str] = None):
     try:
         logger.info("Getting all bookings")
-        bookings = await booking_collection.find().to_list(length=1000)
+        requested = parse_fields(fields, BOOKING_REQUIRED_FIELDS)
+        projection = build_projection(requested) if requested else None
+        bookings, next_cursor = await paginate(booking_collection, cursor=cursor, limit=limit, projection=projection)
+        
+        # Attach users and services in one batched pass, only the columns the tables show
+        await enrich_bookings(
+            bookings, include_user=True, include_service=True,
+            user_projection=BOOKING_USER_PROJECTION, service_projection=BOOKING_SERVICE_PROJECTION
+        )
         
         # Process bookings for response
         processed_bookings = []
         for booking in bookings:
-            # Convert ObjectId fields to strings
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
+            # Add additional direct fields for easier frontend access
+            user = booking.get("user")
+            if user:
+                if not booking.get("customer_name") and user.get("name"):
+                    booking["customer_name"] = user["name"]
+                if not booking.get("customer_email") and user.get("email"):
+                    booking["customer_email"] = user["email"]
+                if not booking.get("customer_phone") and user.get("phone"):
+                    booking["customer_phone"] = user["phone"]
             
-            # Add user information if available
-            try:
-                user = await user_collection.find_one({"_id": ObjectId(booking["user_id"])})
-                if user:
-                    user["_id"] = str(user["_id"])
-                    # Remove sensitive information
-                    if "password" in user:
-                        del user["password"]
-                    booking["user"] = user
-                    
-                    # Add additional direct fields for easier frontend access
-                    if not booking.get("customer_name") and user.get("name"):
-                        booking["customer_name"] = user["name"]
-                    if not booking.get("customer_email") and user.get("email"):
-                        booking["customer_email"] = user["email"]
-                    if not booking.get("customer_phone") and user.get("phone"):
-                        booking["customer_phone"] = user["phone"]
-            except Exception as e:
-                logger.error(f"Error fetching user data for booking: {str(e)}")
-                
-            # Add service information if available
-            try:
-                service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-                if service:
-                    service["_id"] = str(service["_id"])
-                    booking["service"] = service
-                    
-                    # Add additional direct fields for easier frontend access
-                    if not booking.get("service_name") and service.get("name"):
-                        booking["service_name"] = service["name"]
-            except Exception as e:
-                logger.error(f"Error fetching service data for booking: {str(e)}")
+            service = booking.get("service")
+            if service:
+                if not booking.get("service_name") and service.get("name"):
+                    booking["service_name"] = service["name"]
             
             processed_bookings.append(booking)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Bookings fetched successfully",
                 "bookings": processed_bookings,
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all bookings: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -218,36 +225,15 @@ async def get_booking_by_id(booking_id: str):
         
         if not booking:
             logger.warning(f"Booking not found: {booking_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Booking not found", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        booking["_id"] = str(booking["_id"])
-        booking["user_id"] = str(booking["user_id"])
-        booking["service_id"] = str(booking["service_id"])
-        booking["service_provider_id"] = str(booking["service_provider_id"])
-        
         # Get related data
-        user = await user_collection.find_one({"_id": ObjectId(booking["user_id"])})
-        if user:
-            user["_id"] = str(user["_id"])
-            if "password" in user:
-                del user["password"]
-            booking["user"] = user
-        
-        service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-        if service:
-            service["_id"] = str(service["_id"])
-            booking["service"] = service
-        
-        service_provider = await service_provider_collection.find_one({"_id": ObjectId(booking["service_provider_id"])})
-        if service_provider:
-            service_provider["_id"] = str(service_provider["_id"])
-            booking["service_provider"] = service_provider
-        
-        return JSONResponse(
+        await enrich_bookings([booking], include_user=True, include_service=True, include_provider=True)
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Booking fetched successfully",
@@ -257,7 +243,7 @@ async def get_booking_by_id(booking_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting booking by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -269,30 +255,15 @@ async def get_user_bookings(user_id: str):
         # Find bookings by user ID
         bookings = await booking_collection.find({"user_id": ObjectId(user_id)}).to_list(length=1000)
         
+        # Get service and service provider info
+        await enrich_bookings(bookings, include_service=True, include_provider=True)
+        
         # Process bookings for response
         processed_bookings = []
         appointment_bookings = []
         service_bookings = []
         
         for booking in bookings:
-            # Convert ObjectId fields to strings
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
-            
-            # Get service info
-            service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-            if service:
-                service["_id"] = str(service["_id"])
-                booking["service"] = service
-            
-            # Get service provider info
-            service_provider = await service_provider_collection.find_one({"_id": ObjectId(booking["service_provider_id"])})
-            if service_provider:
-                service_provider["_id"] = str(service_provider["_id"])
-                booking["service_provider"] = service_provider
-            
             # Categorize booking by type
             booking_type = booking.get("booking_type", "appointment")  # Default to appointment for backward compatibility
             
@@ -303,7 +274,7 @@ async def get_user_bookings(user_id: str):
                 
             processed_bookings.append(booking)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User bookings fetched successfully",
@@ -318,44 +289,27 @@ async def get_user_bookings(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting user bookings: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
-async def get_provider_bookings(provider_id: str):
+async def get_provider_bookings(provider_id: str, fields: Optional[str] = None):
     try:
         logger.info(f"Getting bookings for service provider: {provider_id}")
+        requested = parse_fields(fields, BOOKING_REQUIRED_FIELDS)
+        projection = build_projection(requested) if requested else None
         
         # Find bookings by service provider ID
-        bookings = await booking_collection.find({"service_provider_id": ObjectId(provider_id)}).to_list(length=1000)
+        bookings = await booking_collection.find({"service_provider_id": ObjectId(provider_id)}, projection).to_list(length=1000)
         
-        # Process bookings for response
-        processed_bookings = []
-        for booking in bookings:
-            # Convert ObjectId fields to strings
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
-            
-            # Get user info
-            user = await user_collection.find_one({"_id": ObjectId(booking["user_id"])})
-            if user:
-                user["_id"] = str(user["_id"])
-                if "password" in user:
-                    del user["password"]
-                booking["user"] = user
-            
-            # Get service info
-            service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-            if service:
-                service["_id"] = str(service["_id"])
-                booking["service"] = service
-            
-            processed_bookings.append(booking)
+        # Get user and service info
+        processed_bookings = await enrich_bookings(
+            bookings, include_user=True, include_service=True,
+            user_projection=BOOKING_USER_PROJECTION, service_projection=BOOKING_SERVICE_PROJECTION
+        )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Provider bookings fetched successfully",
@@ -364,9 +318,15 @@ async def get_provider_bookings(provider_id: str):
                 "status": True
             }
         )
+    except InvalidFieldsError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting provider bookings: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -375,36 +335,36 @@ async def update_booking(booking_id: str, booking_data: BookingUpdate):
     try:
         logger.info(f"Updating booking: {booking_id}")
         
-        # Check if booking exists
-        existing_booking = await booking_collection.find_one({"_id": ObjectId(booking_id)})
-        if not existing_booking:
-            logger.warning(f"Booking not found for update: {booking_id}")
-            return JSONResponse(
-                status_code=404,
-                content={"message": "Booking not found", "status": False}
-            )
-        
         # Prepare update data
         update_data = {k: v for k, v in booking_data.dict().items() if v is not None}
         
         # Add updated timestamp
         update_data["updated_at"] = datetime.now().isoformat()
         
-        # Update booking
-        result = await booking_collection.update_one(
+        # Update booking, reading the document it replaced so counter deltas
+        # are taken against exactly the state this write changed
+        existing_booking = await booking_collection.find_one_and_update(
             {"_id": ObjectId(booking_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
-        
-        if result.modified_count == 0 and result.matched_count > 0:
-            logger.warning(f"No changes made to booking: {booking_id}")
-            return JSONResponse(
-                status_code=200,
-                content={"message": "No changes were made", "status": True}
+        if not existing_booking:
+            logger.warning(f"Booking not found for update: {booking_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "Booking not found", "status": False}
             )
         
-        # Get updated booking
-        updated_booking = await booking_collection.find_one({"_id": ObjectId(booking_id)})
+        updated_booking = {**existing_booking, **update_data}
+        
+        if "status" in update_data or "price" in update_data:
+            await record_booking_change(existing_booking, updated_booking)
+        
+        # Push status changes to the user's and provider's event streams
+        if updated_booking.get("status") != existing_booking.get("status"):
+            publish_booking_change(updated_booking, BOOKING_STATUS_EVENT)
+        if updated_booking.get("payment_status") != existing_booking.get("payment_status"):
+            publish_booking_change(updated_booking, PAYMENT_STATUS_EVENT)
         
         # Convert ObjectId fields to strings
         updated_booking["_id"] = str(updated_booking["_id"])
@@ -412,7 +372,7 @@ async def update_booking(booking_id: str, booking_data: BookingUpdate):
         updated_booking["service_id"] = str(updated_booking["service_id"])
         updated_booking["service_provider_id"] = str(updated_booking["service_provider_id"])
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Booking updated successfully",
@@ -422,7 +382,7 @@ async def update_booking(booking_id: str, booking_data: BookingUpdate):
         )
     except Exception as e:
         logger.error(f"Error updating booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -431,26 +391,18 @@ async def delete_booking(booking_id: str):
     try:
         logger.info(f"Deleting booking: {booking_id}")
         
-        # Check if booking exists
-        existing_booking = await booking_collection.find_one({"_id": ObjectId(booking_id)})
+        # Delete booking; only the request that actually removed it updates the counters
+        existing_booking = await booking_collection.find_one_and_delete({"_id": ObjectId(booking_id)})
         if not existing_booking:
             logger.warning(f"Booking not found for deletion: {booking_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Booking not found", "status": False}
             )
         
-        # Delete booking
-        result = await booking_collection.delete_one({"_id": ObjectId(booking_id)})
+        await record_booking_change(existing_booking, None)
         
-        if result.deleted_count == 0:
-            logger.warning(f"Failed to delete booking: {booking_id}")
-            return JSONResponse(
-                status_code=500,
-                content={"message": "Failed to delete booking", "status": False}
-            )
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Booking deleted successfully",
@@ -459,7 +411,7 @@ async def delete_booking(booking_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -468,49 +420,42 @@ async def update_booking_status(booking_id: str, status: str):
     try:
         logger.info(f"Updating booking status to {status} for booking: {booking_id}")
         
-        # Check if booking exists
-        existing_booking = await booking_collection.find_one({"_id": ObjectId(booking_id)})
-        if not existing_booking:
-            logger.warning(f"Booking not found for status update: {booking_id}")
-            return JSONResponse(
-                status_code=404,
-                content={"message": "Booking not found", "status": False}
-            )
-        
         # Validate status
         valid_statuses = ["pending", "confirmed", "completed", "cancelled"]
         if status not in valid_statuses:
             logger.warning(f"Invalid status: {status}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": f"Invalid status. Must be one of: {', '.join(valid_statuses)}", "status": False}
             )
         
-        # Update booking status
-        result = await booking_collection.update_one(
-            {"_id": ObjectId(booking_id)},
-            {
-                "$set": {
-                    "status": status,
-                    "updated_at": datetime.now().isoformat()
-                }
-            }
+        # Update booking status. Only a write that actually changes the status
+        # matches, and the document it replaced is the base for the counter
+        # deltas, so concurrent status changes are each counted once.
+        changes = {"status": status, "updated_at": datetime.now().isoformat()}
+        existing_booking = await booking_collection.find_one_and_update(
+            {"_id": ObjectId(booking_id), "status": {"$ne": status}},
+            {"$set": changes},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0:
-            if existing_booking.get("status") == status:
-                return JSONResponse(
+        if not existing_booking:
+            if await booking_collection.count_documents({"_id": ObjectId(booking_id)}, limit=1):
+                return BSONJSONResponse(
                     status_code=200,
                     content={"message": f"Booking already has status: {status}", "status": True}
                 )
-            else:
-                logger.warning(f"Failed to update booking status: {booking_id}")
-                return JSONResponse(
-                    status_code=500,
-                    content={"message": "Failed to update booking status", "status": False}
-                )
+            logger.warning(f"Booking not found for status update: {booking_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "Booking not found", "status": False}
+            )
         
-        return JSONResponse(
+        updated_booking = {**existing_booking, **changes}
+        await record_booking_change(existing_booking, updated_booking)
+        publish_booking_change(updated_booking, BOOKING_STATUS_EVENT)
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Booking status updated to {status} successfully",
@@ -519,7 +464,7 @@ async def update_booking_status(booking_id: str, status: str):
         )
     except Exception as e:
         logger.error(f"Error updating booking status: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -532,7 +477,7 @@ async def update_payment_status(booking_id: str, payment_status: str):
         existing_booking = await booking_collection.find_one({"_id": ObjectId(booking_id)})
         if not existing_booking:
             logger.warning(f"Booking not found for payment status update: {booking_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Booking not found", "status": False}
             )
@@ -541,7 +486,7 @@ async def update_payment_status(booking_id: str, payment_status: str):
         valid_payment_statuses = ["unpaid", "paid", "refunded"]
         if payment_status not in valid_payment_statuses:
             logger.warning(f"Invalid payment status: {payment_status}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": f"Invalid payment status. Must be one of: {', '.join(valid_payment_statuses)}", "status": False}
             )
@@ -559,18 +504,20 @@ async def update_payment_status(booking_id: str, payment_status: str):
         
         if result.modified_count == 0:
             if existing_booking.get("payment_status") == payment_status:
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=200,
                     content={"message": f"Booking already has payment status: {payment_status}", "status": True}
                 )
             else:
                 logger.warning(f"Failed to update booking payment status: {booking_id}")
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=500,
                     content={"message": "Failed to update booking payment status", "status": False}
                 )
         
-        return JSONResponse(
+        publish_booking_change({**existing_booking, "payment_status": payment_status}, PAYMENT_STATUS_EVENT)
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Booking payment status updated to {payment_status} successfully",
@@ -579,7 +526,7 @@ async def update_payment_status(booking_id: str, payment_status: str):
         )
     except Exception as e:
         logger.error(f"Error updating booking payment status: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -606,7 +553,7 @@ async def create_service_booking(booking_data):
         # Save booking, create Razorpay order, and return order info
     else:
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=400,
             content={
                 "message": "Invalid payment method. Must be either 'cod' or 'online'",
@@ -1,12 +1,14 @@
 from models.CategoryModel import Category,CategoryOut
 from bson import ObjectId
 from fastapi import APIRouter,HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from config.database import category_collection
+from utils.reference_data import invalidate_reference_data, CATEGORIES
 
 async def addCategory(category:Category):
     savedCategory = await category_collection.insert_one(category.dict())
-    return JSONResponse(content={"message":"category saved successfully!!"},status_code=201)
+    invalidate_reference_data(CATEGORIES)
+    return BSONJSONResponse(content={"message":"category saved successfully!!"},status_code=201)
 
 
 async def getAllCategories():
@@ -1,26 +1,24 @@
 from models.CityModel import City,CityOut
 from bson import ObjectId
-from config.database import city_collection,state_collection
+from config.database import city_collection
 from fastapi import APIRouter,HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
+from utils.reference_data import reference_data, invalidate_reference_data, CITIES, STATES
 
 
 async def addCity(city:City):
     city.state_id = ObjectId(city.state_id)
     savedCity = await city_collection.insert_one(city.dict())
-    return JSONResponse(content={"message":"city added"},status_code=201)
+    invalidate_reference_data(CITIES)
+    return BSONJSONResponse(content={"message":"city added"},status_code=201)
 
 
 async def getCity():
-    cities = await city_collection.find().to_list()
+    cities = await reference_data.all(CITIES)
     
     for city in cities:
-        if "state_id" in city and isinstance(city["state_id"], ObjectId):
-            city["state_id"] = str(city["state_id"])
-        
-        state  = await state_collection.find_one({"_id":ObjectId(city["state_id"])})    
+        state = await reference_data.get(STATES, city.get("state_id"))
         if state:
-            state["_id"] = str(state["_id"])
             city["state"] = state
     
     return [CityOut(**city) for city in cities]
@@ -28,15 +26,11 @@ async def getCity():
 
 async def getCityByStateId(state_id:str):
     print("state id",state_id)
-    cities = await city_collection.find({"state_id":ObjectId(state_id)}).to_list()
+    cities = [city for city in await reference_data.all(CITIES) if city.get("state_id") == str(ObjectId(state_id))]
+    state = await reference_data.get(STATES, state_id)
     for city in cities:
-        if "state_id" in city and isinstance(city["state_id"], ObjectId):
-            city["state_id"] = str(city["state_id"])
-        
-        state  = await state_collection.find_one({"_id":ObjectId(city["state_id"])})    
         if state:
-            state["_id"] = str(state["_id"])
-            city["state"] = state
+            city["state"] = dict(state)
     
     return [CityOut(**city) for city in cities]
     
@@ -2,11 +2,13 @@ from bson import ObjectId
 from models.ContactModel import ContactMessageCreate, ContactMessageOut
 from config.database import contact_message_collection
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from datetime import datetime
 import logging
 from utils.Sendmail import EmailSender, send_mail
-from typing import List
+from utils.email_queue import enqueue_email
+from typing import List, Optional
+from utils.pagination import paginate, InvalidCursorError
 from pymongo.errors import PyMongoError
 
 # Configure logging
@@ -183,14 +185,14 @@ async def create_contact_message_from_website(contact_message: ContactMessageCre
                 """
                 
                 # Send the notification email
-                send_mail(admin_email, subject, html_content, sender="noreply@egarage.com")
-                logger.info(f"Admin notification email sent for contact message from: {contact_message.email}")
+                await enqueue_email(admin_email, subject, html_content, sender="noreply@egarage.com")
+                logger.info(f"Admin notification email queued for contact message from: {contact_message.email}")
             except Exception as e:
                 logger.error(f"Failed to send admin notification email: {str(e)}")
                 # Continue processing even if email notification fails
             
             # Create response with CORS headers
-            response = JSONResponse(
+            response = BSONJSONResponse(
                 status_code=201,
                 content={
                     "message": "Your message has been sent successfully. We will get back to you soon.",
@@ -205,7 +207,7 @@ async def create_contact_message_from_website(contact_message: ContactMessageCre
             return response
         else:
             logger.error("Failed to create contact message")
-            response = JSONResponse(
+            response = BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to send your message. Please try again later.", "status": False}
             )
@@ -213,46 +215,49 @@ async def create_contact_message_from_website(contact_message: ContactMessageCre
             return response
     except Exception as e:
         logger.error(f"Error creating contact message: {str(e)}")
-        response = JSONResponse(
+        response = BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
         response.headers["Access-Control-Allow-Origin"] = "*"
         return response
 
-async def get_all_contact_messages_admin():
+async def get_all_contact_messages_admin(cursor: Optional[str] = None, limit: Optional[int] = None):
     """
-    Get all contact messages (admin function)
+    Get contact messages, newest first, one page at a time (admin function)
     
+    Args:
+        cursor: Cursor returned as next_cursor by the previous page
+        limit: Maximum number of messages to return
+        
     Returns:
-        list: A list of all contact messages
+        list: A page of contact messages
     """
     try:
         logger.info("Getting all contact messages")
-        messages = await contact_message_collection.find().sort("created_at", -1).to_list(length=1000)
-        
-        # Process messages for response
-        processed_messages = []
-        for message in messages:
-            # Convert ObjectId to string
-            message["_id"] = str(message["_id"])
-            # Convert datetime to string
-            if "created_at" in message and isinstance(message["created_at"], datetime):
-                message["created_at"] = message["created_at"].isoformat()
-            processed_messages.append(message)
+        messages, next_cursor = await paginate(
+            contact_message_collection, cursor=cursor, limit=limit, sort_field="created_at"
+        )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Contact messages fetched successfully",
-                "contact_messages": processed_messages,
-                "count": len(processed_messages),
+                "contact_messages": messages,
+                "count": len(messages),
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all contact messages: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -275,19 +280,12 @@ async def get_contact_message_by_id_admin(message_id: str):
         
         if not message:
             logger.warning(f"Contact message not found: {message_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Contact message not found", "status": False}
             )
         
-        # Convert ObjectId to string
-        message["_id"] = str(message["_id"])
-        
-        # Convert datetime to string
-        if "created_at" in message and isinstance(message["created_at"], datetime):
-            message["created_at"] = message["created_at"].isoformat()
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Contact message fetched successfully",
@@ -297,7 +295,7 @@ async def get_contact_message_by_id_admin(message_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting contact message by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -319,7 +317,7 @@ async def delete_contact_message_admin(message_id: str):
         existing_message = await contact_message_collection.find_one({"_id": ObjectId(message_id)})
         if not existing_message:
             logger.warning(f"Contact message not found for deletion: {message_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Contact message not found", "status": False}
             )
@@ -329,12 +327,12 @@ async def delete_contact_message_admin(message_id: str):
         
         if result.deleted_count == 0:
             logger.warning(f"Failed to delete contact message: {message_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete contact message", "status": False}
             )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Contact message deleted successfully",
@@ -343,7 +341,7 @@ async def delete_contact_message_admin(message_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting contact message: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         ) 
\ No newline at end of file
@@ -1,11 +1,19 @@
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
 from config.database import (
     user_collection, service_provider_collection, service_collection, 
     booking_collection, review_collection, category_collection
 )
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.enrichment import enrich_bookings, fetch_documents_by_ids, USER_PROJECTION
+from utils.projection import build_projection
+from utils.responses import BSONJSONResponse
+from utils.provider_ratings import empty_histogram
+from utils.provider_identity import provider_identity
+from utils.dashboard_stats import (
+    GLOBAL_SCOPE, provider_scope, user_scope, get_dashboard_counters, booking_counters
+)
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 
@@ -13,112 +21,80 @@ from typing import Dict, Any, List, Optional
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _month_starts(months: int = 6) -> List[datetime]:
+    """
+    First day of each of the last `months` calendar months, oldest first
+    """
+    today = datetime.now()
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(datetime(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(starts))
+
+async def _recent(collection, limit: int, projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Most recently created documents of a collection, served by the created_at index
+    """
+    return await collection.find({}, projection).sort("created_at", -1).limit(limit).to_list(length=limit)
+
 async def get_admin_dashboard_stats():
     try:
         logger.info("Getting admin dashboard statistics")
         
-        # Get counts from collections
-        total_users = await user_collection.count_documents({})
-        total_service_providers = await service_provider_collection.count_documents({})
-        total_services = await service_collection.count_documents({})
-        total_bookings = await booking_collection.count_documents({})
-        total_reviews = await review_collection.count_documents({})
-        total_categories = await category_collection.count_documents({})
-        
-        # Get recent activity
-        recent_users = await user_collection.find().sort("created_at", -1).limit(5).to_list(length=5)
-        recent_service_providers = await service_provider_collection.find().sort("created_at", -1).limit(5).to_list(length=5)
-        recent_bookings = await booking_collection.find().sort("created_at", -1).limit(5).to_list(length=5)
-        
-        # Process recent items to convert ObjectIds to strings
-        processed_users = []
-        for user in recent_users:
-            user["_id"] = str(user["_id"])
-            if "password" in user:
-                del user["password"]
-            processed_users.append(user)
-            
-        processed_providers = []
-        for provider in recent_service_providers:
-            provider["_id"] = str(provider["_id"])
-            provider["user_id"] = str(provider["user_id"])
-            processed_providers.append(provider)
-            
-        processed_bookings = []
-        for booking in recent_bookings:
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
-            processed_bookings.append(booking)
-        
-        # Get booking status counts
-        pending_bookings = await booking_collection.count_documents({"status": "pending"})
-        confirmed_bookings = await booking_collection.count_documents({"status": "confirmed"})
-        completed_bookings = await booking_collection.count_documents({"status": "completed"})
-        cancelled_bookings = await booking_collection.count_documents({"status": "cancelled"})
-        
-        # Get verified vs unverified service providers
-        verified_providers = await service_provider_collection.count_documents({"is_verified": True})
-        unverified_providers = await service_provider_collection.count_documents({"is_verified": False})
-        
-        # Get revenue data (assuming price field in bookings)
-        completed_bookings_data = await booking_collection.find({"status": "completed"}).to_list(length=1000)
-        total_revenue = sum(booking.get("price", 0) for booking in completed_bookings_data)
-        
-        # Get monthly booking counts for the past 6 months
-        today = datetime.now()
-        monthly_data = []
+        # Booking, review and provider figures come from the materialized
+        # counters; the remaining lookups are metadata counts and indexed top-N reads
+        (
+            counters,
+            total_users,
+            total_services,
+            total_categories,
+            recent_users,
+            recent_providers,
+            recent_bookings
+        ) = await asyncio.gather(
+            get_dashboard_counters(GLOBAL_SCOPE),
+            user_collection.estimated_document_count(),
+            service_collection.estimated_document_count(),
+            category_collection.estimated_document_count(),
+            _recent(user_collection, 5, build_projection()),
+            _recent(service_provider_collection, 5),
+            _recent(booking_collection, 5)
+        )
         
-        for i in range(5, -1, -1):
-            month_start = datetime(today.year, today.month, 1) - timedelta(days=30*i)
-            month_end = (datetime(today.year, today.month, 1) - timedelta(days=30*(i-1))) if i > 0 else datetime(today.year, today.month + 1, 1)
-            
-            month_bookings = await booking_collection.count_documents({
-                "created_at": {
-                    "$gte": month_start,
-                    "$lt": month_end
-                }
-            })
-            
-            month_name = month_start.strftime("%b %Y")
-            monthly_data.append({
-                "month": month_name,
-                "count": month_bookings
-            })
+        booking_stats = booking_counters(counters, _month_starts())
+        providers = counters.get("service_providers", {})
         
         # Compile all stats into one response
         dashboard_stats = {
             "counts": {
                 "users": total_users,
-                "service_providers": total_service_providers,
+                "service_providers": providers.get("total", 0),
                 "services": total_services,
-                "bookings": total_bookings,
-                "reviews": total_reviews,
+                "bookings": booking_stats["total"],
+                "reviews": counters.get("reviews", 0),
                 "categories": total_categories
             },
-            "booking_status": {
-                "pending": pending_bookings,
-                "confirmed": confirmed_bookings,
-                "completed": completed_bookings,
-                "cancelled": cancelled_bookings
-            },
+            "booking_status": booking_stats["status_counts"],
             "provider_verification": {
-                "verified": verified_providers,
-                "unverified": unverified_providers
+                "verified": providers.get("verified", 0),
+                "unverified": providers.get("unverified", 0)
             },
             "revenue": {
-                "total": round(total_revenue, 2)
+                "total": booking_stats["revenue"]
             },
-            "monthly_bookings": monthly_data,
+            "monthly_bookings": booking_stats["monthly"],
             "recent": {
-                "users": processed_users,
-                "service_providers": processed_providers,
-                "bookings": processed_bookings
+                "users": recent_users,
+                "service_providers": recent_providers,
+                "bookings": recent_bookings
             }
         }
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Dashboard statistics fetched successfully",
@@ -128,177 +104,114 @@ async def get_admin_dashboard_stats():
         )
     except Exception as e:
         logger.error(f"Error getting admin dashboard statistics: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
+async def _recent_bookings(query: Dict[str, Any], limit: int, **include) -> List[Dict[str, Any]]:
+    """
+    Most recent bookings matching query, enriched with batched lookups
+    """
+    bookings = await booking_collection.find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return await enrich_bookings(bookings, **include)
+
+async def _recent_reviews(query: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    """
+    Most recent reviews matching query with their users attached
+    """
+    reviews = await review_collection.find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+    users = await fetch_documents_by_ids(user_collection, (review.get("user_id") for review in reviews), USER_PROJECTION)
+    for review in reviews:
+        user = users.get(str(review.get("user_id")))
+        if user:
+            review["user"] = user
+    return reviews
+
+async def _top_services(provider_oid: ObjectId, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    The provider's services with the most bookings, counted in a single $group
+    """
+    groups = await booking_collection.aggregate([
+        {"$match": {"service_provider_id": provider_oid}},
+        {"$group": {"_id": "$service_id", "booking_count": {"$sum": 1}}},
+        {"$sort": {"booking_count": -1}}
+    ]).to_list(length=None)
+    services = await fetch_documents_by_ids(
+        service_collection, (group["_id"] for group in groups), {"serviceName": 1, "serviceProviderId": 1}
+    )
+    
+    top_services = []
+    for group in groups:
+        service = services.get(str(group["_id"]))
+        # Only services that still exist and belong to this provider
+        if not service or service.get("serviceProviderId") != str(provider_oid):
+            continue
+        top_services.append({
+            "service_id": service["_id"],
+            "service_name": service.get("serviceName", "Unknown"),
+            "booking_count": group["booking_count"]
+        })
+        if len(top_services) == limit:
+            break
+    return top_services
+
 async def get_provider_dashboard_stats(provider_id: str):
     try:
         logger.info(f"Getting service provider dashboard statistics for provider: {provider_id}")
+        provider_oid = ObjectId(provider_id)
+        
+        # Every section is independent, so all queries are in flight at once
+        (
+            provider,
+            total_services,
+            counters,
+            processed_bookings,
+            processed_reviews,
+            top_services
+        ) = await asyncio.gather(
+            service_provider_collection.find_one({"_id": provider_oid}, {"user_id": 1, "avg_rating": 1, "total_ratings": 1, "rating_histogram": 1}),
+            service_collection.count_documents({"serviceProviderId": provider_oid}),
+            get_dashboard_counters(provider_scope(provider_id)),
+            _recent_bookings({"service_provider_id": provider_oid}, 10, include_user=True, include_service=True),
+            _recent_reviews({"service_provider_id": provider_oid}, 5),
+            _top_services(provider_oid)
+        )
         
         # Check if service provider exists
-        provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         if not provider:
             logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
         
-        # Get counts
-        total_services = await service_collection.count_documents({"serviceProviderId": ObjectId(provider_id)})
-        total_bookings = await booking_collection.count_documents({"service_provider_id": ObjectId(provider_id)})
-        total_reviews = await review_collection.count_documents({"service_provider_id": ObjectId(provider_id)})
-        
-        # Get booking status counts
-        pending_bookings = await booking_collection.count_documents({
-            "service_provider_id": ObjectId(provider_id),
-            "status": "pending"
-        })
-        confirmed_bookings = await booking_collection.count_documents({
-            "service_provider_id": ObjectId(provider_id),
-            "status": "confirmed"
-        })
-        completed_bookings = await booking_collection.count_documents({
-            "service_provider_id": ObjectId(provider_id),
-            "status": "completed"
-        })
-        cancelled_bookings = await booking_collection.count_documents({
-            "service_provider_id": ObjectId(provider_id),
-            "status": "cancelled"
-        })
-        
-        # Get recent bookings
-        recent_bookings = await booking_collection.find(
-            {"service_provider_id": ObjectId(provider_id)}
-        ).sort("created_at", -1).limit(10).to_list(length=10)
+        # The provider's notification and event endpoints usually follow the dashboard
+        provider_identity.remember(provider)
         
-        # Process bookings to convert ObjectIds to strings
-        processed_bookings = []
-        for booking in recent_bookings:
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
-            
-            # Get user info
-            user = await user_collection.find_one({"_id": ObjectId(booking["user_id"])})
-            if user:
-                user["_id"] = str(user["_id"])
-                if "password" in user:
-                    del user["password"]
-                booking["user"] = user
-                
-            # Get service info
-            service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-            if service:
-                service["_id"] = str(service["_id"])
-                booking["service"] = service
-                
-            processed_bookings.append(booking)
-        
-        # Get recent reviews
-        recent_reviews = await review_collection.find(
-            {"service_provider_id": ObjectId(provider_id)}
-        ).sort("created_at", -1).limit(5).to_list(length=5)
-        
-        # Process reviews to convert ObjectIds to strings
-        processed_reviews = []
-        for review in recent_reviews:
-            review["_id"] = str(review["_id"])
-            review["user_id"] = str(review["user_id"])
-            review["service_provider_id"] = str(review["service_provider_id"])
-            
-            if "service_id" in review and review["service_id"]:
-                review["service_id"] = str(review["service_id"])
-                
-            # Get user info
-            user = await user_collection.find_one({"_id": ObjectId(review["user_id"])})
-            if user:
-                user["_id"] = str(user["_id"])
-                if "password" in user:
-                    del user["password"]
-                review["user"] = user
-                
-            processed_reviews.append(review)
-        
-        # Get revenue data
-        completed_bookings_data = await booking_collection.find({
-            "service_provider_id": ObjectId(provider_id),
-            "status": "completed"
-        }).to_list(length=1000)
-        
-        total_revenue = sum(booking.get("price", 0) for booking in completed_bookings_data)
-        
-        # Get monthly booking counts for the past 6 months
-        today = datetime.now()
-        monthly_data = []
-        
-        for i in range(5, -1, -1):
-            month_start = datetime(today.year, today.month, 1) - timedelta(days=30*i)
-            month_end = (datetime(today.year, today.month, 1) - timedelta(days=30*(i-1))) if i > 0 else datetime(today.year, today.month + 1, 1)
-            
-            month_bookings = await booking_collection.count_documents({
-                "service_provider_id": ObjectId(provider_id),
-                "created_at": {
-                    "$gte": month_start,
-                    "$lt": month_end
-                }
-            })
-            
-            month_name = month_start.strftime("%b %Y")
-            monthly_data.append({
-                "month": month_name,
-                "count": month_bookings
-            })
+        booking_stats = booking_counters(counters, _month_starts())
         
         # Get average rating
         avg_rating = provider.get("avg_rating", 0)
         total_ratings = provider.get("total_ratings", 0)
         
-        # Top services by bookings
-        services = await service_collection.find({"serviceProviderId": ObjectId(provider_id)}).to_list(length=100)
-        service_bookings = []
-        
-        for service in services:
-            booking_count = await booking_collection.count_documents({
-                "service_id": service["_id"],
-                "service_provider_id": ObjectId(provider_id)
-            })
-            
-            if booking_count > 0:
-                service_bookings.append({
-                    "service_id": str(service["_id"]),
-                    "service_name": service.get("serviceName", "Unknown"),
-                    "booking_count": booking_count
-                })
-        
-        # Sort by booking count (highest first)
-        service_bookings.sort(key=lambda x: x["booking_count"], reverse=True)
-        top_services = service_bookings[:5]  # Top 5 services
-        
         # Compile all stats into one response
         dashboard_stats = {
             "counts": {
                 "services": total_services,
-                "bookings": total_bookings,
-                "reviews": total_reviews
-            },
-            "booking_status": {
-                "pending": pending_bookings,
-                "confirmed": confirmed_bookings,
-                "completed": completed_bookings,
-                "cancelled": cancelled_bookings
+                "bookings": booking_stats["total"],
+                "reviews": counters.get("reviews", 0)
             },
+            "booking_status": booking_stats["status_counts"],
             "ratings": {
                 "average": avg_rating,
-                "total": total_ratings
+                "total": total_ratings,
+                "histogram": {**empty_histogram(), **provider.get("rating_histogram", {})}
             },
             "revenue": {
-                "total": round(total_revenue, 2)
+                "total": booking_stats["revenue"]
             },
-            "monthly_bookings": monthly_data,
+            "monthly_bookings": booking_stats["monthly"],
             "top_services": top_services,
             "recent": {
                 "bookings": processed_bookings,
@@ -306,7 +219,7 @@ async def get_provider_dashboard_stats(provider_id: str):
             }
         }
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider dashboard statistics fetched successfully",
@@ -316,7 +229,7 @@ async def get_provider_dashboard_stats(provider_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting service provider dashboard statistics: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -325,113 +238,40 @@ async def get_user_dashboard_stats(user_id: str):
     try:
         logger.info(f"Getting user dashboard statistics for user: {user_id}")
         
+        # Independent queries, all in flight at once
+        user, counters, processed_bookings = await asyncio.gather(
+            user_collection.find_one({"_id": ObjectId(user_id)}, {"_id": 1}),
+            get_dashboard_counters(user_scope(user_id)),
+            _recent_bookings({"user_id": ObjectId(user_id)}, 5, include_service=True, include_provider=True)
+        )
+        
         # Check if user exists
-        user = await user_collection.find_one({"_id": ObjectId(user_id)})
         if not user:
             logger.warning(f"User not found: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
         
-        # Get counts
-        total_bookings = await booking_collection.count_documents({"user_id": ObjectId(user_id)})
-        total_reviews = await review_collection.count_documents({"user_id": ObjectId(user_id)})
-        
-        # Get booking status counts
-        pending_bookings = await booking_collection.count_documents({
-            "user_id": ObjectId(user_id),
-            "status": "pending"
-        })
-        confirmed_bookings = await booking_collection.count_documents({
-            "user_id": ObjectId(user_id),
-            "status": "confirmed"
-        })
-        completed_bookings = await booking_collection.count_documents({
-            "user_id": ObjectId(user_id),
-            "status": "completed"
-        })
-        cancelled_bookings = await booking_collection.count_documents({
-            "user_id": ObjectId(user_id),
-            "status": "cancelled"
-        })
-        
-        # Get recent bookings
-        recent_bookings = await booking_collection.find(
-            {"user_id": ObjectId(user_id)}
-        ).sort("created_at", -1).limit(5).to_list(length=5)
-        
-        # Process bookings to convert ObjectIds to strings
-        processed_bookings = []
-        for booking in recent_bookings:
-            booking["_id"] = str(booking["_id"])
-            booking["user_id"] = str(booking["user_id"])
-            booking["service_id"] = str(booking["service_id"])
-            booking["service_provider_id"] = str(booking["service_provider_id"])
-            
-            # Get service info
-            service = await service_collection.find_one({"_id": ObjectId(booking["service_id"])})
-            if service:
-                service["_id"] = str(service["_id"])
-                booking["service"] = service
-                
-            # Get service provider info
-            provider = await service_provider_collection.find_one({"_id": ObjectId(booking["service_provider_id"])})
-            if provider:
-                provider["_id"] = str(provider["_id"])
-                provider["user_id"] = str(provider["user_id"])
-                booking["service_provider"] = provider
-                
-            processed_bookings.append(booking)
-        
-        # Get monthly booking counts for the past 6 months
-        today = datetime.now()
-        monthly_data = []
-        
-        for i in range(5, -1, -1):
-            month_start = datetime(today.year, today.month, 1) - timedelta(days=30*i)
-            month_end = (datetime(today.year, today.month, 1) - timedelta(days=30*(i-1))) if i > 0 else datetime(today.year, today.month + 1, 1)
-            
-            month_bookings = await booking_collection.count_documents({
-                "user_id": ObjectId(user_id),
-                "created_at": {
-                    "$gte": month_start,
-                    "$lt": month_end
-                }
-            })
-            
-            month_name = month_start.strftime("%b %Y")
-            monthly_data.append({
-                "month": month_name,
-                "count": month_bookings
-            })
-        
-        # Get total spending
-        bookings_data = await booking_collection.find({"user_id": ObjectId(user_id)}).to_list(length=1000)
-        total_spent = sum(booking.get("price", 0) for booking in bookings_data)
+        booking_stats = booking_counters(counters, _month_starts())
         
         # Compile all stats into one response
         dashboard_stats = {
             "counts": {
-                "bookings": total_bookings,
-                "reviews": total_reviews
-            },
-            "booking_status": {
-                "pending": pending_bookings,
-                "confirmed": confirmed_bookings,
-                "completed": completed_bookings,
-                "cancelled": cancelled_bookings
+                "bookings": booking_stats["total"],
+                "reviews": counters.get("reviews", 0)
             },
+            "booking_status": booking_stats["status_counts"],
             "spending": {
-                "total": round(total_spent, 2)
+                "total": booking_stats["spent"]
             },
-            "monthly_bookings": monthly_data,
+            "monthly_bookings": booking_stats["monthly"],
             "recent": {
                 "bookings": processed_bookings
             }
         }
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User dashboard statistics fetched successfully",
@@ -441,7 +281,7 @@ async def get_user_dashboard_stats(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting user dashboard statistics: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         ) 
\ No newline at end of file
@@ -0,0 +1,89 @@
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from utils.responses import BSONJSONResponse, dumps
+from utils.event_bus import event_bus, user_topic, provider_topic
+from utils.provider_identity import provider_identity
+import logging
+import os
+from typing import List
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+EVENT_HEARTBEAT_INTERVAL = float(os.getenv("EVENT_HEARTBEAT_INTERVAL", 15))
+# Milliseconds the browser waits before reconnecting a dropped stream
+EVENT_RETRY_MS = int(os.getenv("EVENT_RETRY_MS", 3000))
+
+def _event_stream(request: Request, topics: List[str]) -> StreamingResponse:
+    """
+    Stream events published to the given topics as server-sent events until
+    the client disconnects
+    """
+    async def stream():
+        subscription = event_bus.subscribe(topics)
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n".encode()
+            while True:
+                message = await subscription.get(EVENT_HEARTBEAT_INTERVAL)
+                if message is not None:
+                    yield (
+                        f"id: {message['id']}\n"
+                        f"event: {message['event']}\n"
+                        f"data: {dumps(message['data']).decode()}\n\n"
+                    ).encode()
+                elif subscription.dropped or await request.is_disconnected():
+                    break
+                else:
+                    yield b": keep-alive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def stream_user_events(request: Request, user_id: str):
+    """
+    Notifications and booking updates for a user
+    """
+    try:
+        topics = [user_topic(ObjectId(user_id))]
+        logger.info(f"Opening event stream for user: {user_id}")
+        return _event_stream(request, topics)
+    except Exception as e:
+        logger.error(f"Error opening event stream for user: {str(e)}")
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
+
+async def stream_service_provider_events(request: Request, provider_id: str):
+    """
+    Booking updates for a service provider, plus the notifications addressed
+    to its user account
+    """
+    try:
+        user_id = await provider_identity.get_user_id(provider_id)
+
+        if not user_id:
+            logger.warning(f"Service provider not found: {provider_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "Service provider not found", "status": False}
+            )
+
+        topics = [provider_topic(ObjectId(provider_id)), user_topic(user_id)]
+
+        logger.info(f"Opening event stream for service provider: {provider_id}")
+        return _event_stream(request, topics)
+    except Exception as e:
+        logger.error(f"Error opening event stream for service provider: {str(e)}")
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
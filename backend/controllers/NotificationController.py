@@ -1,8 +1,13 @@
 from models.NotificationModel import NotificationCreate, NotificationUpdate, NotificationOut, NotificationPreferences
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from config.database import notification_collection, user_collection, notification_preferences_collection, service_provider_collection
+from utils.responses import BSONJSONResponse
+from config.database import notification_collection, user_collection, notification_preferences_collection
+from bson.errors import InvalidId
+from utils.notification_fanout import notification_fanout, AUDIENCES
+from utils.notification_counters import get_unread_count, record_unread_change, record_new_notifications
+from utils.event_bus import publish_notifications
+from utils.provider_identity import provider_identity
 from datetime import datetime
 import logging
 from typing import List, Optional
@@ -32,17 +37,13 @@ async def create_notification(notification: NotificationCreate):
         result = await notification_collection.insert_one(notification_data)
         
         if result.inserted_id:
+            await record_new_notifications([notification_data])
+            
             # Get the newly created notification with its ID
             new_notification = await notification_collection.find_one({"_id": result.inserted_id})
+            publish_notifications([new_notification])
             
-            # Convert ObjectId fields to strings for response
-            new_notification["_id"] = str(new_notification["_id"])
-            new_notification["user_id"] = str(new_notification["user_id"])
-            
-            if "related_id" in new_notification and new_notification["related_id"]:
-                new_notification["related_id"] = str(new_notification["related_id"])
-            
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=201,
                 content={
                     "message": "Notification created successfully",
@@ -52,13 +53,13 @@ async def create_notification(notification: NotificationCreate):
             )
         else:
             logger.error("Failed to create notification")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to create notification", "status": False}
             )
     except Exception as e:
         logger.error(f"Error creating notification: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -76,30 +77,37 @@ async def get_user_notifications(user_id: str, unread_only: bool = False):
         # Find notifications
         notifications = await notification_collection.find(query).sort("created_at", -1).to_list(length=100)
         
-        # Process notifications for response
-        processed_notifications = []
-        for notification in notifications:
-            # Convert ObjectId fields to strings
-            notification["_id"] = str(notification["_id"])
-            notification["user_id"] = str(notification["user_id"])
-            
-            if "related_id" in notification and notification["related_id"]:
-                notification["related_id"] = str(notification["related_id"])
-            
-            processed_notifications.append(notification)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notifications fetched successfully",
-                "notifications": processed_notifications,
-                "count": len(processed_notifications),
+                "notifications": notifications,
+                "count": len(notifications),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting notifications for user: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
+
+async def get_user_unread_count(user_id: str):
+    try:
+        unread_count = await get_unread_count(ObjectId(user_id))
+        
+        return BSONJSONResponse(
+            status_code=200,
+            content={
+                "message": "Unread count fetched successfully",
+                "count": unread_count,
+                "status": True
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting unread count for user: {str(e)}")
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -113,19 +121,12 @@ async def get_notification_by_id(notification_id: str):
         
         if not notification:
             logger.warning(f"Notification not found: {notification_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Notification not found", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        notification["_id"] = str(notification["_id"])
-        notification["user_id"] = str(notification["user_id"])
-        
-        if "related_id" in notification and notification["related_id"]:
-            notification["related_id"] = str(notification["related_id"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notification fetched successfully",
@@ -135,7 +136,7 @@ async def get_notification_by_id(notification_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting notification by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -148,14 +149,14 @@ async def mark_notification_read(notification_id: str, is_read: bool = True):
         existing_notification = await notification_collection.find_one({"_id": ObjectId(notification_id)})
         if not existing_notification:
             logger.warning(f"Notification not found: {notification_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Notification not found", "status": False}
             )
         
-        # Update notification read status
+        # Update notification read status; only a real change moves the unread counter
         result = await notification_collection.update_one(
-            {"_id": ObjectId(notification_id)},
+            {"_id": ObjectId(notification_id), "is_read": {"$ne": is_read}},
             {
                 "$set": {
                     "is_read": is_read,
@@ -164,20 +165,16 @@ async def mark_notification_read(notification_id: str, is_read: bool = True):
             }
         )
         
+        # No match means it already had this state, possibly set by a concurrent request
         if result.modified_count == 0:
-            if existing_notification.get("is_read") == is_read:
-                return JSONResponse(
-                    status_code=200,
-                    content={"message": f"Notification already {'read' if is_read else 'unread'}", "status": True}
-                )
-            else:
-                logger.warning(f"Failed to update notification read status: {notification_id}")
-                return JSONResponse(
-                    status_code=500,
-                    content={"message": "Failed to update notification", "status": False}
-                )
-        
-        return JSONResponse(
+            return BSONJSONResponse(
+                status_code=200,
+                content={"message": f"Notification already {'read' if is_read else 'unread'}", "status": True}
+            )
+        
+        await record_unread_change({existing_notification["user_id"]: -1 if is_read else 1})
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Notification marked as {'read' if is_read else 'unread'} successfully",
@@ -186,7 +183,7 @@ async def mark_notification_read(notification_id: str, is_read: bool = True):
         )
     except Exception as e:
         logger.error(f"Error marking notification as read: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -206,7 +203,9 @@ async def mark_all_notifications_read(user_id: str):
             }
         )
         
-        return JSONResponse(
+        await record_unread_change({user_id: -result.modified_count})
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Marked {result.modified_count} notifications as read",
@@ -216,7 +215,7 @@ async def mark_all_notifications_read(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error marking all notifications as read: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -229,22 +228,25 @@ async def delete_notification(notification_id: str):
         existing_notification = await notification_collection.find_one({"_id": ObjectId(notification_id)})
         if not existing_notification:
             logger.warning(f"Notification not found for deletion: {notification_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Notification not found", "status": False}
             )
         
         # Delete notification
-        result = await notification_collection.delete_one({"_id": ObjectId(notification_id)})
+        deleted_notification = await notification_collection.find_one_and_delete({"_id": ObjectId(notification_id)})
         
-        if result.deleted_count == 0:
+        if not deleted_notification:
             logger.warning(f"Failed to delete notification: {notification_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete notification", "status": False}
             )
         
-        return JSONResponse(
+        if not deleted_notification.get("is_read"):
+            await record_unread_change({deleted_notification["user_id"]: -1})
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notification deleted successfully",
@@ -253,7 +255,7 @@ async def delete_notification(notification_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting notification: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -262,57 +264,104 @@ async def delete_all_notifications(user_id: str):
     try:
         logger.info(f"Deleting all notifications for user: {user_id}")
         
-        # Delete all notifications for the user
+        # Delete all notifications for the user, unread ones first so the counter moves by exactly those
+        unread = await notification_collection.delete_many({"user_id": ObjectId(user_id), "is_read": False})
+        await record_unread_change({user_id: -unread.deleted_count})
         result = await notification_collection.delete_many({"user_id": ObjectId(user_id)})
+        deleted_count = unread.deleted_count + result.deleted_count
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
-                "message": f"Deleted {result.deleted_count} notifications",
-                "count": result.deleted_count,
+                "message": f"Deleted {deleted_count} notifications",
+                "count": deleted_count,
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error deleting all notifications: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
-async def create_system_notification(user_ids: List[str], title: str, message: str, related_id: Optional[str] = None):
+async def create_system_notification(
+    user_ids: Optional[List[str]],
+    title: str,
+    message: str,
+    related_id: Optional[str] = None,
+    audience: Optional[str] = None
+):
     """
-    Create a system notification for multiple users
+    Start a background job creating a system notification for every user in
+    an audience ("all_users" or "all_providers") or in user_ids
     """
     try:
-        logger.info(f"Creating system notification for {len(user_ids)} users")
-        
-        created_count = 0
-        for user_id in user_ids:
-            notification = NotificationCreate(
-                user_id=user_id,
-                title=title,
-                message=message,
-                notification_type="system",
-                related_id=related_id,
-                is_read=False
+        if bool(audience) == bool(user_ids):
+            return BSONJSONResponse(
+                status_code=400,
+                content={"message": "Provide either user_ids or an audience", "status": False}
             )
-            
-            result = await create_notification(notification)
-            if result.status_code == 201:
-                created_count += 1
         
-        return JSONResponse(
-            status_code=201,
+        if audience and audience not in AUDIENCES:
+            return BSONJSONResponse(
+                status_code=400,
+                content={"message": f"Audience must be one of: {', '.join(AUDIENCES)}", "status": False}
+            )
+        
+        try:
+            recipient_ids = [ObjectId(user_id) for user_id in user_ids] if user_ids else None
+            related_oid = ObjectId(related_id) if related_id else None
+        except InvalidId as e:
+            return BSONJSONResponse(
+                status_code=400,
+                content={"message": f"Invalid ID: {str(e)}", "status": False}
+            )
+        
+        logger.info(f"Starting system notification for {audience or f'{len(recipient_ids)} users'}")
+        job = await notification_fanout.start_job(title, message, audience, recipient_ids, related_oid)
+        
+        return BSONJSONResponse(
+            status_code=202,
             content={
-                "message": f"Created {created_count} system notifications",
-                "count": created_count,
+                "message": "System notification job started",
+                "job_id": job["_id"],
+                "job": job,
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error creating system notifications: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
+
+async def get_system_notification_job(job_id: str):
+    """
+    Get the status and progress of a system notification job
+    """
+    try:
+        job = await notification_fanout.get_job(ObjectId(job_id))
+        
+        if not job:
+            logger.warning(f"System notification job not found: {job_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "System notification job not found", "status": False}
+            )
+        
+        return BSONJSONResponse(
+            status_code=200,
+            content={
+                "message": "System notification job fetched successfully",
+                "job": job,
+                "status": True
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting system notification job: {str(e)}")
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -322,27 +371,15 @@ async def get_service_provider_notifications(provider_id: str, unread_only: bool
         logger.info(f"Getting notifications for service provider: {provider_id}")
         
         # Get user ID associated with service provider
-        service_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
+        user_id = await provider_identity.get_user_id(provider_id)
         
-        if not service_provider:
-            logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
-                status_code=404,
-                content={"message": "Service provider not found", "status": False}
-            )
-        
-        user_id = service_provider.get("user_id")
         if not user_id:
-            logger.warning(f"User ID not found for service provider: {provider_id}")
-            return JSONResponse(
+            logger.warning(f"Service provider not found or has no user: {provider_id}")
+            return BSONJSONResponse(
                 status_code=404,
-                content={"message": "User ID not found for service provider", "status": False}
+                content={"message": "Service provider not found", "status": False}
             )
         
-        # Check if user_id is already an ObjectId
-        if not isinstance(user_id, ObjectId):
-            user_id = ObjectId(user_id)
-        
         # Build query
         query = {"user_id": user_id}
         
@@ -352,30 +389,47 @@ async def get_service_provider_notifications(provider_id: str, unread_only: bool
         # Find notifications
         notifications = await notification_collection.find(query).sort("created_at", -1).to_list(length=100)
         
-        # Process notifications for response
-        processed_notifications = []
-        for notification in notifications:
-            # Convert ObjectId fields to strings
-            notification["_id"] = str(notification["_id"])
-            notification["user_id"] = str(notification["user_id"])
-            
-            if "related_id" in notification and notification["related_id"]:
-                notification["related_id"] = str(notification["related_id"])
-            
-            processed_notifications.append(notification)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notifications fetched successfully",
-                "data": processed_notifications,
-                "count": len(processed_notifications),
+                "data": notifications,
+                "count": len(notifications),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting notifications for service provider: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
+
+async def get_service_provider_unread_count(provider_id: str):
+    try:
+        # Notifications for a service provider are addressed to its user account
+        user_id = await provider_identity.get_user_id(provider_id)
+        
+        if not user_id:
+            logger.warning(f"Service provider not found: {provider_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "Service provider not found", "status": False}
+            )
+        
+        unread_count = await get_unread_count(user_id)
+        
+        return BSONJSONResponse(
+            status_code=200,
+            content={
+                "message": "Unread count fetched successfully",
+                "count": unread_count,
+                "status": True
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting unread count for service provider: {str(e)}")
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -398,7 +452,7 @@ async def get_service_provider_notification_preferences(provider_id: str):
                 "notify_on_payment": True
             }
             
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=200,
                 content={
                     "message": "Default notification preferences",
@@ -407,11 +461,7 @@ async def get_service_provider_notification_preferences(provider_id: str):
                 }
             )
         
-        # Convert ObjectId fields to strings
-        preferences["_id"] = str(preferences["_id"])
-        preferences["service_provider_id"] = str(preferences["service_provider_id"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notification preferences fetched successfully",
@@ -421,7 +471,7 @@ async def get_service_provider_notification_preferences(provider_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting notification preferences: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -455,7 +505,7 @@ async def update_service_provider_notification_preferences(provider_id: str, pre
             update_data["created_at"] = datetime.now()
             result = await notification_preferences_collection.insert_one(update_data)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Notification preferences updated successfully",
@@ -464,7 +514,7 @@ async def update_service_provider_notification_preferences(provider_id: str, pre
         )
     except Exception as e:
         logger.error(f"Error updating notification preferences: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -474,27 +524,15 @@ async def mark_all_service_provider_notifications_read(provider_id: str):
         logger.info(f"Marking all notifications as read for service provider: {provider_id}")
         
         # Get user ID associated with service provider
-        service_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
+        user_id = await provider_identity.get_user_id(provider_id)
         
-        if not service_provider:
-            logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
-                status_code=404,
-                content={"message": "Service provider not found", "status": False}
-            )
-        
-        user_id = service_provider.get("user_id")
         if not user_id:
-            logger.warning(f"User ID not found for service provider: {provider_id}")
-            return JSONResponse(
+            logger.warning(f"Service provider not found or has no user: {provider_id}")
+            return BSONJSONResponse(
                 status_code=404,
-                content={"message": "User ID not found for service provider", "status": False}
+                content={"message": "Service provider not found", "status": False}
             )
         
-        # Check if user_id is already an ObjectId
-        if not isinstance(user_id, ObjectId):
-            user_id = ObjectId(user_id)
-        
         # Update all unread notifications for the user
         result = await notification_collection.update_many(
             {"user_id": user_id, "is_read": False},
@@ -506,7 +544,9 @@ async def mark_all_service_provider_notifications_read(provider_id: str):
             }
         )
         
-        return JSONResponse(
+        await record_unread_change({user_id: -result.modified_count})
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Marked {result.modified_count} notifications as read",
@@ -516,7 +556,7 @@ async def mark_all_service_provider_notifications_read(provider_id: str):
         )
     except Exception as e:
         logger.error(f"Error marking all notifications as read: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -528,10 +568,17 @@ async def batch_delete_notifications(notification_ids: List[str]):
         # Convert string IDs to ObjectIds
         object_ids = [ObjectId(notification_id) for notification_id in notification_ids]
         
+        # Unread notifications being deleted, per user
+        unread_groups = await notification_collection.aggregate([
+            {"$match": {"_id": {"$in": object_ids}, "is_read": False}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        
         # Delete notifications
         result = await notification_collection.delete_many({"_id": {"$in": object_ids}})
+        await record_unread_change({group["_id"]: -group["count"] for group in unread_groups})
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Deleted {result.deleted_count} notifications",
@@ -541,7 +588,7 @@ async def batch_delete_notifications(notification_ids: List[str]):
         )
     except Exception as e:
         logger.error(f"Error batch deleting notifications: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         ) 
\ No newline at end of file
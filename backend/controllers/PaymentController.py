@@ -4,8 +4,11 @@ from config.database import payment_collection, booking_collection
 from fastapi import HTTPException
 from datetime import datetime
 import logging
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pymongo.errors import PyMongoError
+from utils.event_bus import publish_booking_change, PAYMENT_STATUS_EVENT
+from utils.pagination import paginate, InvalidCursorError
+from utils.invoice_sequence import next_invoice_number
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,9 +28,8 @@ async def create_payment(payment: PaymentCreate) -> dict:
         # Prepare data for insertion
         payment_dict = payment.dict()
         
-        # Generate invoice number
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{datetime.now().timestamp():.0f}"[-12:]
-        payment_dict["invoice_number"] = invoice_number
+        # Assign the next invoice number from the shared sequence
+        payment_dict["invoice_number"] = await next_invoice_number()
         
         # Set timestamps
         current_time = datetime.now()
@@ -116,21 +118,25 @@ async def get_payment_by_id(payment_id: str) -> Optional[dict]:
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
-async def get_user_payments(user_id: str) -> List[dict]:
+async def get_user_payments(user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
     """
-    Get all payments for a specific user
+    Get the payments of a specific user with keyset pagination, newest first
     
     Args:
         user_id: The ID of the user
+        cursor: Cursor returned with the previous page, None for the first page
+        limit: Maximum number of records to return
         
     Returns:
-        List[dict]: List of payments for the user
+        Tuple[List[dict], Optional[str]]: List of payments for the user and the cursor for the next page
     """
     try:
         payments = []
-        cursor = payment_collection.find({"user_id": user_id}).sort("created_at", -1)
+        documents, next_cursor = await paginate(
+            payment_collection, {"user_id": user_id}, cursor=cursor, limit=limit, sort_field="created_at"
+        )
         
-        async for document in cursor:
+        for document in documents:
             # Convert ObjectId to string
             document["id"] = str(document.pop("_id"))
             
@@ -143,8 +149,11 @@ async def get_user_payments(user_id: str) -> List[dict]:
             payments.append(document)
         
         logger.info(f"Retrieved {len(payments)} payments for user: {user_id}")
-        return payments
+        return payments, next_cursor
     
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except PyMongoError as e:
         logger.error(f"Database error retrieving user payments: {str(e)}")
         raise HTTPException(
@@ -208,10 +217,15 @@ async def update_payment_status(payment_id: str, payment_update: PaymentUpdate)
             if update_data.get('payment_status') == PaymentStatus.SUCCESSFUL and updated_payment.get('payment_id'):
                 try:
                     # Find associated booking
+                    unpaid_bookings = await booking_collection.find(
+                        {"payment_id": updated_payment.get('payment_id'), "payment_status": {"$ne": "paid"}}
+                    ).to_list(length=None)
                     await booking_collection.update_many(
                         {"payment_id": updated_payment.get('payment_id')},
                         {"$set": {"payment_status": "paid", "updated_at": datetime.now()}}
                     )
+                    for booking in unpaid_bookings:
+                        publish_booking_change({**booking, "payment_status": "paid"}, PAYMENT_STATUS_EVENT)
                     logger.info(f"Updated associated booking for payment ID: {updated_payment.get('payment_id')}")
                 except Exception as e:
                     logger.error(f"Error updating booking for payment: {str(e)}")
@@ -251,22 +265,22 @@ async def verify_razorpay_payment(razorpay_payment_id: str, razorpay_signature:
     logger.info(f"Verifying Razorpay payment: {razorpay_payment_id}")
     return True
 
-async def get_all_payments(skip: int = 0, limit: int = 100) -> List[dict]:
+async def get_all_payments(cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[dict], Optional[str]]:
     """
-    Get all payments with pagination
+    Get all payments with keyset pagination, newest first
     
     Args:
-        skip: Number of records to skip
+        cursor: Cursor returned with the previous page, None for the first page
         limit: Maximum number of records to return
         
     Returns:
-        List[dict]: List of payments
+        Tuple[List[dict], Optional[str]]: List of payments and the cursor for the next page
     """
     try:
         payments = []
-        cursor = payment_collection.find().skip(skip).limit(limit).sort("created_at", -1)
+        documents, next_cursor = await paginate(payment_collection, cursor=cursor, limit=limit, sort_field="created_at")
         
-        async for document in cursor:
+        for document in documents:
             # Convert ObjectId to string
             document["id"] = str(document.pop("_id"))
             
@@ -279,8 +293,11 @@ async def get_all_payments(skip: int = 0, limit: int = 100) -> List[dict]:
             payments.append(document)
         
         logger.info(f"Retrieved {len(payments)} payments")
-        return payments
+        return payments, next_cursor
     
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except PyMongoError as e:
         logger.error(f"Database error retrieving all payments: {str(e)}")
         raise HTTPException(
@@ -292,4 +309,83 @@ async def get_all_payments(skip: int = 0, limit: int = 100) -> List[dict]:
         raise HTTPException(
             status_code=500, 
             detail=f"An unexpected error occurred: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+SUMMARY_TOTALS = ("count", "amount", "gst_amount", "total_amount")
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"count": 0, "amount": 0.0, "gst_amount": 0.0, "total_amount": 0.0}
+
+def _add_totals(totals: Dict[str, Any], row: Dict[str, Any]):
+    for key in SUMMARY_TOTALS:
+        totals[key] += row.get(key) or 0
+
+async def get_user_payment_summary(user_id: str) -> Dict[str, Any]:
+    """
+    Summarize a user's payments by status and by month
+    
+    The totals come from a single $group over the user's payments on
+    (status, month), so the cost does not depend on paging through the
+    history; the overall, per-status and per-month figures are folded
+    together from those rows.
+    
+    Args:
+        user_id: The ID of the user
+        
+    Returns:
+        Dict[str, Any]: Overall totals, totals per payment status, and per
+            month (newest first) the totals with their per-status breakdown
+    """
+    try:
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": {
+                    "status": "$payment_status",
+                    "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}
+                },
+                "count": {"$sum": 1},
+                "amount": {"$sum": "$amount"},
+                "gst_amount": {"$sum": "$gst_amount"},
+                "total_amount": {"$sum": "$total_amount"}
+            }}
+        ]
+        rows = await payment_collection.aggregate(pipeline).to_list(length=None)
+        
+        totals = _empty_totals()
+        by_status: Dict[str, Dict[str, Any]] = {status.value: _empty_totals() for status in PaymentStatus}
+        by_month: Dict[str, Dict[str, Any]] = {}
+        
+        for row in rows:
+            status = row["_id"].get("status") or PaymentStatus.INITIATED.value
+            month = row["_id"].get("month")
+            
+            _add_totals(totals, row)
+            _add_totals(by_status.setdefault(status, _empty_totals()), row)
+            
+            month_totals = by_month.setdefault(month, {**_empty_totals(), "month": month, "by_status": {}})
+            _add_totals(month_totals, row)
+            _add_totals(month_totals["by_status"].setdefault(status, _empty_totals()), row)
+        
+        months = sorted(by_month.values(), key=lambda item: item["month"] or "", reverse=True)
+        
+        logger.info(f"Summarized {totals['count']} payments for user: {user_id}")
+        return {
+            "user_id": user_id,
+            **totals,
+            "by_status": by_status,
+            "by_month": months
+        }
+    
+    except PyMongoError as e:
+        logger.error(f"Database error summarizing user payments: {str(e)}")
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Database error: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error summarizing user payments: {str(e)}")
+        raise HTTPException(
+            status_code=500, 
+            detail=f"An unexpected error occurred: {str(e)}"
+        )
@@ -1,12 +1,17 @@
 from models.ReviewModel import ReviewCreate, ReviewUpdate, ReviewOut
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from config.database import review_collection, user_collection, service_collection, service_provider_collection
-from controllers.ServiceProviderController import update_provider_rating
+from utils.pagination import paginate, InvalidCursorError
+from utils.dashboard_stats import record_review_change
+from utils.provider_ratings import record_rating_change_safely
+from pymongo import ReturnDocument
+from utils.enrichment import fetch_documents_by_ids, USER_PROJECTION
 from datetime import datetime
+import asyncio
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +29,7 @@ async def create_review(review: ReviewCreate):
         
         if existing_review:
             logger.warning(f"User {review.user_id} has already reviewed service provider {review.service_provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": "You have already reviewed this service provider", "status": False}
             )
@@ -47,21 +52,15 @@ async def create_review(review: ReviewCreate):
         result = await review_collection.insert_one(review_data)
         
         if result.inserted_id:
+            await record_review_change(review_data)
+            
             # Get the newly created review with its ID
             new_review = await review_collection.find_one({"_id": result.inserted_id})
             
-            # Convert ObjectId fields to strings for response
-            new_review["_id"] = str(new_review["_id"])
-            new_review["user_id"] = str(new_review["user_id"])
-            new_review["service_provider_id"] = str(new_review["service_provider_id"])
-            
-            if "service_id" in new_review and new_review["service_id"]:
-                new_review["service_id"] = str(new_review["service_id"])
-            
-            # Update service provider's average rating
-            await update_provider_rating(str(review.service_provider_id), review.rating)
+            # Update service provider's rating counters
+            await record_rating_change_safely(review.service_provider_id, new_rating=review.rating)
             
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=201,
                 content={
                     "message": "Review created successfully",
@@ -71,46 +70,40 @@ async def create_review(review: ReviewCreate):
             )
         else:
             logger.error("Failed to create review")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to create review", "status": False}
             )
     except Exception as e:
         logger.error(f"Error creating review: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
-async def get_all_reviews():
+async def get_all_reviews(cursor: Optional[str] = None, limit: Optional[int] = None):
     try:
         logger.info("Getting all reviews")
-        reviews = await review_collection.find().to_list(length=1000)
+        reviews, next_cursor = await paginate(review_collection, cursor=cursor, limit=limit)
         
-        # Process reviews for response
-        processed_reviews = []
-        for review in reviews:
-            # Convert ObjectId fields to strings
-            review["_id"] = str(review["_id"])
-            review["user_id"] = str(review["user_id"])
-            review["service_provider_id"] = str(review["service_provider_id"])
-            
-            if "service_id" in review and review["service_id"]:
-                review["service_id"] = str(review["service_id"])
-            
-            processed_reviews.append(review)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Reviews fetched successfully",
-                "reviews": processed_reviews,
+                "reviews": reviews,
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all reviews: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -124,39 +117,26 @@ async def get_review_by_id(review_id: str):
         
         if not review:
             logger.warning(f"Review not found: {review_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Review not found", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        review["_id"] = str(review["_id"])
-        review["user_id"] = str(review["user_id"])
-        review["service_provider_id"] = str(review["service_provider_id"])
-        
-        if "service_id" in review and review["service_id"]:
-            review["service_id"] = str(review["service_id"])
-        
         # Get related data
-        user = await user_collection.find_one({"_id": ObjectId(review["user_id"])})
+        user = await user_collection.find_one({"_id": ObjectId(review["user_id"])}, USER_PROJECTION)
         if user:
-            user["_id"] = str(user["_id"])
-            if "password" in user:
-                del user["password"]
             review["user"] = user
         
         service_provider = await service_provider_collection.find_one({"_id": ObjectId(review["service_provider_id"])})
         if service_provider:
-            service_provider["_id"] = str(service_provider["_id"])
             review["service_provider"] = service_provider
         
         if "service_id" in review and review["service_id"]:
             service = await service_collection.find_one({"_id": ObjectId(review["service_id"])})
             if service:
-                service["_id"] = str(service["_id"])
                 review["service"] = service
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Review fetched successfully",
@@ -166,7 +146,7 @@ async def get_review_by_id(review_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting review by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -178,39 +158,25 @@ async def get_provider_reviews(provider_id: str):
         # Find reviews by service provider ID
         reviews = await review_collection.find({"service_provider_id": ObjectId(provider_id)}).to_list(length=1000)
         
-        # Process reviews for response
-        processed_reviews = []
+        # Attach users, fetched in one query
+        users = await fetch_documents_by_ids(user_collection, (r.get("user_id") for r in reviews), USER_PROJECTION)
         for review in reviews:
-            # Convert ObjectId fields to strings
-            review["_id"] = str(review["_id"])
-            review["user_id"] = str(review["user_id"])
-            review["service_provider_id"] = str(review["service_provider_id"])
-            
-            if "service_id" in review and review["service_id"]:
-                review["service_id"] = str(review["service_id"])
-            
-            # Get user info
-            user = await user_collection.find_one({"_id": ObjectId(review["user_id"])})
+            user = users.get(str(review.get("user_id")))
             if user:
-                user["_id"] = str(user["_id"])
-                if "password" in user:
-                    del user["password"]
                 review["user"] = user
-            
-            processed_reviews.append(review)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Provider reviews fetched successfully",
-                "reviews": processed_reviews,
-                "count": len(processed_reviews),
+                "reviews": reviews,
+                "count": len(reviews),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting provider reviews: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -222,44 +188,32 @@ async def get_user_reviews(user_id: str):
         # Find reviews by user ID
         reviews = await review_collection.find({"user_id": ObjectId(user_id)}).to_list(length=1000)
         
-        # Process reviews for response
-        processed_reviews = []
+        # Attach service providers and services, one query each
+        service_providers, services = await asyncio.gather(
+            fetch_documents_by_ids(service_provider_collection, (r.get("service_provider_id") for r in reviews)),
+            fetch_documents_by_ids(service_collection, (r.get("service_id") for r in reviews))
+        )
         for review in reviews:
-            # Convert ObjectId fields to strings
-            review["_id"] = str(review["_id"])
-            review["user_id"] = str(review["user_id"])
-            review["service_provider_id"] = str(review["service_provider_id"])
-            
-            if "service_id" in review and review["service_id"]:
-                review["service_id"] = str(review["service_id"])
-            
-            # Get service provider info
-            service_provider = await service_provider_collection.find_one({"_id": ObjectId(review["service_provider_id"])})
+            service_provider = service_providers.get(str(review.get("service_provider_id")))
             if service_provider:
-                service_provider["_id"] = str(service_provider["_id"])
                 review["service_provider"] = service_provider
             
-            # Get service info if present
-            if "service_id" in review and review["service_id"]:
-                service = await service_collection.find_one({"_id": ObjectId(review["service_id"])})
-                if service:
-                    service["_id"] = str(service["_id"])
-                    review["service"] = service
-            
-            processed_reviews.append(review)
+            service = services.get(str(review.get("service_id")))
+            if service:
+                review["service"] = service
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User reviews fetched successfully",
-                "reviews": processed_reviews,
-                "count": len(processed_reviews),
+                "reviews": reviews,
+                "count": len(reviews),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting user reviews: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -272,7 +226,7 @@ async def update_review(review_id: str, review_data: ReviewUpdate):
         existing_review = await review_collection.find_one({"_id": ObjectId(review_id)})
         if not existing_review:
             logger.warning(f"Review not found for update: {review_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Review not found", "status": False}
             )
@@ -283,50 +237,32 @@ async def update_review(review_id: str, review_data: ReviewUpdate):
         # Add updated timestamp
         update_data["updated_at"] = datetime.now()
         
-        # Update review
-        result = await review_collection.update_one(
+        # Update review, reading back the rating it replaced
+        previous_review = await review_collection.find_one_and_update(
             {"_id": ObjectId(review_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0 and result.matched_count > 0:
-            logger.warning(f"No changes made to review: {review_id}")
-            return JSONResponse(
-                status_code=200,
-                content={"message": "No changes were made", "status": True}
+        if not previous_review:
+            logger.warning(f"Review not found for update: {review_id}")
+            return BSONJSONResponse(
+                status_code=404,
+                content={"message": "Review not found", "status": False}
             )
         
-        # If rating was updated, also update the service provider's average rating
-        if "rating" in update_data:
-            old_rating = existing_review.get("rating", 0)
-            new_rating = update_data["rating"]
-            
-            if old_rating != new_rating:
-                # Recalculate average rating for the service provider
-                service_provider_id = str(existing_review["service_provider_id"])
-                provider_reviews = await review_collection.find({"service_provider_id": ObjectId(service_provider_id)}).to_list(length=1000)
-                
-                total_rating = sum(review.get("rating", 0) for review in provider_reviews)
-                avg_rating = total_rating / len(provider_reviews) if provider_reviews else 0
-                
-                # Update service provider's rating
-                await service_provider_collection.update_one(
-                    {"_id": ObjectId(service_provider_id)},
-                    {"$set": {"avg_rating": round(avg_rating, 1), "total_ratings": len(provider_reviews)}}
-                )
+        # If rating was updated, move the service provider's rating counters
+        if "rating" in update_data and previous_review.get("rating") != update_data["rating"]:
+            await record_rating_change_safely(
+                previous_review["service_provider_id"],
+                old_rating=previous_review.get("rating"),
+                new_rating=update_data["rating"]
+            )
         
         # Get updated review
         updated_review = await review_collection.find_one({"_id": ObjectId(review_id)})
         
-        # Convert ObjectId fields to strings
-        updated_review["_id"] = str(updated_review["_id"])
-        updated_review["user_id"] = str(updated_review["user_id"])
-        updated_review["service_provider_id"] = str(updated_review["service_provider_id"])
-        
-        if "service_id" in updated_review and updated_review["service_id"]:
-            updated_review["service_id"] = str(updated_review["service_id"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Review updated successfully",
@@ -336,7 +272,7 @@ async def update_review(review_id: str, review_data: ReviewUpdate):
         )
     except Exception as e:
         logger.error(f"Error updating review: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -349,44 +285,27 @@ async def delete_review(review_id: str):
         existing_review = await review_collection.find_one({"_id": ObjectId(review_id)})
         if not existing_review:
             logger.warning(f"Review not found for deletion: {review_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Review not found", "status": False}
             )
         
-        # Store the service provider ID before deleting the review
-        service_provider_id = str(existing_review["service_provider_id"])
-        
-        # Delete review
-        result = await review_collection.delete_one({"_id": ObjectId(review_id)})
+        # Delete review; only the request that actually removed it adjusts the counters
+        deleted_review = await review_collection.find_one_and_delete({"_id": ObjectId(review_id)})
         
-        if result.deleted_count == 0:
+        if not deleted_review:
             logger.warning(f"Failed to delete review: {review_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete review", "status": False}
             )
         
-        # Recalculate average rating for the service provider
-        provider_reviews = await review_collection.find({"service_provider_id": ObjectId(service_provider_id)}).to_list(length=1000)
+        await record_review_change(deleted_review, -1)
         
-        if provider_reviews:
-            total_rating = sum(review.get("rating", 0) for review in provider_reviews)
-            avg_rating = total_rating / len(provider_reviews)
-            
-            # Update service provider's rating
-            await service_provider_collection.update_one(
-                {"_id": ObjectId(service_provider_id)},
-                {"$set": {"avg_rating": round(avg_rating, 1), "total_ratings": len(provider_reviews)}}
-            )
-        else:
-            # No reviews left, reset rating
-            await service_provider_collection.update_one(
-                {"_id": ObjectId(service_provider_id)},
-                {"$set": {"avg_rating": 0, "total_ratings": 0}}
-            )
+        # Take the rating out of the service provider's rating counters
+        await record_rating_change_safely(deleted_review["service_provider_id"], old_rating=deleted_review.get("rating"))
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Review deleted successfully",
@@ -395,7 +314,7 @@ async def delete_review(review_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting review: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -408,7 +327,7 @@ async def verify_review(review_id: str, is_verified: bool):
         existing_review = await review_collection.find_one({"_id": ObjectId(review_id)})
         if not existing_review:
             logger.warning(f"Review not found: {review_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Review not found", "status": False}
             )
@@ -426,18 +345,18 @@ async def verify_review(review_id: str, is_verified: bool):
         
         if result.modified_count == 0:
             if existing_review.get("is_verified") == is_verified:
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=200,
                     content={"message": f"Review already {'verified' if is_verified else 'unverified'}", "status": True}
                 )
             else:
                 logger.warning(f"Failed to update verification status for review: {review_id}")
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=500,
                     content={"message": "Failed to update verification status", "status": False}
                 )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Review {'verified' if is_verified else 'unverified'} successfully",
@@ -446,7 +365,7 @@ async def verify_review(review_id: str, is_verified: bool):
         )
     except Exception as e:
         logger.error(f"Error updating review verification status: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         ) 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from config.database import role_collection #roles
 from models.RoleModel import Role,RoleOut
 from bson import ObjectId
+from middleware.auth import invalidate_cached_role
 
 #business logic function
 
@@ -18,6 +19,7 @@ async def addRole(role:Role):
 
 async def deleteRole(roleId:str):
     result = await role_collection.delete_one({"_id":ObjectId(roleId)})
+    invalidate_cached_role(roleId)
     print("After Delete Result",result)
     return {"Message":"Role Deleted Successfully!"}
 
@@ -1,10 +1,12 @@
 from models.ServiceModel import Service, ServiceOut, ServiceCreate, ServiceUpdate, OilChangeService
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from config.database import service_collection
+from utils.pagination import paginate, InvalidCursorError
 from datetime import datetime
 import logging
+from typing import Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -34,14 +36,7 @@ async def create_service(service: ServiceCreate):
             # Get the newly created service with its ID
             new_service = await service_collection.find_one({"_id": result.inserted_id})
             
-            # Convert ObjectId fields to strings for response
-            new_service["_id"] = str(new_service["_id"])
-            new_service["categoryId"] = str(new_service["categoryId"])
-            
-            if "serviceProviderId" in new_service and new_service["serviceProviderId"]:
-                new_service["serviceProviderId"] = str(new_service["serviceProviderId"])
-            
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=201,
                 content={
                     "message": "Service created successfully",
@@ -51,46 +46,40 @@ async def create_service(service: ServiceCreate):
             )
         else:
             logger.error("Failed to create service")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to create service", "status": False}
             )
     except Exception as e:
         logger.error(f"Error creating service: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
-async def get_all_services():
+async def get_all_services(cursor: Optional[str] = None, limit: Optional[int] = None):
     try:
         logger.info("Getting all services")
-        services = await service_collection.find().to_list(length=1000)
-        
-        # Process services for response
-        processed_services = []
-        for service in services:
-            # Convert ObjectId fields to strings
-            service["_id"] = str(service["_id"])
-            if "categoryId" in service:
-                service["categoryId"] = str(service["categoryId"])
-            
-            if "serviceProviderId" in service and service["serviceProviderId"]:
-                service["serviceProviderId"] = str(service["serviceProviderId"])
-            
-            processed_services.append(service)
+        services, next_cursor = await paginate(service_collection, cursor=cursor, limit=limit)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Services fetched successfully",
-                "services": processed_services,
+                "services": services,
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all services: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -104,20 +93,12 @@ async def get_service_by_id(service_id: str):
         
         if not service:
             logger.warning(f"Service not found: {service_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service not found", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        service["_id"] = str(service["_id"])
-        if "categoryId" in service:
-            service["categoryId"] = str(service["categoryId"])
-        
-        if "serviceProviderId" in service and service["serviceProviderId"]:
-            service["serviceProviderId"] = str(service["serviceProviderId"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service fetched successfully",
@@ -127,7 +108,7 @@ async def get_service_by_id(service_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting service by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -139,29 +120,18 @@ async def get_services_by_provider(provider_id: str):
         # Find services by provider ID
         services = await service_collection.find({"serviceProviderId": ObjectId(provider_id)}).to_list(length=1000)
         
-        # Process services for response
-        processed_services = []
-        for service in services:
-            # Convert ObjectId fields to strings
-            service["_id"] = str(service["_id"])
-            if "categoryId" in service:
-                service["categoryId"] = str(service["categoryId"])
-            service["serviceProviderId"] = str(service["serviceProviderId"])
-            
-            processed_services.append(service)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Services fetched successfully",
-                "services": processed_services,
-                "count": len(processed_services),
+                "services": services,
+                "count": len(services),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting services by provider ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -173,30 +143,18 @@ async def get_services_by_category(category_id: str):
         # Find services by category ID
         services = await service_collection.find({"categoryId": ObjectId(category_id)}).to_list(length=1000)
         
-        # Process services for response
-        processed_services = []
-        for service in services:
-            # Convert ObjectId fields to strings
-            service["_id"] = str(service["_id"])
-            service["categoryId"] = str(service["categoryId"])
-            
-            if "serviceProviderId" in service and service["serviceProviderId"]:
-                service["serviceProviderId"] = str(service["serviceProviderId"])
-            
-            processed_services.append(service)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Services fetched successfully",
-                "services": processed_services,
-                "count": len(processed_services),
+                "services": services,
+                "count": len(services),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting services by category ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -209,7 +167,7 @@ async def update_service(service_id: str, service_data: ServiceUpdate):
         existing_service = await service_collection.find_one({"_id": ObjectId(service_id)})
         if not existing_service:
             logger.warning(f"Service not found for update: {service_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service not found", "status": False}
             )
@@ -235,7 +193,7 @@ async def update_service(service_id: str, service_data: ServiceUpdate):
         
         if result.modified_count == 0 and result.matched_count > 0:
             logger.warning(f"No changes made to service: {service_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=200,
                 content={"message": "No changes were made", "status": True}
             )
@@ -243,15 +201,7 @@ async def update_service(service_id: str, service_data: ServiceUpdate):
         # Get updated service
         updated_service = await service_collection.find_one({"_id": ObjectId(service_id)})
         
-        # Convert ObjectId fields to strings
-        updated_service["_id"] = str(updated_service["_id"])
-        if "categoryId" in updated_service:
-            updated_service["categoryId"] = str(updated_service["categoryId"])
-        
-        if "serviceProviderId" in updated_service and updated_service["serviceProviderId"]:
-            updated_service["serviceProviderId"] = str(updated_service["serviceProviderId"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service updated successfully",
@@ -261,7 +211,7 @@ async def update_service(service_id: str, service_data: ServiceUpdate):
         )
     except Exception as e:
         logger.error(f"Error updating service: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -274,7 +224,7 @@ async def delete_service(service_id: str):
         existing_service = await service_collection.find_one({"_id": ObjectId(service_id)})
         if not existing_service:
             logger.warning(f"Service not found for deletion: {service_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service not found", "status": False}
             )
@@ -284,12 +234,12 @@ async def delete_service(service_id: str):
         
         if result.deleted_count == 0:
             logger.warning(f"Failed to delete service: {service_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete service", "status": False}
             )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service deleted successfully",
@@ -298,7 +248,7 @@ async def delete_service(service_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting service: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -368,10 +318,9 @@ async def create_oil_change_services():
                 result = await service_collection.insert_one(service)
                 if result.inserted_id:
                     new_service = await service_collection.find_one({"_id": result.inserted_id})
-                    new_service["_id"] = str(new_service["_id"])
                     inserted_services.append(new_service)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=201,
             content={
                 "message": "Oil change services created successfully",
@@ -382,7 +331,7 @@ async def create_oil_change_services():
         )
     except Exception as e:
         logger.error(f"Error creating oil change services: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -397,24 +346,18 @@ async def get_oil_change_services():
         # Find oil change services
         services = await service_collection.find({"serviceType": "oil_change"}).to_list(length=100)
         
-        # Process services for response
-        processed_services = []
-        for service in services:
-            service["_id"] = str(service["_id"])
-            processed_services.append(service)
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Oil change services fetched successfully",
-                "services": processed_services,
-                "count": len(processed_services),
+                "services": services,
+                "count": len(services),
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error getting oil change services: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
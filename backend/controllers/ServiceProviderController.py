@@ -1,14 +1,22 @@
 from bson import ObjectId
 from models.ServiceProviderModel import ServiceProvider, ServiceProviderCreate, ServiceProviderUpdate, ServiceProviderOut, ServiceProviderFilter
-from config.database import service_provider_collection, user_collection, category_collection, sub_category_collection, area_collection, city_collection, state_collection
+from config.database import service_provider_collection, user_collection
 from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
+from utils.pagination import paginate, paginate_pipeline, InvalidCursorError
+from utils.enrichment import fetch_documents_by_ids, USER_PROJECTION
+from utils.projection import build_projection, parse_fields, InvalidFieldsError
+from utils.provider_ratings import record_rating_change, empty_histogram
+from utils.provider_identity import provider_identity
+from utils.uploads import save_upload, UploadError, UploadTooLargeError
+from utils.image_derivatives import image_processor, provider_image_fields
+from utils.dashboard_stats import record_service_provider_change
+from middleware.auth import invalidate_cached_user
+from utils.reference_data import reference_data, STATES, CITIES, AREAS, CATEGORIES, SUB_CATEGORIES
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import os
-import shutil
-from uuid import uuid4
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +26,20 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = "uploads/avatars"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# How much avg_rating (0-5) boosts text relevance in search results; a
+# 5-star provider ranks as if it matched (1 + weight) times better
+SEARCH_RATING_WEIGHT = float(os.getenv("SEARCH_RATING_WEIGHT", 0.5))
+
+# Provider tables and search results leave out the gallery, which is only
+# shown on the provider's own page
+PROVIDER_LIST_PROJECTION = build_projection(exclude=["gallery_images", "gallery_image_variants"])
+# Columns of the user embedded in search results
+PROVIDER_USER_PROJECTION = build_projection(["name", "email", "phone", "avatar"])
+
+# Search radius for nearby providers, in kilometres
+NEARBY_DEFAULT_DISTANCE_KM = float(os.getenv("NEARBY_DEFAULT_DISTANCE_KM", 10))
+NEARBY_MAX_DISTANCE_KM = float(os.getenv("NEARBY_MAX_DISTANCE_KM", 100))
+
 # Create a new service provider
 async def create_service_provider(service_provider: ServiceProviderCreate):
     try:
@@ -27,16 +49,16 @@ async def create_service_provider(service_provider: ServiceProviderCreate):
         user = await user_collection.find_one({"_id": ObjectId(service_provider.user_id)})
         if not user:
             logger.warning(f"User not found: {service_provider.user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
             
-        # Check if service provider already exists for this user
-        existing_provider = await service_provider_collection.find_one({"user_id": service_provider.user_id})
-        if existing_provider:
+        # Check if service provider already exists for this user; user_id is
+        # stored as an ObjectId, which the identity map converts to
+        if await provider_identity.get_provider_id(service_provider.user_id):
             logger.warning(f"Service provider already exists for user: {service_provider.user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": "Service provider already exists for this user", "status": False}
             )
@@ -59,6 +81,15 @@ async def create_service_provider(service_provider: ServiceProviderCreate):
             
         if service_provider.state_id:
             provider_data["state_id"] = ObjectId(service_provider.state_id)
+        
+        # Leave location out entirely rather than storing null
+        if not provider_data.get("location"):
+            provider_data.pop("location", None)
+        
+        # Ratings only ever come from reviews
+        provider_data.update(
+            avg_rating=0, total_ratings=0, rating_sum=0, rating_count=0, rating_histogram=empty_histogram()
+        )
             
         # Add timestamps
         provider_data["created_at"] = datetime.now()
@@ -68,27 +99,13 @@ async def create_service_provider(service_provider: ServiceProviderCreate):
         result = await service_provider_collection.insert_one(provider_data)
         
         if result.inserted_id:
+            await record_service_provider_change(None, provider_data)
+            provider_identity.invalidate(result.inserted_id, provider_data["user_id"])
+            
             # Get the newly created service provider with its ID
             new_provider = await service_provider_collection.find_one({"_id": result.inserted_id})
             
-            # Convert ObjectId fields to strings for response
-            new_provider["_id"] = str(new_provider["_id"])
-            new_provider["user_id"] = str(new_provider["user_id"])
-            new_provider["category_id"] = str(new_provider["category_id"])
-            
-            if "sub_category_ids" in new_provider and new_provider["sub_category_ids"]:
-                new_provider["sub_category_ids"] = [str(id) for id in new_provider["sub_category_ids"]]
-                
-            if "area_id" in new_provider and new_provider["area_id"]:
-                new_provider["area_id"] = str(new_provider["area_id"])
-                
-            if "city_id" in new_provider and new_provider["city_id"]:
-                new_provider["city_id"] = str(new_provider["city_id"])
-                
-            if "state_id" in new_provider and new_provider["state_id"]:
-                new_provider["state_id"] = str(new_provider["state_id"])
-            
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=201,
                 content={
                     "message": "Service provider created successfully",
@@ -98,60 +115,61 @@ async def create_service_provider(service_provider: ServiceProviderCreate):
             )
         else:
             logger.error("Failed to create service provider")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to create service provider", "status": False}
             )
     except Exception as e:
         logger.error(f"Error creating service provider: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
 # Get all service providers
-async def get_all_service_providers():
+async def get_all_service_providers(cursor: Optional[str] = None, limit: Optional[int] = None, fields: Optional[str] = None):
     try:
         logger.info("Getting all service providers")
-        providers = await service_provider_collection.find().to_list(length=1000)
-        
-        # Process providers for response
-        processed_providers = []
-        for provider in providers:
-            # Convert ObjectId fields to strings
-            provider["_id"] = str(provider["_id"])
-            provider["user_id"] = str(provider["user_id"])
-            provider["category_id"] = str(provider["category_id"])
-            
-            if "sub_category_ids" in provider and provider["sub_category_ids"]:
-                provider["sub_category_ids"] = [str(id) for id in provider["sub_category_ids"]]
-                
-            if "area_id" in provider and provider["area_id"]:
-                provider["area_id"] = str(provider["area_id"])
-                
-            if "city_id" in provider and provider["city_id"]:
-                provider["city_id"] = str(provider["city_id"])
-                
-            if "state_id" in provider and provider["state_id"]:
-                provider["state_id"] = str(provider["state_id"])
-            
-            processed_providers.append(provider)
+        requested = parse_fields(fields)
+        projection = build_projection(requested) if requested else PROVIDER_LIST_PROJECTION
+        providers, next_cursor = await paginate(service_provider_collection, cursor=cursor, limit=limit, projection=projection)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service providers fetched successfully",
-                "service_providers": processed_providers,
+                "service_providers": providers,
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all service providers: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
+# Embed reference documents into a provider
+async def _attach_reference_data(provider: Dict[str, Any]):
+    category = await reference_data.get(CATEGORIES, provider.get("category_id"))
+    if category:
+        provider["category"] = category
+    
+    if provider.get("sub_category_ids"):
+        provider["sub_categories"] = await reference_data.get_many(SUB_CATEGORIES, provider["sub_category_ids"])
+    
+    for field, kind in (("area", AREAS), ("city", CITIES), ("state", STATES)):
+        document = await reference_data.get(kind, provider.get(f"{field}_id"))
+        if document:
+            provider[field] = document
+
 # Get service provider by ID
 async def get_service_provider_by_id(provider_id: str):
     try:
@@ -162,74 +180,20 @@ async def get_service_provider_by_id(provider_id: str):
         
         if not provider:
             logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        provider["_id"] = str(provider["_id"])
-        provider["user_id"] = str(provider["user_id"])
-        provider["category_id"] = str(provider["category_id"])
-        
-        if "sub_category_ids" in provider and provider["sub_category_ids"]:
-            provider["sub_category_ids"] = [str(id) for id in provider["sub_category_ids"]]
-            
-        if "area_id" in provider and provider["area_id"]:
-            provider["area_id"] = str(provider["area_id"])
-            
-        if "city_id" in provider and provider["city_id"]:
-            provider["city_id"] = str(provider["city_id"])
-            
-        if "state_id" in provider and provider["state_id"]:
-            provider["state_id"] = str(provider["state_id"])
-        
         # Get user details
-        user = await user_collection.find_one({"_id": ObjectId(provider["user_id"])})
+        user = await user_collection.find_one({"_id": ObjectId(provider["user_id"])}, USER_PROJECTION)
         if user:
-            user["_id"] = str(user["_id"])
-            if "password" in user:
-                del user["password"]
             provider["user"] = user
         
-        # Get category details
-        category = await category_collection.find_one({"_id": ObjectId(provider["category_id"])})
-        if category:
-            category["_id"] = str(category["_id"])
-            provider["category"] = category
+        # Attach category, sub-categories and location from the reference data cache
+        await _attach_reference_data(provider)
         
-        # Get subcategories details
-        if "sub_category_ids" in provider and provider["sub_category_ids"]:
-            subcategories = []
-            for sub_id in provider["sub_category_ids"]:
-                subcategory = await sub_category_collection.find_one({"_id": ObjectId(sub_id)})
-                if subcategory:
-                    subcategory["_id"] = str(subcategory["_id"])
-                    subcategories.append(subcategory)
-            provider["sub_categories"] = subcategories
-        
-        # Get area details if available
-        if "area_id" in provider and provider["area_id"]:
-            area = await area_collection.find_one({"_id": ObjectId(provider["area_id"])})
-            if area:
-                area["_id"] = str(area["_id"])
-                provider["area"] = area
-        
-        # Get city details if available
-        if "city_id" in provider and provider["city_id"]:
-            city = await city_collection.find_one({"_id": ObjectId(provider["city_id"])})
-            if city:
-                city["_id"] = str(city["_id"])
-                provider["city"] = city
-        
-        # Get state details if available
-        if "state_id" in provider and provider["state_id"]:
-            state = await state_collection.find_one({"_id": ObjectId(provider["state_id"])})
-            if state:
-                state["_id"] = str(state["_id"])
-                provider["state"] = state
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider fetched successfully",
@@ -239,7 +203,7 @@ async def get_service_provider_by_id(provider_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting service provider by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -254,74 +218,20 @@ async def get_service_provider_by_user_id(user_id: str):
         
         if not provider:
             logger.warning(f"Service provider not found for user: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found for this user", "status": False}
             )
         
-        # Convert ObjectId fields to strings
-        provider["_id"] = str(provider["_id"])
-        provider["user_id"] = str(provider["user_id"])
-        provider["category_id"] = str(provider["category_id"])
-        
-        if "sub_category_ids" in provider and provider["sub_category_ids"]:
-            provider["sub_category_ids"] = [str(id) for id in provider["sub_category_ids"]]
-            
-        if "area_id" in provider and provider["area_id"]:
-            provider["area_id"] = str(provider["area_id"])
-            
-        if "city_id" in provider and provider["city_id"]:
-            provider["city_id"] = str(provider["city_id"])
-            
-        if "state_id" in provider and provider["state_id"]:
-            provider["state_id"] = str(provider["state_id"])
-        
         # Get user details
-        user = await user_collection.find_one({"_id": ObjectId(provider["user_id"])})
+        user = await user_collection.find_one({"_id": ObjectId(provider["user_id"])}, USER_PROJECTION)
         if user:
-            user["_id"] = str(user["_id"])
-            if "password" in user:
-                del user["password"]
             provider["user"] = user
         
-        # Get category details
-        category = await category_collection.find_one({"_id": ObjectId(provider["category_id"])})
-        if category:
-            category["_id"] = str(category["_id"])
-            provider["category"] = category
+        # Attach category, sub-categories and location from the reference data cache
+        await _attach_reference_data(provider)
         
-        # Get subcategories details
-        if "sub_category_ids" in provider and provider["sub_category_ids"]:
-            subcategories = []
-            for sub_id in provider["sub_category_ids"]:
-                subcategory = await sub_category_collection.find_one({"_id": ObjectId(sub_id)})
-                if subcategory:
-                    subcategory["_id"] = str(subcategory["_id"])
-                    subcategories.append(subcategory)
-            provider["sub_categories"] = subcategories
-        
-        # Get area details if available
-        if "area_id" in provider and provider["area_id"]:
-            area = await area_collection.find_one({"_id": ObjectId(provider["area_id"])})
-            if area:
-                area["_id"] = str(area["_id"])
-                provider["area"] = area
-        
-        # Get city details if available
-        if "city_id" in provider and provider["city_id"]:
-            city = await city_collection.find_one({"_id": ObjectId(provider["city_id"])})
-            if city:
-                city["_id"] = str(city["_id"])
-                provider["city"] = city
-        
-        # Get state details if available
-        if "state_id" in provider and provider["state_id"]:
-            state = await state_collection.find_one({"_id": ObjectId(provider["state_id"])})
-            if state:
-                state["_id"] = str(state["_id"])
-                provider["state"] = state
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider fetched successfully",
@@ -331,7 +241,7 @@ async def get_service_provider_by_user_id(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting service provider by user ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -345,7 +255,7 @@ async def update_service_provider(provider_id: str, provider_data: ServiceProvid
         existing_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         if not existing_provider:
             logger.warning(f"Service provider not found for update: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
@@ -378,9 +288,13 @@ async def update_service_provider(provider_id: str, provider_data: ServiceProvid
             {"$set": update_data}
         )
         
+        # Regenerate thumbnails for any changed images in the background
+        if result.matched_count:
+            image_processor.schedule_provider(provider_id, provider_image_fields(update_data))
+        
         if result.modified_count == 0 and result.matched_count > 0:
             logger.warning(f"No changes made to service provider: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=200,
                 content={"message": "No changes were made", "status": True}
             )
@@ -388,24 +302,7 @@ async def update_service_provider(provider_id: str, provider_data: ServiceProvid
         # Get updated service provider
         updated_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         
-        # Convert ObjectId fields to strings
-        updated_provider["_id"] = str(updated_provider["_id"])
-        updated_provider["user_id"] = str(updated_provider["user_id"])
-        updated_provider["category_id"] = str(updated_provider["category_id"])
-        
-        if "sub_category_ids" in updated_provider and updated_provider["sub_category_ids"]:
-            updated_provider["sub_category_ids"] = [str(id) for id in updated_provider["sub_category_ids"]]
-            
-        if "area_id" in updated_provider and updated_provider["area_id"]:
-            updated_provider["area_id"] = str(updated_provider["area_id"])
-            
-        if "city_id" in updated_provider and updated_provider["city_id"]:
-            updated_provider["city_id"] = str(updated_provider["city_id"])
-            
-        if "state_id" in updated_provider and updated_provider["state_id"]:
-            updated_provider["state_id"] = str(updated_provider["state_id"])
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider updated successfully",
@@ -415,7 +312,7 @@ async def update_service_provider(provider_id: str, provider_data: ServiceProvid
         )
     except Exception as e:
         logger.error(f"Error updating service provider: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -429,7 +326,7 @@ async def delete_service_provider(provider_id: str):
         existing_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         if not existing_provider:
             logger.warning(f"Service provider not found for deletion: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
@@ -439,12 +336,15 @@ async def delete_service_provider(provider_id: str):
         
         if result.deleted_count == 0:
             logger.warning(f"Failed to delete service provider: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete service provider", "status": False}
             )
         
-        return JSONResponse(
+        await record_service_provider_change(existing_provider, None)
+        provider_identity.invalidate(existing_provider["_id"], existing_provider.get("user_id"))
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider deleted successfully",
@@ -453,101 +353,171 @@ async def delete_service_provider(provider_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting service provider: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
+# Build the match criteria shared by filter and nearby search
+def _build_filter_query(filter_data: ServiceProviderFilter) -> Dict[str, Any]:
+    filter_query = {}
+    
+    if filter_data.category_id:
+        filter_query["category_id"] = ObjectId(filter_data.category_id)
+    
+    if filter_data.sub_category_ids and len(filter_data.sub_category_ids) > 0:
+        filter_query["sub_category_ids"] = {"$in": [ObjectId(id) for id in filter_data.sub_category_ids]}
+    
+    if filter_data.area_id:
+        filter_query["area_id"] = ObjectId(filter_data.area_id)
+    
+    if filter_data.city_id:
+        filter_query["city_id"] = ObjectId(filter_data.city_id)
+    
+    if filter_data.state_id:
+        filter_query["state_id"] = ObjectId(filter_data.state_id)
+    
+    if filter_data.rating_min is not None:
+        filter_query["avg_rating"] = {"$gte": filter_data.rating_min}
+    
+    if filter_data.is_verified is not None:
+        filter_query["is_verified"] = filter_data.is_verified
+    
+    # Always return active service providers
+    filter_query["is_active"] = True
+    return filter_query
+
+# Attach users and categories to a page of search results
+async def _process_search_results(providers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Fetch all users in one query
+    users = await fetch_documents_by_ids(user_collection, (p.get("user_id") for p in providers), PROVIDER_USER_PROJECTION)
+    
+    processed_providers = []
+    for provider in providers:
+        provider.pop("gallery_images", None)
+        provider.pop("gallery_image_variants", None)
+        
+        # Attach user details
+        user = users.get(str(provider["user_id"]))
+        if user:
+            provider["user"] = user
+        
+        # Get category details
+        category = await reference_data.get(CATEGORIES, provider["category_id"])
+        if category:
+            provider["category"] = category
+        
+        processed_providers.append(provider)
+    return processed_providers
+
 # Filter service providers
 async def filter_service_providers(filter_data: ServiceProviderFilter):
     try:
         logger.info("Filtering service providers")
         
         # Build filter query
-        filter_query = {}
-        
-        if filter_data.category_id:
-            filter_query["category_id"] = ObjectId(filter_data.category_id)
-        
-        if filter_data.sub_category_ids and len(filter_data.sub_category_ids) > 0:
-            filter_query["sub_category_ids"] = {"$in": [ObjectId(id) for id in filter_data.sub_category_ids]}
-        
-        if filter_data.area_id:
-            filter_query["area_id"] = ObjectId(filter_data.area_id)
-        
-        if filter_data.city_id:
-            filter_query["city_id"] = ObjectId(filter_data.city_id)
-        
-        if filter_data.state_id:
-            filter_query["state_id"] = ObjectId(filter_data.state_id)
-        
-        if filter_data.rating_min is not None:
-            filter_query["avg_rating"] = {"$gte": filter_data.rating_min}
-        
-        if filter_data.is_verified is not None:
-            filter_query["is_verified"] = filter_data.is_verified
-        
-        # Always return active service providers
-        filter_query["is_active"] = True
-        
-        # Add search term if provided
-        if filter_data.search_term:
-            filter_query["$or"] = [
-                {"business_name": {"$regex": filter_data.search_term, "$options": "i"}},
-                {"description": {"$regex": filter_data.search_term, "$options": "i"}}
+        filter_query = _build_filter_query(filter_data)
+        
+        rating = {"$ifNull": ["$avg_rating", 0]}
+        search_term = (filter_data.search_term or "").strip()
+        if search_term:
+            # Text index match, ranked by relevance boosted by rating
+            pipeline = [
+                {"$match": {**filter_query, "$text": {"$search": search_term}}},
+                {"$addFields": {"search_score": {"$multiply": [
+                    {"$meta": "textScore"},
+                    {"$add": [1, {"$multiply": [SEARCH_RATING_WEIGHT / 5, rating]}]}
+                ]}}}
+            ]
+        else:
+            # No search term, best rated first
+            pipeline = [
+                {"$match": filter_query},
+                {"$addFields": {"search_score": rating}}
             ]
         
         # Execute query
-        providers = await service_provider_collection.find(filter_query).to_list(length=1000)
-        
-        # Process providers for response
-        processed_providers = []
-        for provider in providers:
-            # Convert ObjectId fields to strings
-            provider["_id"] = str(provider["_id"])
-            provider["user_id"] = str(provider["user_id"])
-            provider["category_id"] = str(provider["category_id"])
-            
-            if "sub_category_ids" in provider and provider["sub_category_ids"]:
-                provider["sub_category_ids"] = [str(id) for id in provider["sub_category_ids"]]
-                
-            if "area_id" in provider and provider["area_id"]:
-                provider["area_id"] = str(provider["area_id"])
-                
-            if "city_id" in provider and provider["city_id"]:
-                provider["city_id"] = str(provider["city_id"])
-                
-            if "state_id" in provider and provider["state_id"]:
-                provider["state_id"] = str(provider["state_id"])
-            
-            # Get user details
-            user = await user_collection.find_one({"_id": ObjectId(provider["user_id"])})
-            if user:
-                user["_id"] = str(user["_id"])
-                if "password" in user:
-                    del user["password"]
-                provider["user"] = user
-            
-            # Get category details
-            category = await category_collection.find_one({"_id": ObjectId(provider["category_id"])})
-            if category:
-                category["_id"] = str(category["_id"])
-                provider["category"] = category
-            
-            processed_providers.append(provider)
+        providers, next_cursor = await paginate_pipeline(
+            service_provider_collection, pipeline,
+            cursor=filter_data.cursor, limit=filter_data.limit, sort_field="search_score"
+        )
+        processed_providers = await _process_search_results(providers)
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service providers filtered successfully",
                 "service_providers": processed_providers,
                 "count": len(processed_providers),
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error filtering service providers: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}", "status": False}
+        )
+
+# Find service providers near a point, closest first
+async def get_nearby_service_providers(
+    longitude: float,
+    latitude: float,
+    filter_data: ServiceProviderFilter,
+    max_distance_km: Optional[float] = None
+):
+    try:
+        logger.info(f"Finding service providers near ({longitude}, {latitude})")
+        
+        if max_distance_km is None:
+            max_distance_km = NEARBY_DEFAULT_DISTANCE_KM
+        max_distance_km = min(max_distance_km, NEARBY_MAX_DISTANCE_KM)
+        
+        # $geoNear must be the first stage; it uses the location 2dsphere index
+        # and applies the other criteria as its query
+        pipeline = [
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": [longitude, latitude]},
+                "distanceField": "distance",
+                "maxDistance": max_distance_km * 1000,
+                "query": _build_filter_query(filter_data),
+                "spherical": True
+            }}
+        ]
+        
+        providers, next_cursor = await paginate_pipeline(
+            service_provider_collection, pipeline,
+            cursor=filter_data.cursor, limit=filter_data.limit, sort_field="distance", direction=1
+        )
+        processed_providers = await _process_search_results(providers)
+        
+        return BSONJSONResponse(
+            status_code=200,
+            content={
+                "message": "Nearby service providers fetched successfully",
+                "service_providers": processed_providers,
+                "count": len(processed_providers),
+                "max_distance_km": max_distance_km,
+                "next_cursor": next_cursor,
+                "status": True
+            }
+        )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
+    except Exception as e:
+        logger.error(f"Error finding nearby service providers: {str(e)}")
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -561,7 +531,7 @@ async def verify_service_provider(provider_id: str, is_verified: bool):
         existing_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         if not existing_provider:
             logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
@@ -579,18 +549,20 @@ async def verify_service_provider(provider_id: str, is_verified: bool):
         
         if result.modified_count == 0:
             if existing_provider.get("is_verified") == is_verified:
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=200,
                     content={"message": f"Service provider already {'verified' if is_verified else 'unverified'}", "status": True}
                 )
             else:
                 logger.warning(f"Failed to update verification status for service provider: {provider_id}")
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=500,
                     content={"message": "Failed to update verification status", "status": False}
                 )
         
-        return JSONResponse(
+        await record_service_provider_change(existing_provider, {**existing_provider, "is_verified": is_verified})
+        
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": f"Service provider {'verified' if is_verified else 'unverified'} successfully",
@@ -599,7 +571,7 @@ async def verify_service_provider(provider_id: str, is_verified: bool):
         )
     except Exception as e:
         logger.error(f"Error updating service provider verification status: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -609,53 +581,27 @@ async def update_provider_rating(provider_id: str, rating: float):
     try:
         logger.info(f"Updating rating for service provider: {provider_id}")
         
-        # Check if service provider exists
-        existing_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
-        if not existing_provider:
+        # Add the rating to the provider's counters atomically
+        summary = await record_rating_change(provider_id, new_rating=rating)
+        if summary is None:
             logger.warning(f"Service provider not found: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
         
-        # Calculate new average rating
-        current_total = existing_provider.get("total_ratings", 0)
-        current_avg = existing_provider.get("avg_rating", 0.0)
-        
-        new_total = current_total + 1
-        new_avg = ((current_avg * current_total) + rating) / new_total
-        
-        # Update rating information
-        result = await service_provider_collection.update_one(
-            {"_id": ObjectId(provider_id)},
-            {
-                "$set": {
-                    "avg_rating": round(new_avg, 1),
-                    "total_ratings": new_total,
-                    "updated_at": datetime.now()
-                }
-            }
-        )
-        
-        if result.modified_count == 0:
-            logger.warning(f"Failed to update rating for service provider: {provider_id}")
-            return JSONResponse(
-                status_code=500,
-                content={"message": "Failed to update rating", "status": False}
-            )
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Service provider rating updated successfully",
-                "avg_rating": round(new_avg, 1),
-                "total_ratings": new_total,
+                "avg_rating": summary["avg_rating"],
+                "total_ratings": summary["total_ratings"],
                 "status": True
             }
         )
     except Exception as e:
         logger.error(f"Error updating service provider rating: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -669,28 +615,36 @@ async def upload_service_provider_avatar(provider_id: str, avatar: UploadFile):
         existing_provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
         if not existing_provider:
             logger.warning(f"Service provider not found for avatar upload: {provider_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "Service provider not found", "status": False}
             )
         
-        # Create a unique filename for the avatar
-        file_ext = avatar.filename.split(".")[-1]  # Get file extension
-        unique_filename = f"{provider_id}_{uuid4()}.{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        # Save the uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(avatar.file, buffer)
+        # Stream the file to disk under its content hash
+        try:
+            stored = await save_upload(avatar, UPLOAD_DIR)
+        except UploadTooLargeError as e:
+            logger.warning(f"Avatar upload too large for service provider {provider_id}: {str(e)}")
+            return BSONJSONResponse(
+                status_code=413,
+                content={"message": str(e), "status": False}
+            )
+        except UploadError as e:
+            logger.warning(f"Rejected avatar upload for service provider {provider_id}: {str(e)}")
+            return BSONJSONResponse(
+                status_code=400,
+                content={"message": str(e), "status": False}
+            )
         
         # Create a relative URL for the avatar
-        avatar_url = f"/uploads/avatars/{unique_filename}"
+        avatar_url = stored["url"]
         
         # Update the service provider's avatar field
         await service_provider_collection.update_one(
             {"_id": ObjectId(provider_id)},
             {"$set": {"avatar": avatar_url, "updated_at": datetime.now()}}
         )
+        image_processor.schedule_provider(provider_id, {"avatar": avatar_url})
         
         # Also update the user's avatar if exists
         provider = await service_provider_collection.find_one({"_id": ObjectId(provider_id)})
@@ -700,9 +654,10 @@ async def upload_service_provider_avatar(provider_id: str, avatar: UploadFile):
                 {"_id": ObjectId(user_id)},
                 {"$set": {"avatar": avatar_url}}
             )
+            invalidate_cached_user(user_id)
         
         logger.info(f"Avatar uploaded successfully for service provider: {provider_id}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Avatar uploaded successfully",
@@ -712,7 +667,7 @@ async def upload_service_provider_avatar(provider_id: str, avatar: UploadFile):
         )
     except Exception as e:
         logger.error(f"Error uploading avatar for service provider: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -1,20 +1,22 @@
 from models.StateModel import State,StateOut
 from bson import ObjectId
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from fastapi import HTTPException
 from config.database import state_collection
+from utils.reference_data import invalidate_reference_data, STATES
 
 async def addState(state:State):
     savedState = await state_collection.insert_one(state.dict())
+    invalidate_reference_data(STATES)
     if savedState:
-        return JSONResponse(status_code=201,content={"message:":"State Added Successfully"})
+        return BSONJSONResponse(status_code=201,content={"message:":"State Added Successfully"})
     raise HTTPException(status_code=500,detail="Internal Server Error")
 
 async def getStates():
     states = await state_collection.find().to_list()
     #check lennght of states
     if len(states)==0:
-        return JSONResponse(status_code=404,content={"message":"No State Found"})
+        return BSONJSONResponse(status_code=404,content={"message":"No State Found"})
     return [StateOut(**state) for state in states]
     
     
\ No newline at end of file
@@ -2,13 +2,17 @@ from bson import ObjectId
 from models.UserModel import User,UserOut,UserLogin,UserProfileUpdate,PasswordChange
 from config.database import user_collection,role_collection
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-import bcrypt
+from utils.responses import BSONJSONResponse
+from utils.projection import build_projection
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from utils.Sendmail import send_mail
 from datetime import datetime
 from pymongo.errors import PyMongoError
+from utils.pagination import paginate, InvalidCursorError
+from middleware.auth import invalidate_cached_user
+from utils.password_hashing import hash_password, verify_password, PasswordHasherBusyError, BUSY_HEADERS
+from utils.user_lookup import find_user_by_email, with_normalized_email, normalize_email
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -21,46 +25,39 @@ async def addUser(user:User):
     # user.role_id = ObjectId(user.role_id)
     # print("after type cast",user.role_id
     user.role_id = ObjectId(user.role_id)
-    result = await user_collection.insert_one(user.dict())
+    result = await user_collection.insert_one(with_normalized_email(user.dict()))
     #return {"Message":"user created successfully"}
     
-    return JSONResponse(status_code=201,content={"message":"User created successfully"})
+    return BSONJSONResponse(status_code=201,content={"message":"User created successfully"})
     #raise HTTPException(status_code=500,detail="User not created")
 
 # async def getAllUsers():
 #     users = await user_collection.find().to_list()
 #     return [UserOut(**user) for user in users]
 
-async def getAllUsers():
+async def getAllUsers(cursor: Optional[str] = None, limit: Optional[int] = None):
     try:
         logger.info("Getting all users")
-        users = await user_collection.find().to_list(length=1000)
-        
-        # Process users for response
-        processed_users = []
-        for user in users:
-            # Convert ObjectId to string
-            user["_id"] = str(user["_id"])
-            if "role_id" in user and isinstance(user["role_id"], ObjectId):
-                user["role_id"] = str(user["role_id"])
-            
-            # Remove sensitive information
-            if "password" in user:
-                del user["password"]
-            
-            processed_users.append(user)
+        users, next_cursor = await paginate(user_collection, cursor=cursor, limit=limit, projection=build_projection())
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Users fetched successfully",
-                "users": processed_users,
+                "users": users,
+                "next_cursor": next_cursor,
                 "status": True
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        return BSONJSONResponse(
+            status_code=400,
+            content={"message": str(e), "status": False}
+        )
     except Exception as e:
         logger.error(f"Error getting all users: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -72,13 +69,19 @@ async def loginUser(request:UserLogin):
     foundUser = await user_collection.find_one({"email":request.email})
     print(":foundUser",foundUser)
     
+    if foundUser is None:
+        raise HTTPException(status_code=404,detail="User not found")
+    
     foundUser["_id"] = str(foundUser["_id"])
     foundUser["role_id"] = str(foundUser["role_id"])
     
-    if foundUser is None:
-        raise HTTPException(status_code=404,detail="User not found")
     #compare password
-    if "password" in foundUser and bcrypt.checkpw(request.password.encode(),foundUser["password"].encode()):
+    try:
+        password_matched = "password" in foundUser and await verify_password(request.password,foundUser["password"])
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting login")
+        raise HTTPException(status_code=503,detail="Server is busy, please try again shortly",headers=BUSY_HEADERS)
+    if password_matched:
         #database role.. roleid
         role = await role_collection.find_one({"_id":ObjectId(foundUser["role_id"])})
         foundUser["role"] = role
@@ -90,25 +93,16 @@ async def loginUser(request:UserLogin):
 async def getUserById(user_id: str):
     try:
         logger.info(f"Getting user by ID: {user_id}")
-        user = await user_collection.find_one({"_id": ObjectId(user_id)})
+        user = await user_collection.find_one({"_id": ObjectId(user_id)}, build_projection())
         
         if not user:
             logger.warning(f"User not found: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
         
-        # Convert ObjectId to string
-        user["_id"] = str(user["_id"])
-        if "role_id" in user and isinstance(user["role_id"], ObjectId):
-            user["role_id"] = str(user["role_id"])
-        
-        # Remove sensitive information
-        if "password" in user:
-            del user["password"]
-        
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User found successfully",
@@ -118,7 +112,7 @@ async def getUserById(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error getting user by ID: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -132,7 +126,7 @@ async def updateUser(user_id: str, user_data: UserProfileUpdate):
         existing_user = await user_collection.find_one({"_id": ObjectId(user_id)})
         if not existing_user:
             logger.warning(f"User not found for update: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
@@ -147,11 +141,11 @@ async def updateUser(user_id: str, user_data: UserProfileUpdate):
             del update_data["role_id"]
         
         # If email is being updated, check if new email already exists
-        if "email" in update_data and update_data["email"] != existing_user.get("email"):
-            existing_email = await user_collection.find_one({"email": update_data["email"]})
+        if "email" in update_data and normalize_email(update_data["email"]) != normalize_email(existing_user.get("email")):
+            existing_email = await find_user_by_email(update_data["email"], {"_id": 1})
             if existing_email:
                 logger.warning(f"Email already in use: {update_data['email']}")
-                return JSONResponse(
+                return BSONJSONResponse(
                     status_code=400,
                     content={"message": "Email already in use by another account", "status": False}
                 )
@@ -159,12 +153,13 @@ async def updateUser(user_id: str, user_data: UserProfileUpdate):
         # Update user
         result = await user_collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": update_data}
+            {"$set": with_normalized_email(update_data)}
         )
+        invalidate_cached_user(user_id)
         
         if result.modified_count == 0:
             logger.warning(f"No changes made to user: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=200,
                 content={"message": "No changes were made", "status": True}
             )
@@ -179,7 +174,7 @@ async def updateUser(user_id: str, user_data: UserProfileUpdate):
         if "password" in updated_user:
             del updated_user["password"]
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User updated successfully",
@@ -189,7 +184,7 @@ async def updateUser(user_id: str, user_data: UserProfileUpdate):
         )
     except Exception as e:
         logger.error(f"Error updating user: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -203,22 +198,23 @@ async def deleteUser(user_id: str):
         existing_user = await user_collection.find_one({"_id": ObjectId(user_id)})
         if not existing_user:
             logger.warning(f"User not found for deletion: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
         
         # Delete user
         result = await user_collection.delete_one({"_id": ObjectId(user_id)})
+        invalidate_cached_user(user_id)
         
         if result.deleted_count == 0:
             logger.warning(f"Failed to delete user: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to delete user", "status": False}
             )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "User deleted successfully",
@@ -227,7 +223,7 @@ async def deleteUser(user_id: str):
         )
     except Exception as e:
         logger.error(f"Error deleting user: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
@@ -241,7 +237,7 @@ async def changeUserPassword(user_id: str, password_data: PasswordChange):
         existing_user = await user_collection.find_one({"_id": ObjectId(user_id)})
         if not existing_user:
             logger.warning(f"User not found for password change: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=404,
                 content={"message": "User not found", "status": False}
             )
@@ -250,7 +246,7 @@ async def changeUserPassword(user_id: str, password_data: PasswordChange):
         stored_password = existing_user.get("password", "")
         if not stored_password:
             logger.warning(f"User has no password set: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": "User has no password set", "status": False}
             )
@@ -264,88 +260,80 @@ async def changeUserPassword(user_id: str, password_data: PasswordChange):
             else:
                 # Try bcrypt verification
                 try:
-                    password_matched = bcrypt.checkpw(
-                        password_data.current_password.encode(), 
-                        stored_password.encode('utf-8')
-                    )
+                    password_matched = await verify_password(password_data.current_password, stored_password)
+                except PasswordHasherBusyError:
+                    raise
                 except Exception as pw_err:
                     logger.error(f"Password check error: {str(pw_err)}")
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Password verification error: {str(e)}")
         
         if not password_matched:
             logger.warning(f"Current password is incorrect for user: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=400,
                 content={"message": "Current password is incorrect", "status": False}
             )
         
         # Hash the new password
-        hashed_password = bcrypt.hashpw(
-            password_data.new_password.encode('utf-8'), 
-            bcrypt.gensalt()
-        ).decode('utf-8')
+        hashed_password = await hash_password(password_data.new_password)
         
         # Update the password
         result = await user_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"password": hashed_password}}
         )
+        invalidate_cached_user(user_id)
         
         if result.modified_count == 0:
             logger.warning(f"Failed to update password for user: {user_id}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=500,
                 content={"message": "Failed to update password", "status": False}
             )
         
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Password updated successfully",
                 "status": True
             }
         )
+    except PasswordHasherBusyError:
+        logger.warning("Password hasher busy, rejecting password change")
+        return BSONJSONResponse(
+            status_code=503,
+            content={"message": "Server is busy, please try again shortly", "status": False},
+            headers=BUSY_HEADERS
+        )
     except Exception as e:
         logger.error(f"Error changing password: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
     
-async def get_all_users(skip: int = 0, limit: int = 100) -> List[Dict]:
+async def get_all_users(cursor: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
     """
-    Get all users with pagination
+    Get all users with keyset pagination, newest first
     
     Args:
-        skip: Number of records to skip
+        cursor: Cursor returned with the previous page, None for the first page
         limit: Maximum number of records to return
         
     Returns:
-        List[Dict]: List of users
+        Tuple[List[Dict], Optional[str]]: List of users and the cursor for the next page
     """
     try:
         users = []
-        cursor = user_collection.find().skip(skip).limit(limit).sort("created_at", -1)
+        documents, next_cursor = await paginate(user_collection, cursor=cursor, limit=limit, projection=build_projection())
         
-        async for document in cursor:
-            # Convert ObjectId to string
+        # ObjectIds and datetimes are left for the response encoder
+        for document in documents:
             if "_id" in document:
-                document["id"] = str(document.pop("_id"))
-            
-            # Convert role_id ObjectId to string if present
-            if "role_id" in document and isinstance(document["role_id"], ObjectId):
-                document["role_id"] = str(document["role_id"])
-            
-            # Convert datetime to ISO format if present
-            if "created_at" in document and isinstance(document["created_at"], datetime):
-                document["created_at"] = document["created_at"].isoformat()
-            if "updated_at" in document and isinstance(document["updated_at"], datetime):
-                document["updated_at"] = document["updated_at"].isoformat()
-                
-            # Remove password field for security
-            if "password" in document:
-                document.pop("password")
+                document["id"] = document.pop("_id")
                 
             # Add missing fields needed by frontend
             if "is_active" not in document:
@@ -356,8 +344,11 @@ async def get_all_users(skip: int = 0, limit: int = 100) -> List[Dict]:
         logger.info(f"Retrieved {len(users)} users")
         
         # Return data in consistent format
-        return users
+        return users, next_cursor
     
+    except InvalidCursorError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=400, detail=str(e))
     except PyMongoError as e:
         logger.error(f"Database error retrieving users: {str(e)}")
         raise HTTPException(
@@ -409,21 +400,11 @@ async def get_user_by_id(user_id: str) -> Optional[Dict]:
     try:
         # Convert string ID to ObjectId
         oid = ObjectId(user_id)
-        user = await user_collection.find_one({"_id": oid})
+        user = await user_collection.find_one({"_id": oid}, build_projection())
         
+        # ObjectIds and datetimes are left for the response encoder
         if user:
-            # Convert ObjectId to string
-            user["id"] = str(user.pop("_id"))
-            
-            # Convert datetime to ISO format if present
-            if "created_at" in user and isinstance(user["created_at"], datetime):
-                user["created_at"] = user["created_at"].isoformat()
-            if "updated_at" in user and isinstance(user["updated_at"], datetime):
-                user["updated_at"] = user["updated_at"].isoformat()
-                
-            # Remove password field for security
-            if "password" in user:
-                user.pop("password")
+            user["id"] = user.pop("_id")
                 
             logger.info(f"Retrieved user with ID: {user_id}")
             return user
@@ -466,7 +447,7 @@ async def update_user_profile(user_id: str, user_update: UserProfileUpdate) -> O
             return None
         
         # Prepare update data
-        update_data = user_update.dict(exclude_unset=True)
+        update_data = with_normalized_email(user_update.dict(exclude_unset=True))
         update_data["updated_at"] = datetime.now()
         
         # Update the user
@@ -474,23 +455,12 @@ async def update_user_profile(user_id: str, user_update: UserProfileUpdate) -> O
             {"_id": oid},
             {"$set": update_data}
         )
+        invalidate_cached_user(user_id)
         
         if result.modified_count:
             # Get the updated user
-            updated_user = await user_collection.find_one({"_id": oid})
-            
-            # Convert ObjectId to string
-            updated_user["id"] = str(updated_user.pop("_id"))
-            
-            # Convert datetime to ISO format
-            if "created_at" in updated_user and isinstance(updated_user["created_at"], datetime):
-                updated_user["created_at"] = updated_user["created_at"].isoformat()
-            if "updated_at" in updated_user and isinstance(updated_user["updated_at"], datetime):
-                updated_user["updated_at"] = updated_user["updated_at"].isoformat()
-            
-            # Remove password field for security
-            if "password" in updated_user:
-                updated_user.pop("password")
+            updated_user = await user_collection.find_one({"_id": oid}, build_projection())
+            updated_user["id"] = updated_user.pop("_id")
             
             logger.info(f"Updated profile for user ID: {user_id}")
             return updated_user
@@ -533,6 +503,7 @@ async def delete_user(user_id: str) -> bool:
         
         # Delete the user
         result = await user_collection.delete_one({"_id": oid})
+        invalidate_cached_user(user_id)
         
         if result.deleted_count:
             logger.info(f"Deleted user with ID: {user_id}")
@@ -1,9 +1,9 @@
 from models.ProductModel import Product
 from config.database import product_collection
 from fastapi import APIRouter, HTTPException, UploadFile, File,Form
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from bson import ObjectId
-import shutil
+from utils.uploads import save_upload, UploadError, UploadTooLargeError
 import os
 
 
@@ -20,7 +20,7 @@ async def create_product(product: Product):
     
     #insert product into database
     savedProduct= await product_collection.insert_one(product.dict())
-    return JSONResponse(content={"message":"Product created successfully"},status_code=201)
+    return BSONJSONResponse(content={"message":"Product created successfully"},status_code=201)
 
 async def create_Product_withFile(
     name: str = Form(...),
@@ -31,11 +31,13 @@ async def create_Product_withFile(
     file: UploadFile = File(...)
 ):
     try:
-        # Save the uploaded file
-        file_ext = file.filename.split(".")[-1]  # Get file extension
-        file_path = os.path.join(UPLOAD_DIR, f"{ObjectId()}.{file_ext}")  # Rename file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save the uploaded file under its content hash
+        try:
+            file_path = (await save_upload(file, UPLOAD_DIR))["path"]
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         # Create a product object
         product_data = {
@@ -46,12 +48,14 @@ async def create_Product_withFile(
             # "user_id": ObjectId(user_id),
             "image_url": file_path  # Save file path in the database
         }
-        return JSONResponse(
+        return BSONJSONResponse(
             content={
                 "message": "Product created successfully",
                 "image_url": file_path
             },
             status_code=201
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
\ No newline at end of file
@@ -1,5 +1,6 @@
 import asyncio
 from config.database import token_collection, user_collection
+from utils.user_lookup import find_user_by_email, with_normalized_email
 import datetime
 import secrets
 import string
@@ -19,7 +20,7 @@ async def create_test_token(email=None, test_only=False):
     print(f"Creating test token for email: {email}")
     
     # Find the user by email
-    user = await user_collection.find_one({"email": email})
+    user = await find_user_by_email(email)
     
     if not user and not test_only:
         print(f"User with email {email} not found. Creating test user instead.")
@@ -38,7 +39,7 @@ async def create_test_token(email=None, test_only=False):
             "updated_at": datetime.datetime.utcnow().isoformat()
         }
         
-        result = await user_collection.insert_one(user_data)
+        result = await user_collection.insert_one(with_normalized_email(user_data))
         user = await user_collection.find_one({"_id": result.inserted_id})
         print(f"Created test user with ID: {user['_id']}")
     
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from config.database import service_provider_collection
+from utils.image_derivatives import provider_image_fields, refresh_provider_variants
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Generate thumbnails for the avatar, profile and gallery images of every service provider"""
+    try:
+        processed = 0
+        projection = {"avatar": 1, "profile_image": 1, "gallery_images": 1}
+        async for provider in service_provider_collection.find({}, projection):
+            fields = provider_image_fields(provider)
+            if fields:
+                await refresh_provider_variants(provider["_id"], fields)
+                processed += 1
+        print(f"Generated image derivatives for {processed} service providers")
+    except Exception as e:
+        logger.error(f"Error generating image derivatives: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(main())
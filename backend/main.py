@@ -16,12 +16,29 @@ from routes.NotificationRoutes import router as notification_router
 from routes.DashboardRoutes import router as dashboard_router
 from routes.ContactRoutes import contact_router
 from routes.PaymentRoutes import payment_router
+from routes.EventRoutes import router as event_router
 # Removing non-existent modules
 # from routes.SearchRoutes import router as search_router
 # from routes.StatisticsRoutes import router as statistics_router
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from config.database import create_indexes
+from config.indexes import create_indexes
+from middleware.auth import principal_cache
+from utils.password_hashing import password_hasher_stats
+from utils.email_queue import email_dispatcher
+from utils.provider_ratings import rating_reconciler
+from utils.notification_fanout import notification_fanout
+from utils.notification_counters import unread_count_cache
+from utils.event_bus import event_bus, change_stream_relay
+from utils.provider_identity import provider_identity
+from utils.image_derivatives import image_processor
+from utils.invoice_sequence import invoice_sequence
+from utils.idempotency import idempotency_cache
+from utils.static_files import CachedStaticFiles
+from utils.reference_data import reference_data
+from utils.user_lookup import backfill_email_normalized_if_needed
+from utils.dashboard_stats import rebuild_dashboard_stats_if_empty
+from utils.responses import BSONJSONResponse
 import time
 from fastapi import FastAPI
 from routes import BookingRoutes
@@ -29,7 +46,6 @@ from bson import ObjectId
 import json
 from typing import Any
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
 app = FastAPI()
 # app.include_router(BookingRoutes.router)
@@ -38,29 +54,22 @@ app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Responses are rendered by the BSON-aware encoder, which handles ObjectId and
+# datetime values at any depth
 app = FastAPI(
     title="E-Garage API",
     description="API for E-Garage service provider management system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=BSONJSONResponse
 )
 
-# Custom JSON encoder to handle ObjectId serialization
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj: Any) -> Any:
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super().default(obj)
-
-# Configure JSON serialization to handle ObjectId
-app.json_encoder = CustomJSONEncoder
-
 # Global exception handler for ObjectId serialization errors
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     # Check if it's a PydanticSerializationError for ObjectId
     if "PydanticSerializationError" in str(exc) and "bson.objectid.ObjectId" in str(exc):
         logger.error(f"ObjectId serialization error: {str(exc)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": "Data serialization error", "detail": "The server encountered an error processing the request"},
         )
@@ -86,7 +95,11 @@ app.add_middleware(
     allow_origins=["*"],  # or ["http://localhost:3000"] if React is on port 3000
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # Keyset-paginated lists that return a bare array pass their cursor in this
+    # header; cross-origin clients such as the React admin's getAllPages() can
+    # only read it once it is exposed
+    expose_headers=["X-Next-Cursor"]
 )
 
 
@@ -108,6 +121,10 @@ app.include_router(notification_router)
 app.include_router(dashboard_router)
 app.include_router(contact_router)
 app.include_router(payment_router)
+app.include_router(event_router)
+
+# Uploaded images and their derivatives, served with long-lived cache headers
+app.mount("/uploads", CachedStaticFiles(directory="uploads", check_dir=False), name="uploads")
 # Removed non-existent routers
 # app.include_router(search_router)
 # app.include_router(statistics_router)
@@ -129,11 +146,53 @@ async def startup_event():
     """
     logger.info("Starting up E-Garage API")
     try:
-        # Create database indexes
-        create_indexes()  # Removed 'await' if create_indexes is not async
-        logger.info("Database indexes created successfully")
+        # Create missing database indexes
+        await create_indexes()
     except Exception as e:
         logger.error(f"Error creating database indexes: {str(e)}")
+    
+    # Make users created before email_normalized existed findable by email
+    try:
+        result = await backfill_email_normalized_if_needed()
+        if result is not None:
+            logger.info(f"Backfilled email_normalized on {result['updated']} users")
+    except Exception as e:
+        logger.error(f"Error backfilling email_normalized: {str(e)}")
+    
+    # Build the dashboard counters of a database that has none yet
+    try:
+        written = await rebuild_dashboard_stats_if_empty()
+        if written is not None:
+            logger.info(f"Built {written} dashboard counters documents")
+    except Exception as e:
+        logger.error(f"Error building dashboard counters: {str(e)}")
+    
+    # Warm the reference data cache
+    try:
+        await reference_data.load_all()
+    except Exception as e:
+        logger.error(f"Error loading reference data: {str(e)}")
+    
+    # Start background email delivery
+    await email_dispatcher.start()
+    
+    # Start periodic reconciliation of service provider ratings
+    await rating_reconciler.start()
+    
+    # Relay change stream events when EVENT_SOURCE=change_streams
+    await change_stream_relay.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Execute actions on application shutdown
+    """
+    logger.info("Shutting down E-Garage API")
+    await rating_reconciler.stop()
+    await notification_fanout.stop()
+    await change_stream_relay.stop()
+    await image_processor.stop()
+    await email_dispatcher.stop()
 
 @app.get("/api/health")
 async def health_check():
@@ -142,6 +201,24 @@ async def health_check():
     """
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/api/metrics")
+async def metrics():
+    """
+    In-process cache and queue metrics
+    """
+    return {
+        "auth_principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher_stats(),
+        "email_dispatcher": email_dispatcher.stats(),
+        "reference_data": reference_data.stats(),
+        "notification_unread_count_cache": unread_count_cache.stats(),
+        "event_bus": event_bus.stats(),
+        "provider_identity": provider_identity.stats(),
+        "image_processor": image_processor.stats(),
+        "invoice_sequence": invoice_sequence.stats(),
+        "idempotency_cache": idempotency_cache.stats()
+    }
+
 @app.get("/")
 async def root():
     """
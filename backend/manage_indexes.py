@@ -0,0 +1,49 @@
+"""
+Show or apply differences between config/indexes.py and the database.
+
+Usage:
+    python manage_indexes.py diff
+    python manage_indexes.py apply [--rebuild-changed] [--drop-extra]
+"""
+
+import argparse
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from config.indexes import diff_indexes, apply_indexes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def print_report(report):
+    if not report:
+        print("All indexes match their specs")
+        return
+    for collection_name, diff in report.items():
+        print(f"{collection_name}:")
+        for kind in ("missing", "changed", "extra"):
+            for name in diff[kind]:
+                print(f"  {kind:<8} {name}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("diff", help="Show missing, changed and extra indexes")
+    apply_parser = subcommands.add_parser("apply", help="Create missing indexes")
+    apply_parser.add_argument("--rebuild-changed", action="store_true", help="Drop and recreate indexes that differ from their spec")
+    apply_parser.add_argument("--drop-extra", action="store_true", help="Drop indexes that are not in the specs")
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        print_report(await diff_indexes())
+    else:
+        print_report(await apply_indexes(rebuild_changed=args.rebuild_changed, drop_extra=args.drop_extra))
+        print("Remaining differences:")
+        print_report(await diff_indexes())
+
+if __name__ == "__main__":
+    asyncio.run(main())
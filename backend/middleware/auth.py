@@ -2,9 +2,12 @@ from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config.database import user_collection, role_collection
 from bson import ObjectId
+from utils.ttl_cache import TTLCache
+import copy
 import jwt
 import logging
-from typing import Dict, Any
+import os
+from typing import Dict, Any, Optional
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +19,56 @@ ALGORITHM = "HS256"
 
 security = HTTPBearer()
 
+# Resolved principals (user document with embedded role) keyed by user id.
+# Entries are dropped by the invalidate_* hooks whenever a user or role changes,
+# and a lookup that was loading while one ran does not cache its result; the
+# TTL bounds staleness for writes that bypass those hooks.
+principal_cache = TTLCache(
+    "auth_principal",
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+)
+
+def invalidate_cached_user(user_id: Any):
+    """
+    Drop the cached principal for a user after it was updated or deleted
+    """
+    principal_cache.invalidate(str(user_id))
+
+def invalidate_cached_role(role_id: Any):
+    """
+    Drop every cached principal holding the given role after the role changed
+    """
+    role_id = str(role_id)
+    principal_cache.invalidate_where(lambda _, user: user.get("role_id") == role_id)
+
+async def _load_principal(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a user with its role embedded and sensitive fields removed
+    """
+    user = await user_collection.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    if user is None:
+        return None
+    
+    # Convert ObjectId to string
+    user["_id"] = str(user["_id"])
+    
+    # Get role information if role_id exists
+    if "role_id" in user:
+        role_id = user["role_id"]
+        if isinstance(role_id, ObjectId) or isinstance(role_id, str):
+            role_id_obj = role_id if isinstance(role_id, ObjectId) else ObjectId(role_id)
+            role = await role_collection.find_one({"_id": role_id_obj})
+            if role:
+                role["_id"] = str(role["_id"])
+                user["role"] = role
+        
+        # Convert role_id to string if it's an ObjectId
+        if isinstance(user["role_id"], ObjectId):
+            user["role_id"] = str(user["role_id"])
+    
+    return user
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Get the current authenticated user from the JWT token.
@@ -36,39 +89,26 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Get user from database
-        user = await user_collection.find_one({"_id": ObjectId(user_id)})
-        
+        # Resolve the principal, hitting the database only on a cache miss
+        user = principal_cache.get(user_id)
         if user is None:
-            logger.error(f"User not found: {user_id}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Convert ObjectId to string
-        user["_id"] = str(user["_id"])
-        
-        # Get role information if role_id exists
-        if "role_id" in user:
-            role_id = user["role_id"]
-            if isinstance(role_id, ObjectId) or isinstance(role_id, str):
-                role_id_obj = role_id if isinstance(role_id, ObjectId) else ObjectId(role_id)
-                role = await role_collection.find_one({"_id": role_id_obj})
-                if role:
-                    role["_id"] = str(role["_id"])
-                    user["role"] = role
+            # Read before loading, so an invalidation during the load keeps
+            # the possibly stale principal out of the cache
+            generation = principal_cache.generation
+            user = await _load_principal(user_id)
             
-            # Convert role_id to string if it's an ObjectId
-            if isinstance(user["role_id"], ObjectId):
-                user["role_id"] = str(user["role_id"])
-        
-        # Remove sensitive information
-        if "password" in user:
-            del user["password"]
+            if user is None:
+                logger.error(f"User not found: {user_id}")
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            
+            principal_cache.set(user_id, user, generation)
         
-        return user
+        # Hand out a copy so callers cannot mutate the cached principal
+        return copy.deepcopy(user)
         
     except jwt.ExpiredSignatureError:
         logger.error("Token has expired")
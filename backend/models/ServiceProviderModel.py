@@ -1,8 +1,22 @@
 from pydantic import BaseModel, Field, validator, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from bson import ObjectId
 from datetime import datetime
 
+class GeoPoint(BaseModel):
+    """GeoJSON point; coordinates are [longitude, latitude]"""
+    type: Literal["Point"] = "Point"
+    coordinates: List[float]
+    
+    @validator("coordinates")
+    def validate_coordinates(cls, v):
+        if len(v) != 2:
+            raise ValueError("coordinates must be [longitude, latitude]")
+        longitude, latitude = v
+        if not -180 <= longitude <= 180 or not -90 <= latitude <= 90:
+            raise ValueError("longitude must be within [-180, 180] and latitude within [-90, 90]")
+        return v
+
 class ServiceProviderBase(BaseModel):
     user_id: str
     business_name: str
@@ -13,6 +27,7 @@ class ServiceProviderBase(BaseModel):
     city_id: Optional[str] = None
     state_id: Optional[str] = None
     address: Optional[str] = None
+    location: Optional[GeoPoint] = None
     contact_phone: Optional[str] = None
     profile_image: Optional[str] = None
     avatar: Optional[str] = None
@@ -52,6 +67,7 @@ class ServiceProviderUpdate(BaseModel):
     city_id: Optional[str] = None
     state_id: Optional[str] = None
     address: Optional[str] = None
+    location: Optional[GeoPoint] = None
     contact_phone: Optional[str] = None
     profile_image: Optional[str] = None
     avatar: Optional[str] = None
@@ -68,6 +84,10 @@ class ServiceProviderOut(ServiceProviderBase):
     area: Optional[Dict[str, Any]] = None
     city: Optional[Dict[str, Any]] = None
     state: Optional[Dict[str, Any]] = None
+    # Thumbnail URLs generated by utils/image_derivatives.py
+    avatar_variants: Optional[Dict[str, Any]] = None
+    profile_image_variants: Optional[Dict[str, Any]] = None
+    gallery_image_variants: Optional[List[Dict[str, Any]]] = None
     
     @validator("id", pre=True, always=True)
     def convert_id(cls, v):
@@ -101,3 +121,5 @@ class ServiceProviderFilter(BaseModel):
     rating_min: Optional[float] = None
     is_verified: Optional[bool] = None
     search_term: Optional[str] = None
+    cursor: Optional[str] = None
+    limit: Optional[int] = None
@@ -83,12 +83,6 @@ class UserSignUp(BaseModel):
             return f"{values['firstName']} {values['lastName']}"
         return v
     
-    @validator("password", pre=True, always=True)
-    def encrypt_password(cls, v):
-        if v is None:
-            return None
-        return bcrypt.hashpw(v.encode("utf-8"), bcrypt.gensalt())
-    
     @validator("role_id",pre=True,always=True)
     def convert_objectId(cls,v):
         if isinstance(v,ObjectId):
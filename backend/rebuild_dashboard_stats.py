@@ -0,0 +1,23 @@
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from utils.dashboard_stats import rebuild_dashboard_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Recompute the materialized dashboard counters from bookings, reviews and service providers"""
+    try:
+        written = await rebuild_dashboard_stats()
+        print(f"Rebuilt {written} dashboard counters documents")
+    except Exception as e:
+        logger.error(f"Error rebuilding dashboard counters: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(main())
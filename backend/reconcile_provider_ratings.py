@@ -0,0 +1,23 @@
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from utils.provider_ratings import reconcile_provider_ratings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Recompute service provider rating counters and averages from their reviews"""
+    try:
+        corrected = await reconcile_provider_ratings()
+        print(f"Corrected ratings for {corrected} service providers")
+    except Exception as e:
+        logger.error(f"Error reconciling service provider ratings: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -14,7 +14,7 @@ from controllers.AuthController import (
 from models.UserModel import UserSignUp, UserSignIn, PasswordResetRequest, PasswordReset, EmailVerification, TokenVerification
 import logging
 from bson import ObjectId
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -96,7 +96,7 @@ async def reset_user_password(reset_data: PasswordReset):
         # Handle ObjectId serialization errors
         if "PydanticSerializationError" in str(e) and "bson.objectid.ObjectId" in str(e):
             logger.error(f"ObjectId serialization error in reset_password: {str(e)}")
-            return JSONResponse(
+            return BSONJSONResponse(
                 status_code=200,
                 content={
                     "message": "Password has been reset successfully",
@@ -145,7 +145,6 @@ async def test_objectid_serialization():
     Test endpoint to verify ObjectId serialization is working
     """
     from bson import ObjectId
-    from fastapi.responses import JSONResponse
     
     # Create a test response with ObjectId
     test_data = {
@@ -159,4 +158,4 @@ async def test_objectid_serialization():
     }
     
     logger.info("Testing ObjectId serialization")
-    return JSONResponse(content=test_data) 
\ No newline at end of file
+    return BSONJSONResponse(content=test_data) 
\ No newline at end of file
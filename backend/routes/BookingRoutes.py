@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, Path, Query, Body, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Path, Query, Body, HTTPException, Header
+from utils.responses import BSONJSONResponse
 from controllers.BookingController import (
     create_booking, create_appointment_booking, create_service_booking,
     get_all_bookings, get_booking_by_id, 
@@ -13,6 +13,7 @@ import json
 from datetime import datetime
 import logging
 from config.database import get_db  # <-- Fix the import path here
+from utils.idempotency import run_idempotent
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/bookings", tags=["Bookings"])
@@ -24,20 +25,28 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+IDEMPOTENCY_KEY_DESCRIPTION = "Replays the stored response instead of creating a second booking"
+
 @router.post("/")
-async def post_booking(booking: BookingCreate):
+async def post_booking(
+    booking: BookingCreate,
+    idempotency_key: Optional[str] = Header(None, description=IDEMPOTENCY_KEY_DESCRIPTION)
+):
     """Create a new generic booking"""
     try:
-        return await create_booking(booking)
+        return await run_idempotent("bookings", idempotency_key, booking.dict(), lambda: create_booking(booking))
     except Exception as e:
         logger.error(f"Error in post_booking: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
 @router.post("/appointment")
-async def post_appointment(booking: AppointmentBookingCreate):
+async def post_appointment(
+    booking: AppointmentBookingCreate,
+    idempotency_key: Optional[str] = Header(None, description=IDEMPOTENCY_KEY_DESCRIPTION)
+):
     """Create a new appointment booking"""
     try:
         logger.info(f"Received appointment booking: {booking}")
@@ -48,22 +57,33 @@ async def post_appointment(booking: AppointmentBookingCreate):
             booking_dict["booking_date"] = booking_dict["booking_date"].isoformat()
         logger.info(f"Processed booking data: {booking_dict}")
         
-        return await create_appointment_booking(booking)
+        return await run_idempotent(
+            "bookings/appointment", idempotency_key, booking.dict(), lambda: create_appointment_booking(booking)
+        )
     except Exception as e:
         logger.error(f"Error in post_appointment: {str(e)}")
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}", "status": False}
         )
 
 @router.post("/service")
-async def post_service(booking: ServiceBookingCreate):
-    return await create_service_booking(booking)
+async def post_service(
+    booking: ServiceBookingCreate,
+    idempotency_key: Optional[str] = Header(None, description=IDEMPOTENCY_KEY_DESCRIPTION)
+):
+    return await run_idempotent(
+        "bookings/service", idempotency_key, booking.dict(), lambda: create_service_booking(booking)
+    )
 
 @router.get("/")
-async def get_bookings():
-    """Get all bookings"""
-    return get_all_bookings()
+async def get_bookings(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of bookings to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated booking fields to return, e.g. status,created_at")
+):
+    """Get all bookings, newest first, one page at a time"""
+    return await get_all_bookings(cursor, limit, fields)
 
 @router.get("/{booking_id}")
 async def get_booking(booking_id: str = Path(..., description="The ID of the booking to get")):
@@ -76,9 +96,12 @@ async def get_user_booking_history(user_id: str = Path(..., description="The ID
     return await get_user_bookings(user_id)
 
 @router.get("/provider/{provider_id}")
-async def get_provider_booking_requests(provider_id: str = Path(..., description="The ID of the service provider")):
+async def get_provider_booking_requests(
+    provider_id: str = Path(..., description="The ID of the service provider"),
+    fields: Optional[str] = Query(None, description="Comma-separated booking fields to return, e.g. status,created_at")
+):
     """Get all bookings for a specific service provider"""
-    return await get_provider_bookings(provider_id)
+    return await get_provider_bookings(provider_id, fields)
 
 @router.put("/{booking_id}")
 async def put_booking(
@@ -110,5 +133,9 @@ async def update_payment(
     return await update_payment_status(booking_id, payment_status)
 
 @router.get("/admin/appointments")
-async def get_all_appointments():
-    return await get_all_bookings()
\ No newline at end of file
+async def get_all_appointments(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of bookings to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated booking fields to return, e.g. status,created_at")
+):
+    return await get_all_bookings(cursor, limit, fields)
\ No newline at end of file
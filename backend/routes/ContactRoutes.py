@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Header
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query
 from models.ContactModel import ContactMessageCreate, ContactMessageOut
 from controllers.ContactController import (
     create_contact_message_from_website, 
@@ -10,8 +10,7 @@ from controllers.AuthController import get_current_admin
 from typing import List, Optional
 import logging
 import os
-from fastapi.responses import JSONResponse
-from datetime import datetime
+from utils.responses import BSONJSONResponse
 from config.database import contact_message_collection
 
 # Set up logging
@@ -37,13 +36,17 @@ async def api_create_contact_message(contact_message: ContactMessageCreate = Bod
     return await create_contact_message_from_website(contact_message)
 
 @contact_router.get("/", response_description="Get all contact messages")
-async def api_get_all_contact_messages(authorization: Optional[str] = Header(None)):
+async def api_get_all_contact_messages(
+    authorization: Optional[str] = Header(None),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of messages to return")
+):
     print("📥 GET /api/contact/ called!")
     if DEV_MODE and not authorization:
-        return await get_all_contact_messages_admin()
+        return await get_all_contact_messages_admin(cursor, limit)
     else:
         current_admin = await get_current_admin(authorization)
-        return await get_all_contact_messages_admin()
+        return await get_all_contact_messages_admin(cursor, limit)
 
 @contact_router.get("/debug", response_description="Debug endpoint for contact messages")
 async def api_debug_contact_messages():
@@ -55,23 +58,13 @@ async def api_debug_contact_messages():
         # Get all messages
         messages = await contact_message_collection.find().sort("created_at", -1).to_list(length=1000)
         
-        # Process messages for response
-        processed_messages = []
-        for message in messages:
-            # Convert ObjectId to string
-            message["_id"] = str(message["_id"])
-            # Convert datetime to string
-            if "created_at" in message and isinstance(message["created_at"], datetime):
-                message["created_at"] = message["created_at"].isoformat()
-            processed_messages.append(message)
-        
         # Create a custom response with explicit CORS headers
-        response = JSONResponse(
+        response = BSONJSONResponse(
             status_code=200,
             content={
                 "message": "Contact messages fetched successfully",
-                "contact_messages": processed_messages,
-                "count": len(processed_messages),
+                "contact_messages": messages,
+                "count": len(messages),
                 "status": True
             }
         )
@@ -85,7 +78,7 @@ async def api_debug_contact_messages():
         return response
     except Exception as e:
         logger.error(f"🔧 Debug endpoint error: {str(e)}")
-        response = JSONResponse(
+        response = BSONJSONResponse(
             content={"message": f"Error: {str(e)}", "status": False},
             status_code=500
         )
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Path, Request
+from controllers.EventController import stream_user_events, stream_service_provider_events
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+@router.get("/user/{user_id}")
+async def get_user_events(request: Request, user_id: str = Path(..., description="The ID of the user")):
+    """Server-sent event stream of a user's notifications and booking updates"""
+    return await stream_user_events(request, user_id)
+
+@router.get("/serviceprovider/{provider_id}")
+async def get_provider_events(request: Request, provider_id: str = Path(..., description="The ID of the service provider")):
+    """Server-sent event stream of a service provider's notifications and booking updates"""
+    return await stream_service_provider_events(request, provider_id)
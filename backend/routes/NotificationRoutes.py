@@ -5,7 +5,8 @@ from controllers.NotificationController import (
     delete_notification, delete_all_notifications, create_system_notification,
     get_service_provider_notifications, get_service_provider_notification_preferences,
     update_service_provider_notification_preferences, mark_all_service_provider_notifications_read,
-    batch_delete_notifications
+    batch_delete_notifications, get_system_notification_job,
+    get_user_unread_count, get_service_provider_unread_count
 )
 from models.NotificationModel import NotificationCreate
 from typing import List, Optional
@@ -17,15 +18,21 @@ async def post_notification(notification: NotificationCreate):
     """Create a new notification"""
     return await create_notification(notification)
 
-@router.post("/system")
+@router.post("/system", status_code=202)
 async def post_system_notification(
-    user_ids: List[str] = Body(..., embed=True),
     title: str = Body(..., embed=True),
     message: str = Body(..., embed=True),
+    user_ids: Optional[List[str]] = Body(None, embed=True),
+    audience: Optional[str] = Body(None, embed=True, description="all_users or all_providers, instead of user_ids"),
     related_id: Optional[str] = Body(None, embed=True)
 ):
-    """Create a system notification for multiple users"""
-    return await create_system_notification(user_ids, title, message, related_id)
+    """Start a background job creating a system notification for multiple users"""
+    return await create_system_notification(user_ids, title, message, related_id, audience)
+
+@router.get("/system/jobs/{job_id}")
+async def get_system_notification_job_status(job_id: str = Path(..., description="The ID of the system notification job")):
+    """Get the progress of a system notification job"""
+    return await get_system_notification_job(job_id)
 
 @router.get("/user/{user_id}")
 async def get_notifications(
@@ -35,6 +42,11 @@ async def get_notifications(
     """Get all notifications for a specific user"""
     return await get_user_notifications(user_id, unread_only)
 
+@router.get("/user/{user_id}/unread-count")
+async def get_unread_count(user_id: str = Path(..., description="The ID of the user")):
+    """Get the number of unread notifications for a user"""
+    return await get_user_unread_count(user_id)
+
 @router.get("/{notification_id}")
 async def get_notification(notification_id: str = Path(..., description="The ID of the notification to get")):
     """Get a notification by ID"""
@@ -72,6 +84,13 @@ async def get_provider_notifications(
     """Get all notifications for a specific service provider"""
     return await get_service_provider_notifications(provider_id, unread_only)
 
+@router.get("/serviceprovider/{provider_id}/unread-count")
+async def get_provider_unread_count(
+    provider_id: str = Path(..., description="The ID of the service provider")
+):
+    """Get the number of unread notifications for a service provider"""
+    return await get_service_provider_unread_count(provider_id)
+
 @router.get("/serviceprovider/{provider_id}/preferences")
 async def get_provider_notification_preferences(
     provider_id: str = Path(..., description="The ID of the service provider")
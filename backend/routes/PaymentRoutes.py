@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Query, Path
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Path, Response, Header
+from typing import Any, Dict, List, Optional
 import logging
 
+from utils.idempotency import run_idempotent
+from utils.responses import BSONJSONResponse
 from models.PaymentModel import PaymentCreate, PaymentUpdate, PaymentResponse, PaymentStatus
 from controllers.PaymentController import (
     create_payment, 
     get_payment_by_id, 
     get_user_payments, 
+    get_user_payment_summary,
     update_payment_status,
     get_all_payments,
     verify_razorpay_payment
@@ -25,13 +27,24 @@ payment_router = APIRouter(
 )
 
 @payment_router.post("/", response_model=PaymentResponse, status_code=201)
-async def api_create_payment(payment: PaymentCreate = Body(...)):
+async def api_create_payment(
+    payment: PaymentCreate = Body(...),
+    idempotency_key: Optional[str] = Header(None, description="Replays the stored response instead of creating a second payment")
+):
     """
     Create a new payment record
     """
     logger.info(f"API: Creating payment for service: {payment.service}")
-    result = await create_payment(payment)
-    return result
+
+    async def create():
+        # Validated and filtered like a response_model, since the response is built here
+        created = PaymentResponse.model_validate(await create_payment(payment))
+        return BSONJSONResponse(status_code=201, content=created.model_dump(mode="json"))
+
+    # Timestamps and the invoice number are assigned by the server, so they
+    # do not take part in matching a retry to the original request
+    payload = payment.dict(exclude={"created_at", "updated_at", "invoice_number"})
+    return await run_idempotent("payments", idempotency_key, payload, create)
 
 @payment_router.get("/{payment_id}", response_model=PaymentResponse)
 async def api_get_payment(
@@ -53,15 +66,31 @@ async def api_get_payment(
 
 @payment_router.get("/user/{user_id}", response_model=List[PaymentResponse])
 async def api_get_user_payments(
-    user_id: str = Path(..., description="The ID of the user")
+    response: Response,
+    user_id: str = Path(..., description="The ID of the user"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of records to return")
 ):
     """
-    Get all payments for a specific user
+    Get the payments of a specific user, newest first, one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
     logger.info(f"API: Retrieving payments for user: {user_id}")
-    payments = await get_user_payments(user_id)
+    payments, next_cursor = await get_user_payments(user_id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return payments
 
+@payment_router.get("/user/{user_id}/summary", response_model=Dict[str, Any])
+async def api_get_user_payment_summary(
+    user_id: str = Path(..., description="The ID of the user")
+):
+    """
+    Get a user's payment totals by status and by month
+    """
+    logger.info(f"API: Summarizing payments for user: {user_id}")
+    return await get_user_payment_summary(user_id)
+
 @payment_router.patch("/{payment_id}", response_model=PaymentResponse)
 async def api_update_payment_status(
     payment_update: PaymentUpdate = Body(...),
@@ -94,24 +123,28 @@ async def api_verify_payment(
     is_valid = await verify_razorpay_payment(payment_id, signature, order_id)
     
     if is_valid:
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=200,
             content={"status": "success", "message": "Payment verified successfully"}
         )
     else:
-        return JSONResponse(
+        return BSONJSONResponse(
             status_code=400,
             content={"status": "error", "message": "Invalid payment signature"}
         )
 
 @payment_router.get("/", response_model=List[PaymentResponse])
 async def api_get_all_payments(
-    skip: int = Query(0, description="Number of records to skip"),
-    limit: int = Query(100, description="Maximum number of records to return")
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of records to return")
 ):
     """
-    Get all payments
+    Get all payments, newest first, one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
     logger.info(f"API: Retrieving all payments")
-    payments = await get_all_payments(skip, limit)
+    payments, next_cursor = await get_all_payments(cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return payments 
\ No newline at end of file
@@ -15,9 +15,12 @@ async def post_review(review: ReviewCreate):
     return await create_review(review)
 
 @router.get("/")
-async def get_reviews():
-    """Get all reviews"""
-    return await get_all_reviews()
+async def get_reviews(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of reviews to return")
+):
+    """Get all reviews, newest first, one page at a time"""
+    return await get_all_reviews(cursor, limit)
 
 @router.get("/{review_id}")
 async def get_review(review_id: str = Path(..., description="The ID of the review to get")):
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Body, UploadFile, File
+from fastapi import APIRouter, Body, UploadFile, File, Query
+from typing import Optional
 
 from models.ServiceProviderModel import ServiceProviderCreate, ServiceProviderUpdate, ServiceProviderFilter
 from controllers.ServiceProviderController import (
@@ -9,6 +10,7 @@ from controllers.ServiceProviderController import (
     update_service_provider,
     delete_service_provider,
     filter_service_providers,
+    get_nearby_service_providers,
     verify_service_provider,
     update_provider_rating,
     upload_service_provider_avatar
@@ -35,9 +37,35 @@ async def api_create_service_provider(
 
 # Get all service providers
 @router.get("/")
-async def api_get_all_service_providers():
+async def api_get_all_service_providers(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of service providers to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated provider fields to return, e.g. business_name,avg_rating")
+):
     logger.info("API endpoint: Get all service providers request received")
-    return await get_all_service_providers()
+    return await get_all_service_providers(cursor, limit, fields)
+
+# Find service providers near a point
+@router.get("/nearby")
+async def api_get_nearby_service_providers(
+    lng: float = Query(..., ge=-180, le=180, description="Longitude of the search point"),
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the search point"),
+    max_distance_km: Optional[float] = Query(None, gt=0, description="Search radius in kilometres"),
+    category_id: Optional[str] = Query(None, description="Only providers in this category"),
+    rating_min: Optional[float] = Query(None, description="Minimum average rating"),
+    is_verified: Optional[bool] = Query(None, description="Only verified (or unverified) providers"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of service providers to return")
+):
+    logger.info("API endpoint: Nearby service providers request received")
+    filter_data = ServiceProviderFilter(
+        category_id=category_id,
+        rating_min=rating_min,
+        is_verified=is_verified,
+        cursor=cursor,
+        limit=limit
+    )
+    return await get_nearby_service_providers(lng, lat, filter_data, max_distance_km)
 
 # Get service provider by ID
 @router.get("/{provider_id}")
@@ -17,8 +17,11 @@ async def post_service(service: ServiceCreate):
     return await create_service(service)
 
 @router.get("/services")
-async def get_services():
-    return await get_all_services()
+async def get_services(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of services to return")
+):
+    return await get_all_services(cursor, limit)
 
 @router.get("/provider/{provider_id}")
 async def get_provider_services(provider_id: str = Path(..., description="The ID of the service provider")):
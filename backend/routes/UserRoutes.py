@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Query, Path
-from fastapi.responses import JSONResponse
+from utils.responses import BSONJSONResponse
 from typing import List, Optional, Dict
 import logging
 
@@ -24,15 +24,17 @@ user_router = APIRouter(
 
 @user_router.get("/", response_model=List[Dict])
 async def api_get_all_users(
-    skip: int = Query(0, description="Number of records to skip"),
-    limit: int = Query(100, description="Maximum number of records to return")
+    cursor: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, description="Maximum number of records to return")
 ):
     """
-    Get all users
+    Get all users, newest first, one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
     logger.info(f"API: Retrieving all users")
     try:
-        users = await get_all_users(skip, limit)
+        users, next_cursor = await get_all_users(cursor, limit)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
         
         # For debugging, log the structure of what we're returning
         if users:
@@ -41,7 +43,9 @@ async def api_get_all_users(
         else:
             logger.info("No users found")
             
-        return users
+        return BSONJSONResponse(content=users, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving users: {str(e)}")
         raise HTTPException(
@@ -74,7 +78,7 @@ async def api_get_user(
             detail=f"User with ID {user_id} not found"
         )
     
-    return user
+    return BSONJSONResponse(content=user)
 
 @user_router.patch("/{user_id}", response_model=UserOut)
 async def api_update_user_profile(
@@ -93,7 +97,7 @@ async def api_update_user_profile(
             detail=f"User with ID {user_id} not found"
         )
     
-    return updated_user
+    return BSONJSONResponse(content=updated_user)
 
 @user_router.delete("/{user_id}")
 async def api_delete_user(
@@ -111,7 +115,7 @@ async def api_delete_user(
             detail=f"User with ID {user_id} not found"
         )
     
-    return JSONResponse(
+    return BSONJSONResponse(
         status_code=200,
         content={"status": "success", "message": "User deleted successfully"}
     )
\ No newline at end of file
@@ -0,0 +1,225 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from utils import idempotency
+from utils.idempotency import REPLAYED_HEADER, request_fingerprint, run_idempotent
+from utils.responses import BSONJSONResponse
+
+
+class StubCollection:
+    """
+    In-memory stand-in for the idempotency_keys collection, supporting the
+    filters and updates run_idempotent uses
+    """
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            value = document.get(field)
+            if isinstance(condition, dict):
+                if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def _find(self, query):
+        document = self.documents.get(query["_id"])
+        return document if document is not None and self._matches(document, query) else None
+
+    async def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = dict(document)
+
+    async def find_one(self, query):
+        document = self._find(query)
+        return dict(document) if document else None
+
+    async def find_one_and_update(self, query, update):
+        document = self._find(query)
+        if document is None:
+            return None
+        before = dict(document)
+        document.update(update.get("$set", {}))
+        return before
+
+    async def update_one(self, query, update):
+        document = self._find(query)
+        if document is not None:
+            document.update(update.get("$set", {}))
+            for field in update.get("$unset", {}):
+                document.pop(field, None)
+
+    async def delete_one(self, query):
+        if self._find(query) is not None:
+            del self.documents[query["_id"]]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = StubCollection()
+    monkeypatch.setattr(idempotency, "idempotency_collection", collection)
+    idempotency.idempotency_cache.clear()
+    yield collection
+    idempotency.idempotency_cache.clear()
+
+
+def handler(status_code=201, calls=None):
+    async def create():
+        if calls is not None:
+            calls.append(1)
+        return BSONJSONResponse(status_code=status_code, content={"message": "created", "status": True, "id": len(calls or [])})
+    return create
+
+
+def run(key, payload, create):
+    return asyncio.run(run_idempotent("payments", key, payload, create))
+
+
+def test_without_key_always_runs(collection):
+    calls = []
+    run(None, {"amount": 10}, handler(calls=calls))
+    run(None, {"amount": 10}, handler(calls=calls))
+    assert len(calls) == 2
+    assert collection.documents == {}
+
+
+def test_blank_key(collection):
+    assert run("  ", {"amount": 10}, handler()).status_code == 400
+
+
+def test_replay_of_completed_key(collection):
+    calls = []
+    first = run("key-1", {"amount": 10}, handler(calls=calls))
+    assert first.status_code == 201
+    assert REPLAYED_HEADER not in first.headers
+    assert collection.documents["payments:key-1"]["state"] == "completed"
+
+    # Served from the database, not the in-process cache
+    idempotency.idempotency_cache.clear()
+    replayed = run("key-1", {"amount": 10}, handler(calls=calls))
+    assert len(calls) == 1
+    assert replayed.status_code == 201
+    assert replayed.body == first.body
+    assert replayed.headers[REPLAYED_HEADER] == "true"
+
+    # Served from the cache
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).body == first.body
+    assert len(calls) == 1
+
+
+def test_different_fingerprint(collection):
+    calls = []
+    run("key-1", {"amount": 10}, handler(calls=calls))
+    response = run("key-1", {"amount": 20}, handler(calls=calls))
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_concurrent_in_progress_claim(collection):
+    calls = []
+
+    async def scenario():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def slow_create():
+            started.set()
+            await finish.wait()
+            return await handler(calls=calls)()
+
+        first = asyncio.create_task(run_idempotent("payments", "key-1", {"amount": 10}, slow_create))
+        await started.wait()
+        second = await run_idempotent("payments", "key-1", {"amount": 10}, handler(calls=calls))
+        finish.set()
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 201
+    assert second.status_code == 409
+    assert json.loads(second.body)["status"] is False
+    assert len(calls) == 1
+
+
+def test_server_error_releases_key(collection):
+    calls = []
+    assert run("key-1", {"amount": 10}, handler(status_code=500, calls=calls)).status_code == 500
+    assert "payments:key-1" not in collection.documents
+
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).status_code == 201
+    assert len(calls) == 2
+
+
+def test_client_error_is_stored(collection):
+    calls = []
+    run("key-1", {"amount": 10}, handler(status_code=400, calls=calls))
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).status_code == 400
+    assert len(calls) == 1
+
+
+def test_exception_releases_key(collection):
+    async def failing_create():
+        raise RuntimeError("payment gateway unavailable")
+
+    with pytest.raises(RuntimeError):
+        run("key-1", {"amount": 10}, failing_create)
+    assert "payments:key-1" not in collection.documents
+
+    assert run("key-1", {"amount": 10}, handler()).status_code == 201
+
+
+def test_takeover_of_stale_claim(collection):
+    fingerprint = request_fingerprint({"amount": 10})
+    collection.documents["payments:key-1"] = {
+        "_id": "payments:key-1",
+        "state": "in_progress",
+        "fingerprint": fingerprint,
+        "locked_until": datetime.now() - timedelta(seconds=1)
+    }
+
+    calls = []
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).status_code == 201
+    assert len(calls) == 1
+    assert collection.documents["payments:key-1"]["state"] == "completed"
+    assert "locked_until" not in collection.documents["payments:key-1"]
+
+
+def test_live_claim_is_not_taken_over(collection):
+    collection.documents["payments:key-1"] = {
+        "_id": "payments:key-1",
+        "state": "in_progress",
+        "fingerprint": request_fingerprint({"amount": 10}),
+        "locked_until": datetime.now() + timedelta(seconds=30)
+    }
+
+    calls = []
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).status_code == 409
+    assert calls == []
+
+
+def test_claim_released_repeatedly_is_bounded(collection, monkeypatch):
+    # Every insert collides and every lookup finds the key released again
+    attempts = []
+
+    async def insert_one(document):
+        attempts.append(1)
+        raise DuplicateKeyError("duplicate key")
+
+    async def find_one(query):
+        return None
+
+    monkeypatch.setattr(collection, "insert_one", insert_one)
+    monkeypatch.setattr(collection, "find_one", find_one)
+
+    calls = []
+    assert run("key-1", {"amount": 10}, handler(calls=calls)).status_code == 409
+    assert len(attempts) == idempotency.CLAIM_ATTEMPTS
+    assert calls == []
@@ -0,0 +1,89 @@
+import pytest
+
+from utils.provider_ratings import _drifted, _increments, empty_histogram, rating_bucket
+
+
+def counters(ratings):
+    histogram = empty_histogram()
+    for rating in ratings:
+        histogram[rating_bucket(rating)] += 1
+    return {"rating_sum": sum(ratings), "rating_count": len(ratings), "rating_histogram": histogram}
+
+
+def provider_for(ratings, **overrides):
+    expected = counters(ratings)
+    provider = {
+        **expected,
+        "avg_rating": round(expected["rating_sum"] / len(ratings), 1) if ratings else 0,
+        "total_ratings": len(ratings)
+    }
+    provider.update(overrides)
+    return provider
+
+
+@pytest.mark.parametrize("rating, bucket", [
+    (0.4, "1"),
+    (0, "1"),
+    (1, "1"),
+    (3.4, "3"),
+    (3.6, "4"),
+    (5, "5"),
+    (5.6, "5"),
+])
+def test_rating_bucket(rating, bucket):
+    assert rating_bucket(rating) == bucket
+
+
+def test_increments_add():
+    assert _increments(None, 4) == {"rating_sum": 4, "rating_count": 1, "rating_histogram.4": 1}
+
+
+def test_increments_remove():
+    assert _increments(2, None) == {"rating_sum": -2, "rating_count": -1, "rating_histogram.2": -1}
+
+
+def test_increments_change():
+    assert _increments(2, 5) == {"rating_sum": 3, "rating_histogram.2": -1, "rating_histogram.5": 1}
+
+
+def test_increments_change_within_bucket():
+    assert _increments(4, 4.2) == pytest.approx({"rating_sum": 0.2})
+
+
+def test_increments_unchanged():
+    assert _increments(4, 4) == {}
+    assert _increments(None, None) == {}
+
+
+def test_increments_clamp_out_of_range_buckets():
+    assert _increments(0.4, 5.6) == pytest.approx(
+        {"rating_sum": 5.2, "rating_histogram.1": -1, "rating_histogram.5": 1}
+    )
+
+
+def test_not_drifted():
+    assert not _drifted(provider_for([5, 4, 4]), counters([5, 4, 4]))
+    assert not _drifted(provider_for([]), counters([]))
+
+
+def test_not_drifted_float_sum():
+    ratings = [0.1, 0.2, 4.7]
+    provider = provider_for(ratings, rating_sum=0.1 + 0.2 + 4.7)
+    assert not _drifted(provider, counters(ratings))
+
+
+@pytest.mark.parametrize("field, value", [
+    ("rating_count", 4),
+    ("rating_sum", 12),
+    ("avg_rating", 4.0),
+    ("total_ratings", 2),
+    ("rating_histogram", {"1": 0, "2": 0, "3": 0, "4": 3, "5": 0}),
+])
+def test_drifted(field, value):
+    assert _drifted(provider_for([5, 4, 4], **{field: value}), counters([5, 4, 4]))
+
+
+def test_drifted_missing_counters():
+    # Providers created before the counters existed
+    assert _drifted({"avg_rating": 4.3, "total_ratings": 3}, counters([5, 4, 4]))
+    assert _drifted({}, counters([5]))
@@ -6,6 +6,7 @@ import json
 import os
 from dotenv import load_dotenv
 from config.database import token_collection, user_collection
+from utils.user_lookup import find_user_by_email, with_normalized_email
 from bson import ObjectId
 import datetime
 import secrets
@@ -51,7 +52,7 @@ async def create_direct_token():
     print(f"Creating password reset token directly in database for {TEST_EMAIL}")
     
     # Find user or create one
-    user = await user_collection.find_one({"email": TEST_EMAIL})
+    user = await find_user_by_email(TEST_EMAIL)
     
     if not user:
         print(f"User not found, creating test user for {TEST_EMAIL}")
@@ -70,7 +71,7 @@ async def create_direct_token():
             "updated_at": datetime.datetime.utcnow().isoformat()
         }
         
-        result = await user_collection.insert_one(user_data)
+        result = await user_collection.insert_one(with_normalized_email(user_data))
         user = await user_collection.find_one({"_id": result.inserted_id})
         print(f"Created test user with ID: {user['_id']}")
     else:
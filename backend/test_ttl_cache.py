@@ -0,0 +1,56 @@
+import asyncio
+
+import jwt
+from fastapi.security import HTTPAuthorizationCredentials
+
+from middleware import auth
+from utils.ttl_cache import TTLCache
+
+
+def test_set_without_generation():
+    cache = TTLCache("test")
+    cache.invalidate("a")
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+
+def test_set_skipped_after_invalidation():
+    cache = TTLCache("test")
+    generation = cache.generation
+    # The key is not cached yet; the invalidation must still count
+    cache.invalidate("a")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    assert cache.stats()["stale_writes"] == 1
+
+    cache.set("a", "fresh", cache.generation)
+    assert cache.get("a") == "fresh"
+
+
+def test_invalidate_where_and_clear_advance_generation():
+    cache = TTLCache("test")
+    for invalidate in (lambda: cache.invalidate_where(lambda key, value: False), cache.clear):
+        generation = cache.generation
+        invalidate()
+        cache.set("a", 1, generation)
+        assert cache.get("a") is None
+
+
+def test_principal_invalidated_during_load_is_not_cached(monkeypatch):
+    cache = TTLCache("auth_principal")
+    monkeypatch.setattr(auth, "principal_cache", cache)
+
+    async def load_then_role_change(user_id):
+        # The user's role changes while their old principal is being loaded
+        principal = {"_id": user_id, "role_id": "old-role"}
+        auth.invalidate_cached_user(user_id)
+        return principal
+
+    monkeypatch.setattr(auth, "_load_principal", load_then_role_change)
+
+    token = jwt.encode({"id": "u1", "sub": "u1@example.com"}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    user = asyncio.run(auth.get_current_user(credentials))
+
+    assert user["role_id"] == "old-role"
+    assert cache.get("u1") is None
@@ -27,10 +27,170 @@ SMTP_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
 SEND_REAL_EMAILS = os.getenv("SEND_REAL_EMAILS", "False").lower() == "true"
 LOG_EMAILS = os.getenv("LOG_EMAILS", "True").lower() == "true"
 
+SMTP_USE_TLS = os.getenv("EMAIL_USE_TLS", "True").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", 30))
+# Servers drop idle sessions; probe with NOOP before reusing one idle this long
+SMTP_IDLE_CHECK_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_CHECK", 60))
+
+def _emails_dir():
+    """
+    Locate (and create) the directory email copies are written to
+    """
+    # Try multiple locations for the emails directory
+    emails_dir = Path("emails")
+    if not emails_dir.exists():
+        emails_dir = Path("backend/emails")
+        
+    # Create the directory if it doesn't exist
+    try:
+        emails_dir.mkdir(exist_ok=True, parents=True)
+    except Exception as e:
+        logger.error(f"Failed to create emails directory: {str(e)}")
+        # Try creating in current directory as fallback
+        emails_dir = Path(".")
+    return emails_dir
+
+def save_email_copy(recipient, subject, body, sender=None):
+    """
+    Save an email as an HTML file in the emails directory.
+    
+    Returns:
+        Path: The file written, or None if it could not be saved
+    """
+    if sender is None:
+        sender = SMTP_EMAIL
+    
+    logger.info(f"Email: To: {recipient}, Subject: {subject}")
+    emails_dir = _emails_dir()
+    logger.info(f"Using emails directory: {emails_dir.absolute()}")
+    
+    timestamp = time.strftime('%Y%m%d_%H%M%S')
+    filename = emails_dir / f"email_{timestamp}.html"
+    
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f"To: {recipient}\n")
+            f.write(f"From: {sender}\n")
+            f.write(f"Subject: {subject}\n")
+            f.write(f"Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write(body)
+        
+        logger.info(f"Email saved to {filename}")
+        return filename
+    except Exception as e:
+        logger.error(f"Failed to save email to file: {str(e)}")
+        return None
+
+def save_failed_email_copy(recipient, subject, body, error):
+    """
+    Save an email that could not be delivered, along with the error
+    """
+    timestamp = time.strftime('%Y%m%d%H%M%S')
+    filename = _emails_dir() / f"failed_email_{timestamp}.html"
+    
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f"ERROR: {str(error)}\n\n")
+            f.write(f"To: {recipient}\n")
+            f.write(f"Subject: {subject}\n\n")
+            f.write(body)
+        
+        logger.info(f"Failed email content saved to {filename}")
+        return filename
+    except Exception as write_error:
+        logger.error(f"Failed to save failed email to file: {str(write_error)}")
+        return None
+
+def build_message(sender, recipient, subject, body):
+    """
+    Build the MIME message for an HTML email
+    """
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    
+    # Attach HTML body
+    msg.attach(MIMEText(body, 'html'))
+    return msg.as_string()
+
+class SMTPConnection:
+    """
+    A reusable SMTP session.
+    
+    The connection is opened lazily, kept open between messages and
+    transparently re-established if the server dropped it. Blocking: call
+    from a worker thread when used from async code.
+    """
+    
+    def __init__(self, host=None, port=None, username=None, password=None, use_tls=None):
+        self.host = host or SMTP_SERVER
+        self.port = port or SMTP_PORT
+        self.username = username if username is not None else SMTP_EMAIL
+        self.password = password if password is not None else SMTP_PASSWORD
+        self.use_tls = SMTP_USE_TLS if use_tls is None else use_tls
+        self._server = None
+        self._last_used = 0.0
+    
+    def _connect(self):
+        logger.info(f"Connecting to SMTP server {self.host}:{self.port}")
+        server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+    
+    def _is_alive(self):
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+    
+    def send(self, sender, recipient, message):
+        """
+        Send a prepared message, reconnecting once if the session was lost
+        """
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK_SECONDS:
+            if not self._is_alive():
+                self.close()
+        
+        for attempt in range(2):
+            if self._server is None:
+                self._connect()
+            try:
+                self._server.sendmail(sender, recipient, message)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self.close()
+                if attempt:
+                    raise
+                logger.warning(f"SMTP connection lost ({str(e)}), reconnecting")
+    
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        finally:
+            self._server = None
+
 def send_mail(recipient, subject, body, sender=None):
     """
     Send an email or save it as HTML file if email sending is disabled.
     
+    This opens a dedicated SMTP session and blocks until the message is sent;
+    request handlers should use utils.email_queue.enqueue_email instead.
+    
     Args:
         recipient (str): The recipient email address
         subject (str): The email subject
@@ -44,38 +204,8 @@ def send_mail(recipient, subject, body, sender=None):
         sender = SMTP_EMAIL
 
     # Log the email
-    if LOG_EMAILS:
-        logger.info(f"Email: To: {recipient}, Subject: {subject}")
-        
-        # Try multiple locations for the emails directory
-        emails_dir = Path("emails")
-        if not emails_dir.exists():
-            emails_dir = Path("backend/emails")
-            
-        # Create the directory if it doesn't exist
-        try:
-            emails_dir.mkdir(exist_ok=True, parents=True)
-            logger.info(f"Using emails directory: {emails_dir.absolute()}")
-        except Exception as e:
-            logger.error(f"Failed to create emails directory: {str(e)}")
-            # Try creating in current directory as fallback
-            emails_dir = Path(".")
-        
-        timestamp = time.strftime('%Y%m%d_%H%M%S')
-        filename = emails_dir / f"email_{timestamp}.html"
-        
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"To: {recipient}\n")
-                f.write(f"From: {sender}\n")
-                f.write(f"Subject: {subject}\n")
-                f.write(f"Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                f.write(body)
-            
-            logger.info(f"Email saved to {filename}")
-        except Exception as e:
-            logger.error(f"Failed to save email to file: {str(e)}")
-            return False
+    if LOG_EMAILS and save_email_copy(recipient, subject, body, sender) is None:
+        return False
     
     # Return early if not sending real emails
     if not SEND_REAL_EMAILS:
@@ -83,61 +213,17 @@ def send_mail(recipient, subject, body, sender=None):
         return True
     
     # Proceed with sending the actual email
+    connection = SMTPConnection()
     try:
-        msg = MIMEMultipart()
-        msg['From'] = sender
-        msg['To'] = recipient
-        msg['Subject'] = subject
-        
-        # Attach HTML body
-        msg.attach(MIMEText(body, 'html'))
-        
-        # Connect to SMTP server and send
-        logger.info(f"Connecting to SMTP server {SMTP_SERVER}:{SMTP_PORT}")
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        
-        if os.getenv("EMAIL_USE_TLS", "True").lower() == "true":
-            server.starttls()
-        
-        if SMTP_PASSWORD:
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-        
-        server.sendmail(sender, recipient, msg.as_string())
-        server.quit()
-        
+        connection.send(sender, recipient, build_message(sender, recipient, subject, body))
         logger.info(f"Email sent successfully to {recipient}")
         return True
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
-        
-        # Try multiple locations for the emails directory for failed emails
-        emails_dir = Path("emails")
-        if not emails_dir.exists():
-            emails_dir = Path("backend/emails")
-            
-        # Create the directory if it doesn't exist
-        try:
-            emails_dir.mkdir(exist_ok=True, parents=True)
-        except Exception as dir_error:
-            logger.error(f"Failed to create emails directory for failed email: {str(dir_error)}")
-            # Try creating in current directory as fallback
-            emails_dir = Path(".")
-        
-        timestamp = time.strftime('%Y%m%d%H%M%S')
-        filename = emails_dir / f"failed_email_{timestamp}.html"
-        
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"ERROR: {str(e)}\n\n")
-                f.write(f"To: {recipient}\n")
-                f.write(f"Subject: {subject}\n\n")
-                f.write(body)
-            
-            logger.info(f"Failed email content saved to {filename}")
-        except Exception as write_error:
-            logger.error(f"Failed to save failed email to file: {str(write_error)}")
-            
-            return False
+        save_failed_email_copy(recipient, subject, body, e)
+        return False
+    finally:
+        connection.close()
 
 class EmailSender:
     """Static class for sending various types of emails"""
@@ -0,0 +1,295 @@
+"""
+Materialized dashboard counters.
+
+The dashboard_stats collection holds one document per scope:
+
+    "global"            counters for the admin dashboard
+    "provider:<id>"     counters for a service provider dashboard
+    "user:<id>"         counters for a user dashboard
+
+Write paths call the record_* helpers so the counters are kept up to date
+with $inc, and dashboards read a single document instead of scanning
+bookings. rebuild_dashboard_stats() recomputes everything from the source
+collections to reconcile drift (see rebuild_dashboard_stats.py); at startup,
+rebuild_dashboard_stats_if_empty() builds the counters of a database that has
+none yet. Both paths read a booking the same way: a missing status counts as
+"pending", and a price that is not a number counts as 0.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson.decimal128 import Decimal128
+from pymongo import ReplaceOne, UpdateOne
+
+from config.database import (
+    dashboard_stats_collection, booking_collection, review_collection, service_provider_collection
+)
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "global"
+BOOKING_STATUSES = ["pending", "confirmed", "completed", "cancelled"]
+
+
+def provider_scope(provider_id: Any) -> str:
+    return f"provider:{provider_id}"
+
+
+def user_scope(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def month_key(value: Any) -> Optional[str]:
+    """
+    Return the YYYY-MM bucket for a created_at value stored as datetime or ISO string
+    """
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).strftime("%Y-%m")
+        except ValueError:
+            return None
+    return None
+
+
+def _booking_status(booking: Dict[str, Any]) -> Any:
+    status = booking.get("status")
+    return "pending" if status is None else status
+
+
+def _booking_price(booking: Dict[str, Any]) -> float:
+    """
+    A booking's price as a float, 0 when it is missing or not numeric
+    """
+    price = booking.get("price")
+    if isinstance(price, Decimal128):
+        price = price.to_decimal()
+    try:
+        return float(price)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _booking_scopes(booking: Dict[str, Any]) -> List[str]:
+    scopes = [GLOBAL_SCOPE]
+    if booking.get("service_provider_id"):
+        scopes.append(provider_scope(booking["service_provider_id"]))
+    if booking.get("user_id"):
+        scopes.append(user_scope(booking["user_id"]))
+    return scopes
+
+
+def _contribution(status: Any, price: float, month: Optional[str], count: int = 1) -> Dict[str, float]:
+    """
+    Counter fields that `count` bookings with the given status, price sum and
+    month add to each of their scopes
+    """
+    fields = {"bookings.total": count, "bookings.spent": price}
+    if status in BOOKING_STATUSES:
+        fields[f"bookings.status.{status}"] = count
+    if status == "completed":
+        fields["bookings.revenue"] = price
+    if month:
+        fields[f"bookings.monthly.{month}"] = count
+    return fields
+
+
+def _booking_contribution(booking: Dict[str, Any]) -> Dict[str, float]:
+    return _contribution(_booking_status(booking), _booking_price(booking), month_key(booking.get("created_at")))
+
+
+async def _apply(deltas: Dict[str, Dict[str, float]]):
+    """
+    Apply per-scope $inc deltas in one bulk write, creating documents as needed
+    """
+    now = datetime.now()
+    operations = []
+    for scope, fields in deltas.items():
+        increments = {field: value for field, value in fields.items() if value}
+        if not increments:
+            continue
+        operations.append(UpdateOne(
+            {"_id": scope},
+            {"$inc": increments, "$set": {"updated_at": now}},
+            upsert=True
+        ))
+
+    if not operations:
+        return
+
+    try:
+        await dashboard_stats_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        # Counters are reconciled by rebuild_dashboard_stats, never fail the write path
+        logger.error(f"Error updating dashboard counters: {str(e)}")
+
+
+async def record_booking_change(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """
+    Update counters for a booking being created (old=None), deleted (new=None)
+    or modified (both set)
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    if old:
+        for scope in _booking_scopes(old):
+            for field, value in _booking_contribution(old).items():
+                deltas[scope][field] -= value
+    if new:
+        for scope in _booking_scopes(new):
+            for field, value in _booking_contribution(new).items():
+                deltas[scope][field] += value
+
+    await _apply(deltas)
+
+
+async def record_review_change(review: Dict[str, Any], delta: int = 1):
+    """
+    Update review counters for a review being created (delta=1) or deleted (delta=-1)
+    """
+    scopes = [GLOBAL_SCOPE, provider_scope(review["service_provider_id"]), user_scope(review["user_id"])]
+    await _apply({scope: {"reviews": delta} for scope in scopes})
+
+
+async def record_service_provider_change(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """
+    Update global provider counters for a provider being created, deleted or (un)verified
+    """
+    fields = defaultdict(int)
+    for provider, sign in ((old, -1), (new, 1)):
+        if provider:
+            fields["service_providers.total"] += sign
+            state = "verified" if provider.get("is_verified") else "unverified"
+            fields[f"service_providers.{state}"] += sign
+    await _apply({GLOBAL_SCOPE: fields})
+
+
+async def get_dashboard_counters(scope: str) -> Dict[str, Any]:
+    """
+    Read the counters document for a scope, or an empty document if it has none yet
+    """
+    return await dashboard_stats_collection.find_one({"_id": scope}) or {}
+
+
+def booking_counters(counters: Dict[str, Any], month_starts: List[datetime]) -> Dict[str, Any]:
+    """
+    Shape the bookings section of a counters document for dashboard responses
+    """
+    bookings = counters.get("bookings", {})
+    status = bookings.get("status", {})
+    monthly = bookings.get("monthly", {})
+    return {
+        "total": bookings.get("total", 0),
+        "status_counts": {name: status.get(name, 0) for name in BOOKING_STATUSES},
+        "revenue": round(bookings.get("revenue", 0), 2),
+        "spent": round(bookings.get("spent", 0), 2),
+        "monthly": [
+            {"month": start.strftime("%b %Y"), "count": monthly.get(start.strftime("%Y-%m"), 0)}
+            for start in month_starts
+        ]
+    }
+
+
+async def rebuild_dashboard_stats() -> int:
+    """
+    Recompute every counters document from the source collections
+
+    Returns:
+        int: Number of counters documents written
+    """
+    logger.info("Rebuilding dashboard counters")
+    rebuilt_at = datetime.now()
+    documents = defaultdict(lambda: defaultdict(int))
+
+    # Normalized like _booking_status(), _booking_price() and month_key()
+    booking_groups = booking_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "service_provider_id": "$service_provider_id",
+                "status": {"$ifNull": ["$status", "pending"]},
+                "month": {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": [{"$type": "$created_at"}, "date"]},
+                         "then": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}},
+                        {"case": {"$eq": [{"$type": "$created_at"}, "string"]},
+                         "then": {"$cond": [
+                             {"$regexMatch": {"input": "$created_at", "regex": "^[0-9]{4}-[0-9]{2}-[0-9]{2}"}},
+                             {"$substrBytes": ["$created_at", 0, 7]},
+                             None
+                         ]}}
+                    ],
+                    "default": None
+                }}
+            },
+            "count": {"$sum": 1},
+            "price": {"$sum": {"$convert": {"input": "$price", "to": "double", "onError": 0, "onNull": 0}}}
+        }}
+    ])
+    async for group in booking_groups:
+        key = group["_id"]
+        fields = _contribution(key.get("status"), group["price"] or 0, key.get("month"), group["count"])
+        for scope in _booking_scopes(key):
+            for field, value in fields.items():
+                documents[scope][field] += value
+
+    review_groups = review_collection.aggregate([
+        {"$group": {"_id": {"user_id": "$user_id", "service_provider_id": "$service_provider_id"}, "count": {"$sum": 1}}}
+    ])
+    async for group in review_groups:
+        key = group["_id"]
+        for scope in (GLOBAL_SCOPE, provider_scope(key["service_provider_id"]), user_scope(key["user_id"])):
+            documents[scope]["reviews"] += group["count"]
+
+    provider_groups = service_provider_collection.aggregate([
+        {"$group": {"_id": {"$eq": ["$is_verified", True]}, "count": {"$sum": 1}}}
+    ])
+    async for group in provider_groups:
+        state = "verified" if group["_id"] else "unverified"
+        documents[GLOBAL_SCOPE]["service_providers.total"] += group["count"]
+        documents[GLOBAL_SCOPE][f"service_providers.{state}"] += group["count"]
+
+    operations = [
+        ReplaceOne({"_id": scope}, {**_expand(fields), "updated_at": rebuilt_at, "rebuilt_at": rebuilt_at}, upsert=True)
+        for scope, fields in documents.items()
+    ]
+    if operations:
+        await dashboard_stats_collection.bulk_write(operations, ordered=False)
+
+    # Scopes that no longer have any source documents
+    await dashboard_stats_collection.delete_many({"rebuilt_at": {"$ne": rebuilt_at}})
+
+    logger.info(f"Rebuilt {len(operations)} dashboard counters documents")
+    return len(operations)
+
+
+async def rebuild_dashboard_stats_if_empty() -> Optional[int]:
+    """
+    Build the counters from the source collections if there are none yet,
+    e.g. on a database that predates them
+
+    Returns:
+        Optional[int]: Number of counters documents written, or None if the
+        counters already existed
+    """
+    if await dashboard_stats_collection.find_one({}, {"_id": 1}):
+        return None
+    return await rebuild_dashboard_stats()
+
+
+def _expand(fields: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Turn dotted counter paths into a nested document
+    """
+    document = {}
+    for path, value in fields.items():
+        target = document
+        *parents, leaf = path.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return document
@@ -0,0 +1,256 @@
+"""
+Asynchronous outbound email dispatcher.
+
+Request handlers call enqueue_email(), which records the message in the
+email_outbox collection and hands its id to an in-process asyncio queue.
+Worker tasks started with the application deliver queued messages over
+persistent SMTP connections (one per worker) in a thread, so SMTP handshakes
+never run on the request path.
+
+Failed deliveries are retried with exponential backoff up to
+EMAIL_MAX_ATTEMPTS. Because every message lives in the outbox until it is
+sent, messages that were pending when the process stopped are picked up again
+on the next start.
+
+For local testing point EMAIL_HOST/EMAIL_PORT at a debugging SMTP server,
+e.g. `python -m aiosmtpd -n -l localhost:1025` with EMAIL_USE_TLS=False and
+SEND_REAL_EMAILS=True.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from config.database import email_outbox_collection
+from utils.Sendmail import (
+    SMTP_EMAIL, SEND_REAL_EMAILS, LOG_EMAILS, SMTPConnection,
+    build_message, save_email_copy, save_failed_email_copy
+)
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", 2))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("EMAIL_RETRY_BASE_DELAY", 5))
+EMAIL_RETRY_MAX_DELAY = float(os.getenv("EMAIL_RETRY_MAX_DELAY", 600))
+# Messages left in "sending" this long were interrupted by a crash or restart
+EMAIL_SENDING_TIMEOUT = float(os.getenv("EMAIL_SENDING_TIMEOUT", 300))
+
+# Outbox statuses
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before the next delivery attempt after `attempts` failures
+    """
+    return min(EMAIL_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), EMAIL_RETRY_MAX_DELAY)
+
+
+class EmailDispatcher:
+    def __init__(self, workers: int = EMAIL_WORKERS):
+        self.worker_count = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._connections: List[SMTPConnection] = []
+        self._retry_handles: List[asyncio.TimerHandle] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """
+        Start the workers and requeue messages left over from a previous run
+        """
+        if self.running:
+            return
+
+        self._queue = asyncio.Queue()
+        for index in range(self.worker_count):
+            connection = SMTPConnection()
+            self._connections.append(connection)
+            self._workers.append(asyncio.create_task(self._worker(connection), name=f"email-worker-{index}"))
+
+        recovered = await self._recover()
+        logger.info(f"Email dispatcher started with {self.worker_count} workers, {recovered} queued messages recovered")
+
+    async def stop(self):
+        """
+        Stop the workers and close their SMTP connections; undelivered
+        messages stay in the outbox for the next start
+        """
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+        for connection in self._connections:
+            await asyncio.to_thread(connection.close)
+        self._connections.clear()
+        logger.info("Email dispatcher stopped")
+
+    async def _recover(self) -> int:
+        now = datetime.now()
+        # Messages claimed by a worker that never finished
+        await email_outbox_collection.update_many(
+            {"status": SENDING, "updated_at": {"$lt": now - timedelta(seconds=EMAIL_SENDING_TIMEOUT)}},
+            {"$set": {"status": PENDING, "updated_at": now}}
+        )
+
+        count = 0
+        cursor = email_outbox_collection.find(
+            {"status": PENDING}, {"_id": 1, "next_attempt_at": 1}
+        ).sort("next_attempt_at", 1)
+        async for message in cursor:
+            next_attempt_at = message.get("next_attempt_at") or now
+            self._schedule(message["_id"], (next_attempt_at - now).total_seconds())
+            count += 1
+        return count
+
+    def _schedule(self, outbox_id, delay: float = 0):
+        if self._queue is None:
+            # Not running in this process; the message waits in the outbox
+            return
+        if delay <= 0:
+            self._queue.put_nowait(outbox_id)
+            return
+
+        self._prune_retry_handles()
+        self._retry_handles.append(asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, outbox_id))
+
+    def _prune_retry_handles(self):
+        # Drop handles whose timer already fired
+        now = asyncio.get_running_loop().time()
+        self._retry_handles = [h for h in self._retry_handles if not h.cancelled() and h.when() > now]
+
+    async def enqueue(self, recipient: str, subject: str, body: str, sender: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Persist a message to the outbox and queue it for delivery
+
+        Returns:
+            dict: "id" of the outbox entry and "email_filename" of the local
+            HTML copy if LOG_EMAILS is enabled
+        """
+        if sender is None:
+            sender = SMTP_EMAIL
+
+        email_file = save_email_copy(recipient, subject, body, sender) if LOG_EMAILS else None
+        result = {"id": None, "email_filename": email_file.name if email_file else None}
+
+        if not SEND_REAL_EMAILS:
+            logger.info("Email sending is disabled. Email content saved to file only.")
+            return result
+
+        now = datetime.now()
+        inserted = await email_outbox_collection.insert_one({
+            "recipient": recipient,
+            "sender": sender,
+            "subject": subject,
+            "body": body,
+            "status": PENDING,
+            "attempts": 0,
+            "last_error": None,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now
+        })
+        self._schedule(inserted.inserted_id)
+
+        result["id"] = str(inserted.inserted_id)
+        return result
+
+    async def _worker(self, connection: SMTPConnection):
+        while True:
+            outbox_id = await self._queue.get()
+            try:
+                await self._deliver(outbox_id, connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email worker error for message {outbox_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, outbox_id, connection: SMTPConnection):
+        # Claim the message so another process recovering the outbox skips it
+        message = await email_outbox_collection.find_one_and_update(
+            {"_id": outbox_id, "status": PENDING},
+            {"$set": {"status": SENDING, "updated_at": datetime.now()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not message:
+            return
+
+        try:
+            mime = build_message(message["sender"], message["recipient"], message["subject"], message["body"])
+            await asyncio.to_thread(connection.send, message["sender"], message["recipient"], mime)
+        except Exception as e:
+            await self._record_failure(message, e)
+            return
+
+        now = datetime.now()
+        await email_outbox_collection.update_one(
+            {"_id": outbox_id},
+            {"$set": {"status": SENT, "sent_at": now, "updated_at": now}, "$inc": {"attempts": 1}}
+        )
+        self.sent += 1
+        logger.info(f"Email sent successfully to {message['recipient']}")
+
+    async def _record_failure(self, message: Dict[str, Any], error: Exception):
+        attempts = message.get("attempts", 0) + 1
+        now = datetime.now()
+        update = {"attempts": attempts, "last_error": str(error), "updated_at": now}
+
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update["status"] = FAILED
+            await email_outbox_collection.update_one({"_id": message["_id"]}, {"$set": update})
+            self.failed += 1
+            logger.error(f"Giving up on email to {message['recipient']} after {attempts} attempts: {str(error)}")
+            save_failed_email_copy(message["recipient"], message["subject"], message["body"], error)
+            return
+
+        delay = retry_delay(attempts)
+        update["status"] = PENDING
+        update["next_attempt_at"] = now + timedelta(seconds=delay)
+        await email_outbox_collection.update_one({"_id": message["_id"]}, {"$set": update})
+        self.retried += 1
+        logger.warning(f"Email to {message['recipient']} failed ({str(error)}), retrying in {delay:.0f}s")
+        self._schedule(message["_id"], delay)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._retry_handles:
+            self._prune_retry_handles()
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "scheduled_retries": len(self._retry_handles),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed
+        }
+
+
+email_dispatcher = EmailDispatcher()
+
+
+async def enqueue_email(recipient: str, subject: str, body: str, sender: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Queue an email for background delivery, see EmailDispatcher.enqueue
+    """
+    return await email_dispatcher.enqueue(recipient, subject, body, sender)
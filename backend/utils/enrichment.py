@@ -0,0 +1,126 @@
+"""
+Batched enrichment helpers for attaching related documents to query results.
+
+Related documents are prefetched with a single $in query per collection and
+joined in memory, instead of issuing one find_one per row.
+"""
+
+import asyncio
+import logging
+from bson import ObjectId
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.database import user_collection, service_collection, service_provider_collection
+from utils.serialization import serialize_objectid
+from utils.projection import build_projection
+
+logger = logging.getLogger(__name__)
+
+# Never ship password hashes along with embedded user documents
+USER_PROJECTION = build_projection()
+
+
+def to_object_id(value: Any) -> Optional[ObjectId]:
+    """
+    Convert a value to an ObjectId, returning None if it is not a valid id
+    """
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+async def fetch_documents_by_ids(
+    collection,
+    ids: Iterable[Any],
+    projection: Optional[Dict[str, Any]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch all documents whose _id is in ids with a single query
+
+    Args:
+        collection: The Motor collection to query
+        ids: ObjectIds or id strings; invalid and duplicate values are ignored
+        projection: Optional projection passed through to find()
+
+    Returns:
+        Dict[str, dict]: Documents keyed by their string _id, ObjectIds serialized
+    """
+    object_ids = {oid for oid in (to_object_id(value) for value in ids) if oid is not None}
+    if not object_ids:
+        return {}
+
+    documents = {}
+    cursor = collection.find({"_id": {"$in": list(object_ids)}}, projection)
+    async for document in cursor:
+        document = serialize_objectid(document)
+        documents[document["_id"]] = document
+    return documents
+
+
+async def _no_documents() -> Dict[str, Dict[str, Any]]:
+    return {}
+
+
+async def enrich_bookings(
+    bookings: List[Dict[str, Any]],
+    include_user: bool = False,
+    include_service: bool = False,
+    include_provider: bool = False,
+    user_projection: Optional[Dict[str, Any]] = None,
+    service_projection: Optional[Dict[str, Any]] = None,
+    provider_projection: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Attach user, service and service provider documents to bookings in place
+
+    At most one query per related collection is issued, and the lookups run
+    concurrently, so the cost does not grow with the number of bookings.
+    Booking ObjectId fields are converted to strings.
+
+    Args:
+        bookings: Raw booking documents
+        include_user: Attach the booking's user as "user"
+        include_service: Attach the booking's service as "service"
+        include_provider: Attach the booking's provider as "service_provider"
+        user_projection: Fields fetched for attached users; defaults to
+            everything but sensitive fields
+        service_projection: Fields fetched for attached services
+        provider_projection: Fields fetched for attached providers
+
+    Returns:
+        List[dict]: The same bookings, enriched
+    """
+    for booking in bookings:
+        for field in ("_id", "user_id", "service_id", "service_provider_id"):
+            if field in booking and isinstance(booking[field], ObjectId):
+                booking[field] = str(booking[field])
+
+    users, services, providers = await asyncio.gather(
+        fetch_documents_by_ids(user_collection, (b.get("user_id") for b in bookings), user_projection or USER_PROJECTION)
+        if include_user else _no_documents(),
+        fetch_documents_by_ids(service_collection, (b.get("service_id") for b in bookings), service_projection)
+        if include_service else _no_documents(),
+        fetch_documents_by_ids(service_provider_collection, (b.get("service_provider_id") for b in bookings), provider_projection)
+        if include_provider else _no_documents(),
+    )
+
+    for booking in bookings:
+        user = users.get(booking.get("user_id"))
+        if user:
+            booking["user"] = user
+
+        service = services.get(booking.get("service_id"))
+        if service:
+            booking["service"] = service
+
+        provider = providers.get(booking.get("service_provider_id"))
+        if provider:
+            booking["service_provider"] = provider
+
+    logger.info(
+        f"Enriched {len(bookings)} bookings with {len(users)} users, "
+        f"{len(services)} services and {len(providers)} providers"
+    )
+    return bookings
@@ -0,0 +1,242 @@
+"""
+In-process publish/subscribe bus for pushing events to clients.
+
+Write paths publish events to topics, "user:<id>" or "provider:<id>", and
+every server-sent events stream subscribed to those topics receives them
+(see controllers/EventController.py). Each subscriber has a bounded queue;
+a subscriber that falls EVENT_QUEUE_SIZE events behind is dropped and its
+client reconnects, so a slow client never holds up publishers.
+
+Publishing is local to the process. With several worker processes set
+EVENT_SOURCE=change_streams: a ChangeStreamRelay in every process then
+watches the notifications and bookings collections and publishes what it
+sees, and the write paths stop publishing directly. Change streams need a
+replica set; if the server does not support them the relay logs a warning
+and the write paths keep publishing in-process.
+
+Event types:
+
+    notification        a notification was created
+    booking_status      a booking's status changed
+    payment_status      a booking's payment status changed
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import PyMongoError
+
+from config.database import booking_collection, notification_collection
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 100))
+EVENT_SOURCE = os.getenv("EVENT_SOURCE", "memory")
+
+NOTIFICATION_EVENT = "notification"
+BOOKING_STATUS_EVENT = "booking_status"
+PAYMENT_STATUS_EVENT = "payment_status"
+
+# Booking fields sent with booking events
+BOOKING_EVENT_FIELDS = ("_id", "user_id", "service_provider_id", "service_id", "status", "payment_status", "updated_at")
+
+
+def user_topic(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def provider_topic(provider_id: Any) -> str:
+    return f"provider:{provider_id}"
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", topics: List[str], maxsize: int):
+        self.bus = bus
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait up to timeout seconds for the next event; None on timeout
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, list(dict.fromkeys(topics)), self.queue_size)
+        for topic in subscription.topics:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def publish(self, topics: Iterable[str], event: str, data: Dict[str, Any]):
+        """
+        Deliver an event to every subscriber of any of the topics, once each;
+        never blocks
+        """
+        self.published += 1
+        recipients = set()
+        for topic in topics:
+            recipients.update(self._subscribers.get(topic, ()))
+        if not recipients:
+            return
+
+        message = {"id": next(self._ids), "event": event, "data": data}
+        for subscription in recipients:
+            try:
+                subscription.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # The stream ends when it sees the flag; the client reconnects
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                self.dropped_subscribers += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": "change_streams" if change_stream_relay.running else "memory",
+            "topics": len(self._subscribers),
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers
+        }
+
+
+event_bus = EventBus()
+
+
+def _booking_event(booking: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: booking.get(field) for field in BOOKING_EVENT_FIELDS if field in booking}
+
+
+def _publish_notifications(notifications: Iterable[Dict[str, Any]]):
+    for notification in notifications:
+        event_bus.publish([user_topic(notification["user_id"])], NOTIFICATION_EVENT, notification)
+
+
+def _publish_booking(booking: Dict[str, Any], event: str):
+    topics = [user_topic(booking.get("user_id")), provider_topic(booking.get("service_provider_id"))]
+    event_bus.publish(topics, event, _booking_event(booking))
+
+
+def publish_notifications(notifications: Iterable[Dict[str, Any]]):
+    """
+    Publish newly created notifications to their users' streams
+    """
+    if not change_stream_relay.running:
+        _publish_notifications(notifications)
+
+
+def publish_booking_change(booking: Dict[str, Any], event: str):
+    """
+    Publish a booking status or payment status change to the booking's user
+    and service provider streams
+    """
+    if not change_stream_relay.running:
+        _publish_booking(booking, event)
+
+
+class ChangeStreamRelay:
+    """
+    Publishes notification inserts and booking status changes seen on
+    MongoDB change streams, so events reach subscribers in every process
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        if self._tasks or EVENT_SOURCE != "change_streams":
+            return
+        try:
+            # Fails straight away on servers without change stream support
+            async with notification_collection.watch([], max_await_time_ms=1) as stream:
+                await stream.try_next()
+        except PyMongoError as e:
+            logger.warning(f"Change streams unavailable, publishing events in-process: {str(e)}")
+            return
+
+        self._tasks = [
+            asyncio.create_task(self._watch_notifications(), name="events-notifications"),
+            asyncio.create_task(self._watch_bookings(), name="events-bookings")
+        ]
+        logger.info("Publishing events from MongoDB change streams")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _watch_notifications(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async for change in self._changes(notification_collection, pipeline):
+            _publish_notifications([change["fullDocument"]])
+
+    async def _watch_bookings(self):
+        pipeline = [{"$match": {
+            "operationType": "update",
+            "$or": [
+                {"updateDescription.updatedFields.status": {"$exists": True}},
+                {"updateDescription.updatedFields.payment_status": {"$exists": True}}
+            ]
+        }}]
+        async for change in self._changes(booking_collection, pipeline, full_document="updateLookup"):
+            booking = change.get("fullDocument")
+            if not booking:
+                continue
+            updated = change["updateDescription"]["updatedFields"]
+            if "status" in updated:
+                _publish_booking(booking, BOOKING_STATUS_EVENT)
+            if "payment_status" in updated:
+                _publish_booking(booking, PAYMENT_STATUS_EVENT)
+
+    async def _changes(self, collection, pipeline, **options):
+        """
+        Yield changes from a collection, resuming after transient errors
+        """
+        resume_token = None
+        while True:
+            try:
+                async with collection.watch(pipeline, resume_after=resume_token, **options) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        yield change
+            except PyMongoError as e:
+                logger.error(f"Change stream on {collection.name} failed, resuming: {str(e)}")
+                await asyncio.sleep(1)
+
+
+change_stream_relay = ChangeStreamRelay()
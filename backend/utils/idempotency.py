@@ -0,0 +1,186 @@
+"""
+Idempotency-Key support for create endpoints.
+
+Clients retrying a create request (a checkout page resubmitting after a
+timeout, a double click) used to create a second payment or booking. A
+request carrying an Idempotency-Key header is now run at most once per key:
+
+- The first request claims the key by inserting an "in_progress" record into
+  the idempotency_keys collection, whose unique _id makes the claim atomic
+  across worker processes.
+- When it finishes, its status code and body are stored on the record, and
+  every later request with the same key gets that response replayed, marked
+  with an Idempotent-Replayed header, without running the handler again.
+- A request arriving while the first is still running gets 409; one reusing
+  the key for a different payload gets 422.
+- Server errors (5xx) and exceptions release the key, so the client can retry.
+
+Records expire through a TTL index after IDEMPOTENCY_KEY_TTL seconds.
+Completed responses are also kept in a short-lived in-process cache, so
+replays from a client hammering retries do not reach the database. A claim
+left behind by a crashed process can be taken over after
+IDEMPOTENCY_LOCK_TIMEOUT seconds.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+from config.database import idempotency_collection
+from utils.responses import BSONJSONResponse
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 2048))
+IDEMPOTENCY_CACHE_TTL = float(os.getenv("IDEMPOTENCY_CACHE_TTL", 300))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+CLAIM_ATTEMPTS = 3
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+idempotency_cache = TTLCache("idempotency", maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL)
+
+
+def request_fingerprint(payload: Any) -> str:
+    """
+    Stable hash of a request payload, used to detect a key reused for a
+    different request
+    """
+    canonical = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _error(status_code: int, message: str) -> Response:
+    return BSONJSONResponse(status_code=status_code, content={"message": message, "status": False})
+
+
+def _replay(record: Dict[str, Any]) -> Response:
+    response = Response(
+        content=record["body"],
+        status_code=record["status_code"],
+        media_type=record.get("media_type")
+    )
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+async def _claim(record_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim a key for this request. Returns None if the claim succeeded, or the
+    existing record otherwise
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = datetime.now()
+        claim = {
+            "state": "in_progress",
+            "fingerprint": fingerprint,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT),
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+        }
+        try:
+            await idempotency_collection.insert_one({"_id": record_id, **claim})
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # Take over a claim abandoned by a request that never finished
+        taken_over = await idempotency_collection.find_one_and_update(
+            {"_id": record_id, "state": "in_progress", "fingerprint": fingerprint, "locked_until": {"$lt": now}},
+            {"$set": claim}
+        )
+        if taken_over:
+            logger.warning(f"Took over stale idempotency claim {record_id}")
+            return None
+
+        existing = await idempotency_collection.find_one({"_id": record_id})
+        if existing is not None:
+            return existing
+        # Released between the insert and the lookup; claim it again
+
+    # The key keeps being claimed and released by other requests
+    logger.warning(f"Could not claim idempotency key {record_id} after {CLAIM_ATTEMPTS} attempts")
+    return {"state": "in_progress", "fingerprint": fingerprint}
+
+
+async def _release(record_id: str, fingerprint: str):
+    await idempotency_collection.delete_one({"_id": record_id, "state": "in_progress", "fingerprint": fingerprint})
+
+
+async def run_idempotent(
+    scope: str,
+    key: Optional[str],
+    payload: Any,
+    handler: Callable[[], Awaitable[Response]]
+) -> Response:
+    """
+    Run a create handler at most once per idempotency key
+
+    Args:
+        scope: Name of the endpoint, so keys of different endpoints never clash
+        key: Value of the Idempotency-Key header; without one the handler
+            simply runs
+        payload: The request data the key is bound to
+        handler: Performs the request and returns its response
+
+    Returns:
+        Response: The handler's response, the stored response of an earlier
+            request with the same key, or a 409/422/400 error
+    """
+    if key is None:
+        return await handler()
+
+    key = key.strip()
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return _error(400, f"Idempotency-Key must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+
+    record_id = f"{scope}:{key}"
+    fingerprint = request_fingerprint(payload)
+
+    record = idempotency_cache.get(record_id)
+    if record is None:
+        record = await _claim(record_id, fingerprint)
+
+    if record is not None:
+        if record["fingerprint"] != fingerprint:
+            return _error(422, "Idempotency-Key was already used for a different request")
+        if record["state"] != "completed":
+            return _error(409, "A request with this Idempotency-Key is still being processed")
+        idempotency_cache.set(record_id, record)
+        logger.info(f"Replaying stored response for idempotency key {record_id}")
+        return _replay(record)
+
+    try:
+        response = await handler()
+    except BaseException:
+        await asyncio.shield(_release(record_id, fingerprint))
+        raise
+
+    # Only complete responses are stored; errors worth retrying release the key
+    body = getattr(response, "body", None)
+    if body is None or response.status_code >= 500:
+        await _release(record_id, fingerprint)
+        return response
+
+    completed = {
+        "state": "completed",
+        "status_code": response.status_code,
+        "body": bytes(body).decode("utf-8"),
+        "media_type": response.media_type
+    }
+    await idempotency_collection.update_one(
+        {"_id": record_id, "fingerprint": fingerprint},
+        {"$set": completed, "$unset": {"locked_until": ""}}
+    )
+    idempotency_cache.set(record_id, {"fingerprint": fingerprint, **completed})
+    return response
@@ -0,0 +1,224 @@
+"""
+Pre-generated image derivatives for service provider images.
+
+Provider avatars, profile images and gallery images were served at their
+original size everywhere, including provider cards. For every locally stored
+image (a /uploads/... URL) this module renders fixed-size thumbnails, each as
+WebP plus a JPEG/PNG fallback, and stores their URLs on the provider next to
+the original:
+
+    avatar_variants, profile_image_variants
+        {"original": url, "thumb": {"webp": url, "jpg": url}, "card": {...}}
+    gallery_image_variants
+        one such document per entry of gallery_images, in the same order
+
+Derivatives are named after the hash of the source image and size, so they
+are immutable and can be cached forever (see utils/static_files.py).
+Rendering runs in worker threads from a background ImageProcessor, scheduled
+when an image is uploaded or a provider's image fields change; the upload
+request does not wait for it. generate_image_derivatives.py backfills
+existing providers.
+
+Images that cannot be decoded are skipped and keep only their original.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Set
+
+from bson import ObjectId
+from PIL import Image, ImageOps
+
+from config.database import service_provider_collection
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "uploads"
+DERIVATIVE_DIR = os.path.join(UPLOAD_ROOT, "derived")
+
+# Longest edge in pixels of each derivative
+THUMBNAIL_SIZES = {"thumb": 160, "card": 480}
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", 85))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+# Provider fields holding a single image URL
+PROVIDER_IMAGE_FIELDS = ("avatar", "profile_image")
+GALLERY_FIELD = "gallery_images"
+
+
+def local_image_path(url: Optional[str]) -> Optional[str]:
+    """
+    Map a /uploads/... URL to its file, or None for remote or missing images
+    """
+    if not url or not url.startswith(f"/{UPLOAD_ROOT}/"):
+        return None
+    root = os.path.realpath(UPLOAD_ROOT)
+    path = os.path.realpath(os.path.join(root, url[len(UPLOAD_ROOT) + 2:]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_atomically(image, path: str, **options):
+    # A unique temporary file per call, so workers rendering the same source
+    # at once never write to or remove each other's file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".derived-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            image.save(file, **options)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def render_derivatives(url: str, source_path: str) -> Dict[str, Any]:
+    """
+    Render every thumbnail size of an image as WebP and JPEG/PNG; blocking,
+    run it in a worker thread
+
+    Returns:
+        Dict[str, Any]: The original URL and, per size, the derivative URLs
+    """
+    os.makedirs(DERIVATIVE_DIR, exist_ok=True)
+    stem = _file_digest(source_path)[:32]
+    variants: Dict[str, Any] = {"original": url}
+
+    with Image.open(source_path) as opened:
+        source = ImageOps.exif_transpose(opened)
+        has_alpha = source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info)
+        fallback = "png" if has_alpha else "jpg"
+
+        for name, edge in THUMBNAIL_SIZES.items():
+            urls = {}
+            for extension in ("webp", fallback):
+                filename = f"{stem}-{edge}.{extension}"
+                path = os.path.join(DERIVATIVE_DIR, filename)
+                if not os.path.exists(path):
+                    image = source.copy()
+                    image.thumbnail((edge, edge))
+                    if extension == "webp":
+                        _save_atomically(image, path, format="WEBP", quality=WEBP_QUALITY, method=4)
+                    elif extension == "png":
+                        _save_atomically(image, path, format="PNG", optimize=True)
+                    else:
+                        _save_atomically(image.convert("RGB"), path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                urls[extension] = f"/{UPLOAD_ROOT}/derived/{filename}"
+            variants[name] = urls
+
+    return variants
+
+
+async def build_variants(url: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Derivatives for one image URL, or None if it cannot be processed
+    """
+    source_path = local_image_path(url)
+    if source_path is None:
+        return None
+    try:
+        return await asyncio.to_thread(render_derivatives, url, source_path)
+    except Exception as e:
+        logger.error(f"Error generating derivatives for {url}: {str(e)}")
+        return None
+
+
+async def refresh_provider_variants(provider_id: Any, fields: Dict[str, Any]):
+    """
+    Generate and store derivatives for the given image fields of a provider
+
+    Each update only applies while the field still holds the image the
+    derivatives were made from, so a newer upload is never overwritten.
+    """
+    provider_id = provider_id if isinstance(provider_id, ObjectId) else ObjectId(provider_id)
+
+    for field in PROVIDER_IMAGE_FIELDS:
+        if field not in fields:
+            continue
+        variants = await build_variants(fields[field])
+        await service_provider_collection.update_one(
+            {"_id": provider_id, field: fields[field]},
+            {"$set": {f"{field}_variants": variants}}
+        )
+
+    if GALLERY_FIELD in fields:
+        gallery = list(fields[GALLERY_FIELD] or [])
+        variants = [await build_variants(url) or {"original": url} for url in gallery]
+        await service_provider_collection.update_one(
+            {"_id": provider_id, GALLERY_FIELD: gallery},
+            {"$set": {"gallery_image_variants": variants}}
+        )
+
+
+def provider_image_fields(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The image fields present in a provider document or update
+    """
+    return {field: document[field] for field in (*PROVIDER_IMAGE_FIELDS, GALLERY_FIELD) if field in document}
+
+
+class ImageProcessor:
+    """
+    Runs derivative generation in the background, IMAGE_WORKERS at a time
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+
+    def schedule_provider(self, provider_id: Any, fields: Dict[str, Any]):
+        """
+        Generate derivatives for a provider's changed image fields without
+        waiting for them
+        """
+        if not fields:
+            return
+        task = asyncio.create_task(self._run(provider_id, fields))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, provider_id: Any, fields: Dict[str, Any]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            try:
+                await refresh_provider_variants(provider_id, fields)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error generating image derivatives for service provider {provider_id}: {str(e)}")
+
+    async def stop(self):
+        """
+        Cancel in-flight jobs; images they did not finish are picked up by
+        generate_image_derivatives.py
+        """
+        tasks: List[asyncio.Task] = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+
+image_processor = ImageProcessor()
@@ -0,0 +1,99 @@
+"""
+Invoice number generation.
+
+Invoice numbers used to be derived from the current timestamp, so two
+payments created in the same second got the same number and the second
+insert failed on the unique invoice_number index. They now come from a
+counter document in the sequences collection, advanced atomically with
+find_one_and_update/$inc.
+
+To keep that off the hot path, each worker process reserves
+INVOICE_BLOCK_SIZE numbers per round trip and hands them out from memory, so
+only one payment in every block waits on the database. Numbers are unique
+across processes and increase within a process; across processes they
+interleave by block, and numbers left in a block when a process stops are
+never issued. Set INVOICE_BLOCK_SIZE=1 where gaps are not acceptable.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from config.database import sequence_collection
+
+logger = logging.getLogger(__name__)
+
+INVOICE_BLOCK_SIZE = int(os.getenv("INVOICE_BLOCK_SIZE", 50))
+INVOICE_PREFIX = os.getenv("INVOICE_PREFIX", "INV")
+
+
+def format_invoice_number(value: int, issued_at: Optional[datetime] = None) -> str:
+    """
+    Render a sequence value as an invoice number, e.g. INV-20250101-000042
+    """
+    issued_at = issued_at or datetime.now()
+    return f"{INVOICE_PREFIX}-{issued_at.strftime('%Y%m%d')}-{value:06d}"
+
+
+class SequenceAllocator:
+    """
+    Hands out values of a named database counter, reserving them in blocks
+    """
+
+    def __init__(self, name: str, block_size: int = INVOICE_BLOCK_SIZE):
+        self.name = name
+        self.block_size = max(1, block_size)
+        self._next = 0
+        self._end = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self.issued = 0
+        self.blocks_reserved = 0
+
+    async def _reserve_block(self):
+        counter = await sequence_collection.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter["value"] + 1
+        self._next = self._end - self.block_size
+        self.blocks_reserved += 1
+        logger.info(f"Reserved {self.name} numbers {self._next}-{self._end - 1}")
+
+    async def next_value(self) -> int:
+        """
+        Return the next unused value, reserving a new block when the current
+        one is exhausted
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._next >= self._end:
+                await self._reserve_block()
+            value = self._next
+            self._next += 1
+            self.issued += 1
+            return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "block_size": self.block_size,
+            "blocks_reserved": self.blocks_reserved,
+            "issued": self.issued,
+            "remaining_in_block": self._end - self._next
+        }
+
+
+invoice_sequence = SequenceAllocator("invoice_number")
+
+
+async def next_invoice_number() -> str:
+    """
+    Return a new, unique invoice number
+    """
+    return format_invoice_number(await invoice_sequence.next_value())
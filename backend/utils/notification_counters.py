@@ -0,0 +1,138 @@
+"""
+Per-user unread notification counters.
+
+The notification_counters collection holds one document per user,
+{_id: user_id, unread: n}. Notification write paths call
+record_unread_change() to adjust it with $inc, so an unread badge is a single
+lookup by _id instead of a query over the user's notifications. Reads go
+through a short-lived in-process cache, which local writes invalidate; the
+TTL bounds how stale a count written by another worker can be.
+
+Counters are created lazily: the first read for a user counts their unread
+notifications (served by the user_unread_recent index) and stores the result.
+Increments only apply to existing counters, so a user whose counter was never
+read costs nothing on the write path.
+
+Every increment also bumps the counter's version. A recount first makes sure
+the counter document exists, counts, and then stores the count only if the
+version is unchanged, retrying otherwise; a notification read or deleted
+while the count runs can therefore never be lost. Counters are recounted
+when they go below zero and, to bound any other drift (e.g. a failed
+counter write), once they are older than UNREAD_COUNT_RECOUNT_INTERVAL.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from config.database import notification_collection, notification_counter_collection
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+unread_count_cache = TTLCache(
+    "notification_unread_count",
+    maxsize=int(os.getenv("UNREAD_COUNT_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("UNREAD_COUNT_CACHE_TTL", 15))
+)
+
+# Seconds after which a counter is recounted on its next read
+UNREAD_COUNT_RECOUNT_INTERVAL = float(os.getenv("UNREAD_COUNT_RECOUNT_INTERVAL", 3600))
+RECOUNT_ATTEMPTS = 3
+
+
+async def _recount(user_id: ObjectId) -> int:
+    """
+    Count a user's unread notifications and store the result, unless an
+    increment landed while counting
+    """
+    for _ in range(RECOUNT_ATTEMPTS):
+        # Create the counter first so increments made during the count apply to it
+        counter = await notification_counter_collection.find_one_and_update(
+            {"_id": user_id},
+            {"$setOnInsert": {"unread": 0, "version": 0}},
+            upsert=True,
+            projection={"version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        version = counter.get("version", 0)
+
+        unread = await notification_collection.count_documents({"user_id": user_id, "is_read": False})
+
+        now = datetime.now()
+        result = await notification_counter_collection.update_one(
+            {"_id": user_id, "version": version} if "version" in counter else {"_id": user_id, "version": {"$exists": False}},
+            {"$set": {"unread": unread, "version": version + 1, "counted_at": now, "updated_at": now}}
+        )
+        if result.modified_count:
+            return unread
+
+    logger.warning(f"Unread notification counter for user {user_id} kept changing during recount")
+    return unread
+
+
+def _needs_recount(counter: Dict[str, Any]) -> bool:
+    counted_at = counter.get("counted_at")
+    return (
+        counter.get("unread", 0) < 0
+        or counted_at is None
+        or counted_at < datetime.now() - timedelta(seconds=UNREAD_COUNT_RECOUNT_INTERVAL)
+    )
+
+
+async def get_unread_count(user_id: Any) -> int:
+    """
+    Return the number of unread notifications for a user
+    """
+    user_id = user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
+
+    cached = unread_count_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    counter = await notification_counter_collection.find_one({"_id": user_id}, {"unread": 1, "counted_at": 1})
+    if counter is None or _needs_recount(counter):
+        unread = await _recount(user_id)
+    else:
+        unread = counter["unread"]
+
+    unread_count_cache.set(user_id, unread)
+    return unread
+
+
+async def record_unread_change(deltas: Dict[Any, int]):
+    """
+    Apply per-user changes to the unread counters in one bulk write
+    """
+    operations = []
+    now = datetime.now()
+    for user_id, delta in deltas.items():
+        user_id = user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
+        unread_count_cache.invalidate(user_id)
+        if delta:
+            operations.append(UpdateOne({"_id": user_id}, {"$inc": {"unread": delta, "version": 1}, "$set": {"updated_at": now}}))
+
+    if not operations:
+        return
+
+    try:
+        await notification_counter_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        # Never fail the notification write; drifted counters are recounted periodically
+        logger.error(f"Error updating unread notification counters: {str(e)}")
+
+
+async def record_new_notifications(notifications: Iterable[Dict[str, Any]]):
+    """
+    Count newly inserted notifications towards their users' unread counters
+    """
+    deltas = defaultdict(int)
+    for notification in notifications:
+        if not notification.get("is_read"):
+            deltas[notification["user_id"]] += 1
+    await record_unread_change(deltas)
@@ -0,0 +1,235 @@
+"""
+Bulk system notification fan-out.
+
+create_system_notification used to create one notification at a time, each
+an insert plus a refetch, inside the request. Fan-outs now run as background
+jobs: recipients are streamed from a cursor and their notifications written
+with insert_many(ordered=False) in chunks of NOTIFICATION_FANOUT_CHUNK_SIZE,
+so a broadcast to every user is a few hundred round trips and the request
+returns as soon as the job is recorded.
+
+Each job is a document in the notification_jobs collection, updated after
+every chunk with the number of notifications inserted and failed, so its
+progress can be polled (GET /api/notifications/system/jobs/{job_id}). Jobs
+still running when the application stops are marked "interrupted".
+
+Audiences:
+
+    all_users       every user account
+    all_providers   the user account behind every service provider
+    (user_ids)      an explicit list of user ids
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from config.database import (
+    notification_collection, notification_job_collection, user_collection, service_provider_collection
+)
+from utils.notification_counters import record_new_notifications
+from utils.event_bus import publish_notifications
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_FANOUT_CHUNK_SIZE = int(os.getenv("NOTIFICATION_FANOUT_CHUNK_SIZE", 1000))
+
+AUDIENCE_ALL_USERS = "all_users"
+AUDIENCE_ALL_PROVIDERS = "all_providers"
+AUDIENCES = (AUDIENCE_ALL_USERS, AUDIENCE_ALL_PROVIDERS)
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+async def _recipients(audience: Optional[str], user_ids: Optional[List[ObjectId]]) -> AsyncIterator[ObjectId]:
+    """
+    Yield each recipient's user id once
+    """
+    if audience == AUDIENCE_ALL_USERS:
+        async for user in user_collection.find({}, {"_id": 1}).batch_size(NOTIFICATION_FANOUT_CHUNK_SIZE):
+            yield user["_id"]
+        return
+
+    if audience == AUDIENCE_ALL_PROVIDERS:
+        source = service_provider_collection.find({"user_id": {"$ne": None}}, {"user_id": 1})
+        user_ids = (provider["user_id"] async for provider in source.batch_size(NOTIFICATION_FANOUT_CHUNK_SIZE))
+    else:
+        user_ids = _iterate(user_ids or [])
+
+    # A user may own several providers or be listed twice
+    seen: Set[ObjectId] = set()
+    async for user_id in user_ids:
+        user_id = user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
+        if user_id not in seen:
+            seen.add(user_id)
+            yield user_id
+
+
+async def _iterate(values):
+    for value in values:
+        yield value
+
+
+async def _count_recipients(audience: Optional[str], user_ids: Optional[List[ObjectId]]) -> int:
+    if audience == AUDIENCE_ALL_USERS:
+        return await user_collection.count_documents({})
+    if audience == AUDIENCE_ALL_PROVIDERS:
+        return len(await service_provider_collection.distinct("user_id", {"user_id": {"$ne": None}}))
+    return len(set(user_ids or []))
+
+
+async def _insert_chunk(documents: List[Dict[str, Any]]) -> int:
+    """
+    Insert a chunk of notifications, returning how many were written
+    """
+    try:
+        await notification_collection.insert_many(documents, ordered=False)
+        written = documents
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        logger.warning(f"{len(errors)} notifications failed in a fan-out chunk")
+        failed = {error["index"] for error in errors}
+        written = [document for index, document in enumerate(documents) if index not in failed]
+
+    await record_new_notifications(written)
+    publish_notifications(written)
+    return len(written)
+
+
+class NotificationFanout:
+    def __init__(self, chunk_size: int = NOTIFICATION_FANOUT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._tasks: Dict[ObjectId, asyncio.Task] = {}
+
+    async def start_job(
+        self,
+        title: str,
+        message: str,
+        audience: Optional[str] = None,
+        user_ids: Optional[List[ObjectId]] = None,
+        related_id: Optional[ObjectId] = None
+    ) -> Dict[str, Any]:
+        """
+        Record a fan-out job and start it in the background
+
+        Args:
+            title: Notification title
+            message: Notification message
+            audience: One of AUDIENCES, or None to use user_ids
+            user_ids: Explicit recipients when no audience is given
+            related_id: Optional id of the related entity
+
+        Returns:
+            Dict[str, Any]: The job document
+        """
+        now = datetime.now()
+        job = {
+            "_id": ObjectId(),
+            "status": QUEUED,
+            "audience": audience or "user_ids",
+            "title": title,
+            "message": message,
+            "related_id": related_id,
+            "total": None,
+            "inserted": 0,
+            "failed": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        await notification_job_collection.insert_one(job)
+
+        task = asyncio.create_task(
+            self._run(job, audience, user_ids),
+            name=f"notification-fanout-{job['_id']}"
+        )
+        self._tasks[job["_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["_id"], None))
+        return job
+
+    async def get_job(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        job = await notification_job_collection.find_one({"_id": job_id})
+        if job and job.get("total"):
+            job["progress"] = round(100 * (job["inserted"] + job["failed"]) / job["total"], 1)
+        return job
+
+    async def stop(self):
+        """
+        Cancel running jobs and mark them interrupted
+        """
+        tasks = list(self._tasks.items())
+        for _, task in tasks:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+
+        if tasks:
+            await notification_job_collection.update_many(
+                {"_id": {"$in": [job_id for job_id, _ in tasks]}, "status": {"$in": [QUEUED, RUNNING]}},
+                {"$set": {"status": INTERRUPTED, "updated_at": datetime.now()}}
+            )
+            logger.info(f"Interrupted {len(tasks)} notification fan-out jobs")
+
+    async def _update(self, job_id: ObjectId, fields: Dict[str, Any]):
+        await notification_job_collection.update_one(
+            {"_id": job_id},
+            {"$set": {**fields, "updated_at": datetime.now()}}
+        )
+
+    async def _run(self, job: Dict[str, Any], audience: Optional[str], user_ids: Optional[List[ObjectId]]):
+        job_id = job["_id"]
+        inserted = failed = 0
+        try:
+            total = await _count_recipients(audience, user_ids)
+            await self._update(job_id, {"status": RUNNING, "total": total, "started_at": datetime.now()})
+            logger.info(f"Notification fan-out {job_id} started for {total} recipients")
+
+            chunk: List[Dict[str, Any]] = []
+            async for user_id in _recipients(audience, user_ids):
+                now = datetime.now()
+                chunk.append({
+                    "user_id": user_id,
+                    "title": job["title"],
+                    "message": job["message"],
+                    "notification_type": "system",
+                    "related_id": job["related_id"],
+                    "is_read": False,
+                    "created_at": now,
+                    "updated_at": now
+                })
+                if len(chunk) >= self.chunk_size:
+                    written = await _insert_chunk(chunk)
+                    inserted += written
+                    failed += len(chunk) - written
+                    chunk = []
+                    await self._update(job_id, {"inserted": inserted, "failed": failed})
+
+            if chunk:
+                written = await _insert_chunk(chunk)
+                inserted += written
+                failed += len(chunk) - written
+
+            await self._update(job_id, {
+                "status": COMPLETED,
+                "inserted": inserted,
+                "failed": failed,
+                "completed_at": datetime.now()
+            })
+            logger.info(f"Notification fan-out {job_id} completed: {inserted} inserted, {failed} failed")
+        except asyncio.CancelledError:
+            await asyncio.shield(self._update(job_id, {"inserted": inserted, "failed": failed}))
+            raise
+        except Exception as e:
+            logger.error(f"Error in notification fan-out {job_id}: {str(e)}")
+            await self._update(job_id, {"status": FAILED, "error": str(e), "inserted": inserted, "failed": failed})
+
+
+notification_fanout = NotificationFanout()
@@ -0,0 +1,187 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+Pages are ordered by a sort field with _id as tie-breaker, both descending,
+and the next page is selected with a range query on those values instead of
+skip(). The cursor handed to clients is an opaque url-safe token.
+
+Requests that send neither a cursor nor a limit predate pagination and
+expect the whole list; they get up to LEGACY_PAGE_SIZE documents, the cap
+list endpoints always had, together with a next_cursor if there are more.
+"""
+
+import base64
+import binascii
+import logging
+import os
+from bson import json_util
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Page size configuration
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 500))
+LEGACY_PAGE_SIZE = int(os.getenv("LEGACY_PAGE_SIZE", 1000))
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """
+    Bound a requested page size to [1, MAX_PAGE_SIZE], using the default if unset
+    """
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def page_size_for(cursor: Optional[str], limit: Optional[int]) -> int:
+    """
+    Page size for a request; LEGACY_PAGE_SIZE when it asks for neither a
+    cursor nor a limit
+    """
+    if cursor is None and limit is None:
+        return LEGACY_PAGE_SIZE
+    return clamp_page_size(limit)
+
+
+def encode_cursor(document: Dict[str, Any], sort_field: str = "_id") -> str:
+    """
+    Build an opaque cursor pointing just after the given document
+    """
+    position = {"id": document["_id"]}
+    if sort_field != "_id":
+        position["v"] = document.get(sort_field)
+    raw = json_util.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor}") from e
+
+    if not isinstance(position, dict) or "id" not in position:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor}")
+    return position
+
+
+def _after_cursor_query(position: Dict[str, Any], sort_field: str, direction: int = -1) -> Dict[str, Any]:
+    after = "$lt" if direction < 0 else "$gt"
+    if sort_field == "_id":
+        return {"_id": {after: position["id"]}}
+    return {
+        "$or": [
+            {sort_field: {after: position.get("v")}},
+            {sort_field: position.get("v"), "_id": {after: position["id"]}}
+        ]
+    }
+
+
+async def paginate(
+    collection,
+    query: Optional[Dict[str, Any]] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort_field: str = "_id",
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of documents ordered by sort_field then _id, newest first
+
+    Args:
+        collection: The Motor collection to query
+        query: Base filter for the listing
+        cursor: Cursor returned with the previous page, None for the first page
+        limit: Requested page size, clamped to MAX_PAGE_SIZE; without a
+            cursor or limit, up to LEGACY_PAGE_SIZE documents are returned
+        sort_field: Field to order by; _id is always used as tie-breaker
+        projection: Optional projection passed through to find()
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: The page and the cursor for the next
+        page, or None if this is the last page
+
+    Raises:
+        InvalidCursorError: If cursor is malformed
+    """
+    page_size = page_size_for(cursor, limit)
+    filters = dict(query or {})
+
+    if cursor:
+        position = decode_cursor(cursor)
+        after = _after_cursor_query(position, sort_field)
+        filters = {"$and": [filters, after]} if filters else after
+
+    sort = [("_id", -1)] if sort_field == "_id" else [(sort_field, -1), ("_id", -1)]
+
+    # Fetch one extra document to find out whether another page exists
+    documents = await collection.find(filters, projection).sort(sort).limit(page_size + 1).to_list(length=page_size + 1)
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+
+    return documents, next_cursor
+
+
+async def paginate_pipeline(
+    collection,
+    pipeline: List[Dict[str, Any]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort_field: str = "_id",
+    direction: int = -1
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of an aggregation, ordered by sort_field then _id. Use this
+    instead of paginate() when the sort field is computed by the pipeline,
+    e.g. a relevance score or a distance.
+
+    Args:
+        collection: The Motor collection to aggregate
+        pipeline: Stages producing the documents to page through; the cursor
+            filter, sort and limit are appended after them
+        cursor: Cursor returned with the previous page, None for the first page
+        limit: Requested page size, clamped to MAX_PAGE_SIZE; without a
+            cursor or limit, up to LEGACY_PAGE_SIZE documents are returned
+        sort_field: Field to order by; _id is always used as tie-breaker
+        direction: -1 for highest first, 1 for lowest first
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: The page and the cursor for the next
+        page, or None if this is the last page
+
+    Raises:
+        InvalidCursorError: If cursor is malformed
+    """
+    page_size = page_size_for(cursor, limit)
+    stages = list(pipeline)
+
+    if cursor:
+        stages.append({"$match": _after_cursor_query(decode_cursor(cursor), sort_field, direction)})
+
+    sort = {"_id": direction} if sort_field == "_id" else {sort_field: direction, "_id": direction}
+    stages.extend([{"$sort": sort}, {"$limit": page_size + 1}])
+
+    # Fetch one extra document to find out whether another page exists
+    documents = await collection.aggregate(stages).to_list(length=page_size + 1)
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+
+    return documents, next_cursor
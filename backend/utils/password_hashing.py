@@ -0,0 +1,115 @@
+"""
+Password hashing off the event loop.
+
+bcrypt hashing and verification take a few hundred milliseconds of CPU each,
+so they run on a dedicated thread pool (bcrypt releases the GIL while it
+works). At most PASSWORD_HASH_WORKERS operations run at once; further callers
+wait on the event loop, and once PASSWORD_HASH_MAX_PENDING operations are
+pending new ones are rejected with PasswordHasherBusyError instead of piling
+up behind a login storm. Callers answer those with 503 and a Retry-After
+header (BUSY_HEADERS), so clients can tell a saturated pool from a failure.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Union
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 32))
+# Seconds a rejected client is asked to wait before retrying
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 1))
+
+BUSY_HEADERS = {"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots: Optional[asyncio.Semaphore] = None
+
+# Metrics
+_pending = 0
+_running = 0
+_completed = 0
+_rejected = 0
+
+
+class PasswordHasherBusyError(RuntimeError):
+    """Raised when too many password operations are already pending"""
+
+
+def _get_slots() -> asyncio.Semaphore:
+    # Created lazily so the semaphore belongs to the running event loop
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    return _slots
+
+
+async def _run(func, *args):
+    global _pending, _running, _completed, _rejected
+
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        _rejected += 1
+        logger.warning(f"Password hasher saturated, rejecting request ({_pending} pending)")
+        raise PasswordHasherBusyError("Too many password operations in progress")
+
+    _pending += 1
+    try:
+        async with _get_slots():
+            _running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+            finally:
+                _running -= 1
+                _completed += 1
+    finally:
+        _pending -= 1
+
+
+def _to_bytes(value: Union[str, bytes]) -> bytes:
+    return value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+def _hash(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+async def hash_password(password: Union[str, bytes]) -> str:
+    """
+    Hash a password with a fresh bcrypt salt
+
+    Raises:
+        PasswordHasherBusyError: If the pool is saturated
+    """
+    hashed = await _run(_hash, _to_bytes(password))
+    return hashed.decode("utf-8")
+
+
+async def verify_password(password: Union[str, bytes], hashed_password: Union[str, bytes]) -> bool:
+    """
+    Check a password against a bcrypt hash
+
+    Raises:
+        PasswordHasherBusyError: If the pool is saturated
+        ValueError: If hashed_password is not a valid bcrypt hash
+    """
+    return await _run(bcrypt.checkpw, _to_bytes(password), _to_bytes(hashed_password))
+
+
+def password_hasher_stats() -> Dict[str, Any]:
+    """
+    Current pool usage; queued is the number of operations waiting for a worker
+    """
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "running": _running,
+        "queued": _pending - _running,
+        "completed": _completed,
+        "rejected": _rejected
+    }
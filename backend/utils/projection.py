@@ -0,0 +1,79 @@
+"""
+Helpers for building MongoDB projections.
+
+Projecting at the query keeps sensitive fields out of responses without
+post-processing each document, so controllers can hand documents straight to
+the response encoder. List endpoints define a default projection per
+endpoint, which clients can narrow further with a `fields=` query parameter
+parsed by parse_fields().
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Never returned to clients, whatever the projection asks for
+SENSITIVE_FIELDS = ("password", "verification_code")
+
+# Plain or dotted field names; rules out operators such as $where
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+class InvalidFieldsError(ValueError):
+    """Raised when a fields= parameter names an invalid field"""
+
+
+def build_projection(include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Build a projection that returns only `include` (plus _id), or everything
+    except `exclude`; sensitive fields are always left out
+
+    Args:
+        include: Fields to return; takes precedence over exclude
+        exclude: Extra fields to leave out when include is not given
+
+    Returns:
+        Dict[str, int]: A projection document for find()/find_one()
+    """
+    if include:
+        projection = {field: 1 for field in include if field not in SENSITIVE_FIELDS}
+        if projection:
+            return projection
+
+    projection = {field: 0 for field in SENSITIVE_FIELDS}
+    for field in exclude or ():
+        projection[field] = 0
+    return projection
+
+
+def parse_fields(fields: Optional[str], required: Iterable[str] = ()) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields=` query parameter
+
+    Args:
+        fields: The raw parameter, e.g. "status,created_at"; None or blank for
+            the endpoint's default projection
+        required: Fields the endpoint needs internally (e.g. foreign keys used
+            for enrichment), added to the requested ones
+
+    Returns:
+        Optional[List[str]]: The field names, or None if none were requested
+
+    Raises:
+        InvalidFieldsError: If a field name is malformed
+    """
+    if not fields or not fields.strip():
+        return None
+
+    names = []
+    for name in (part.strip() for part in fields.split(",")):
+        if not name:
+            continue
+        if not _FIELD_NAME.match(name):
+            raise InvalidFieldsError(f"Invalid field name: {name}")
+        if name not in names:
+            names.append(name)
+
+    for name in required:
+        if name not in names:
+            names.append(name)
+    return names or None
@@ -0,0 +1,93 @@
+"""
+Cached mapping between service provider ids and their user account ids.
+
+Provider-scoped endpoints (notifications, event streams) address a provider's
+user account, and used to fetch the provider document on every call just to
+read its user_id; creating a provider checks the other direction, whether the
+user already has one. The mapping never changes for the life of a provider, so it
+is kept in two in-process TTL/LRU caches, one per direction, filled from
+lookups and from provider documents other code has already fetched
+(remember()). create_service_provider and delete_service_provider drop the
+affected entries; the TTL bounds staleness across worker processes.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+
+from config.database import service_provider_collection
+from utils.ttl_cache import TTLCache
+
+PROVIDER_IDENTITY_CACHE_SIZE = int(os.getenv("PROVIDER_IDENTITY_CACHE_SIZE", 10000))
+PROVIDER_IDENTITY_CACHE_TTL = float(os.getenv("PROVIDER_IDENTITY_CACHE_TTL", 3600))
+
+
+def _oid(value: Any) -> ObjectId:
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+
+class ProviderIdentityMap:
+    def __init__(self, maxsize: int = PROVIDER_IDENTITY_CACHE_SIZE, ttl: float = PROVIDER_IDENTITY_CACHE_TTL):
+        self._user_by_provider = TTLCache("provider_user_id", maxsize=maxsize, ttl=ttl)
+        self._provider_by_user = TTLCache("user_provider_id", maxsize=maxsize, ttl=ttl)
+
+    def remember(self, provider: Dict[str, Any]):
+        """
+        Record the mapping from a provider document holding _id and user_id
+        """
+        if provider.get("_id") and provider.get("user_id"):
+            provider_id, user_id = _oid(provider["_id"]), _oid(provider["user_id"])
+            self._user_by_provider.set(provider_id, user_id)
+            self._provider_by_user.set(user_id, provider_id)
+
+    async def get_user_id(self, provider_id: Any) -> Optional[ObjectId]:
+        """
+        Return the user id of a service provider, or None if the provider
+        does not exist or has no user
+        """
+        provider_id = _oid(provider_id)
+        user_id = self._user_by_provider.get(provider_id)
+        if user_id is None:
+            provider = await service_provider_collection.find_one({"_id": provider_id}, {"user_id": 1})
+            if not provider:
+                return None
+            self.remember(provider)
+            user_id = self._user_by_provider.get(provider_id)
+        return user_id
+
+    async def get_provider_id(self, user_id: Any) -> Optional[ObjectId]:
+        """
+        Return the id of the service provider owned by a user, or None
+        """
+        user_id = _oid(user_id)
+        provider_id = self._provider_by_user.get(user_id)
+        if provider_id is None:
+            provider = await service_provider_collection.find_one({"user_id": user_id}, {"user_id": 1})
+            if not provider:
+                return None
+            self.remember(provider)
+            provider_id = provider["_id"]
+        return provider_id
+
+    def invalidate(self, provider_id: Any = None, user_id: Any = None):
+        """
+        Drop the entries for a provider and/or user after a provider was
+        created or deleted
+        """
+        if provider_id is not None:
+            cached_user = self._user_by_provider.get(_oid(provider_id))
+            self._user_by_provider.invalidate(_oid(provider_id))
+            if cached_user is not None:
+                self._provider_by_user.invalidate(cached_user)
+        if user_id is not None:
+            self._provider_by_user.invalidate(_oid(user_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "user_by_provider": self._user_by_provider.stats(),
+            "provider_by_user": self._provider_by_user.stats()
+        }
+
+
+provider_identity = ProviderIdentityMap()
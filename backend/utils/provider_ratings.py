@@ -0,0 +1,260 @@
+"""
+Service provider rating counters.
+
+Each service provider document carries its rating state as counters:
+
+    rating_sum          sum of all ratings
+    rating_count        number of ratings
+    rating_histogram    {"1": n, ..., "5": n}, ratings rounded to whole stars
+
+Review writes call record_rating_change(), which adjusts the counters with a
+single atomic $inc, so concurrent reviews never overwrite each other and no
+write path has to refetch the provider's reviews. avg_rating and
+total_ratings, which search filters and sorts on, are derived from the
+counters with a compare-and-set: the update only applies while the counters
+still hold the values the average was computed from, so the last writer
+always publishes the average of the final counters.
+
+reconcile_provider_ratings() recomputes the counters from the reviews
+collection with one $group and corrects any provider that has drifted. The
+RatingReconciler runs it in the background every RATING_RECONCILE_INTERVAL
+seconds (see also reconcile_provider_ratings.py).
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from config.database import review_collection, service_provider_collection
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background reconciliation passes; 0 disables them
+RATING_RECONCILE_INTERVAL = float(os.getenv("RATING_RECONCILE_INTERVAL", 3600))
+RATING_RECONCILE_BATCH_SIZE = int(os.getenv("RATING_RECONCILE_BATCH_SIZE", 500))
+
+RATING_STARS = ("1", "2", "3", "4", "5")
+
+_COUNTER_PROJECTION = {"rating_sum": 1, "rating_count": 1, "rating_histogram": 1, "avg_rating": 1, "total_ratings": 1}
+
+
+def rating_bucket(rating: float) -> str:
+    """
+    Return the histogram bucket ("1"-"5") for a rating
+    """
+    return str(min(max(int(round(rating)), 1), 5))
+
+
+def average_rating(rating_sum: float, rating_count: int) -> float:
+    return round(rating_sum / rating_count, 1) if rating_count > 0 else 0
+
+
+def empty_histogram() -> Dict[str, int]:
+    return {star: 0 for star in RATING_STARS}
+
+
+def _increments(old_rating: Optional[float], new_rating: Optional[float]) -> Dict[str, float]:
+    """
+    Counter deltas for a rating being added (old=None), removed (new=None) or changed
+    """
+    fields = {"rating_sum": 0, "rating_count": 0}
+    for rating, sign in ((old_rating, -1), (new_rating, 1)):
+        if rating is None:
+            continue
+        fields["rating_sum"] += sign * rating
+        fields["rating_count"] += sign
+        bucket = f"rating_histogram.{rating_bucket(rating)}"
+        fields[bucket] = fields.get(bucket, 0) + sign
+    return {field: value for field, value in fields.items() if value}
+
+
+async def _publish_average(provider: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Derive avg_rating/total_ratings from the counters read back after an
+    update, unless another write has moved the counters on since
+    """
+    rating_sum = provider.get("rating_sum", 0)
+    rating_count = provider.get("rating_count", 0)
+    summary = {"avg_rating": average_rating(rating_sum, rating_count), "total_ratings": max(rating_count, 0)}
+
+    await service_provider_collection.update_one(
+        {"_id": provider["_id"], "rating_sum": rating_sum, "rating_count": rating_count},
+        {"$set": summary}
+    )
+    return summary
+
+
+async def record_rating_change(
+    provider_id: Any,
+    old_rating: Optional[float] = None,
+    new_rating: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply a rating being added (old_rating=None), removed (new_rating=None) or
+    changed to a provider's counters
+
+    Args:
+        provider_id: The service provider's id
+        old_rating: The rating being replaced or removed
+        new_rating: The rating being added
+
+    Returns:
+        Optional[Dict[str, Any]]: The provider's avg_rating and total_ratings
+            after the change, or None if the provider does not exist
+    """
+    update = {"$set": {"updated_at": datetime.now()}}
+    increments = _increments(old_rating, new_rating)
+    if increments:
+        update["$inc"] = increments
+
+    provider = await service_provider_collection.find_one_and_update(
+        {"_id": ObjectId(provider_id)},
+        update,
+        projection=_COUNTER_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not provider:
+        return None
+    return await _publish_average(provider)
+
+
+async def record_rating_change_safely(
+    provider_id: Any,
+    old_rating: Optional[float] = None,
+    new_rating: Optional[float] = None
+):
+    """
+    record_rating_change() for review write paths: a failure is logged and
+    left for the reconciler instead of failing the review write
+    """
+    try:
+        await record_rating_change(provider_id, old_rating, new_rating)
+    except Exception as e:
+        logger.error(f"Error updating rating counters for service provider {provider_id}: {str(e)}")
+
+
+async def _expected_counters() -> Dict[Any, Dict[str, Any]]:
+    """
+    Rating counters per provider, computed from the reviews collection
+    """
+    expected = {}
+    groups = review_collection.aggregate([
+        {"$match": {"rating": {"$type": "number"}}},
+        {"$group": {
+            "_id": {"service_provider_id": "$service_provider_id", "rating": "$rating"},
+            "count": {"$sum": 1}
+        }}
+    ])
+    async for group in groups:
+        key = group["_id"]
+        counters = expected.setdefault(key["service_provider_id"], {
+            "rating_sum": 0, "rating_count": 0, "rating_histogram": empty_histogram()
+        })
+        counters["rating_sum"] += key["rating"] * group["count"]
+        counters["rating_count"] += group["count"]
+        counters["rating_histogram"][rating_bucket(key["rating"])] += group["count"]
+    return expected
+
+
+def _drifted(provider: Dict[str, Any], counters: Dict[str, Any]) -> bool:
+    histogram = provider.get("rating_histogram") or {}
+    return (
+        provider.get("rating_count") != counters["rating_count"]
+        or abs((provider.get("rating_sum") or 0) - counters["rating_sum"]) > 1e-9
+        or any(histogram.get(star, 0) != counters["rating_histogram"][star] for star in RATING_STARS)
+        or provider.get("avg_rating") != average_rating(counters["rating_sum"], counters["rating_count"])
+        or provider.get("total_ratings") != counters["rating_count"]
+    )
+
+
+async def reconcile_provider_ratings() -> int:
+    """
+    Recompute every provider's rating counters from its reviews and correct
+    the providers that have drifted
+
+    Providers are read before the reviews are grouped, and each correction
+    only applies while the provider's counters are unchanged, so a review
+    written during the pass is not overwritten; any drift it leaves is
+    corrected by the next pass.
+
+    Returns:
+        int: Number of providers corrected
+    """
+    logger.info("Reconciling service provider ratings")
+    providers = await service_provider_collection.find({}, _COUNTER_PROJECTION).to_list(length=None)
+    expected = await _expected_counters()
+
+    operations: List[UpdateOne] = []
+    for provider in providers:
+        counters = expected.get(provider["_id"]) or {
+            "rating_sum": 0, "rating_count": 0, "rating_histogram": empty_histogram()
+        }
+        if not _drifted(provider, counters):
+            continue
+        operations.append(UpdateOne(
+            {
+                "_id": provider["_id"],
+                "rating_sum": provider.get("rating_sum"),
+                "rating_count": provider.get("rating_count")
+            },
+            {"$set": {
+                **counters,
+                "avg_rating": average_rating(counters["rating_sum"], counters["rating_count"]),
+                "total_ratings": counters["rating_count"]
+            }}
+        ))
+
+    corrected = 0
+    for start in range(0, len(operations), RATING_RECONCILE_BATCH_SIZE):
+        result = await service_provider_collection.bulk_write(
+            operations[start:start + RATING_RECONCILE_BATCH_SIZE], ordered=False
+        )
+        corrected += result.modified_count
+
+    logger.info(f"Reconciled ratings for {len(providers)} service providers, {corrected} corrected")
+    return corrected
+
+
+class RatingReconciler:
+    """
+    Background task that runs reconcile_provider_ratings() on an interval,
+    starting with a pass at startup
+    """
+
+    def __init__(self, interval: float = RATING_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="rating-reconciler")
+        logger.info(f"Rating reconciler started, interval {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Rating reconciler stopped")
+
+    async def _run(self):
+        while True:
+            try:
+                await reconcile_provider_ratings()
+            except Exception as e:
+                logger.error(f"Error reconciling service provider ratings: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+rating_reconciler = RatingReconciler()
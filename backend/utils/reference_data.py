@@ -0,0 +1,116 @@
+"""
+Process-wide cache of reference data: states, cities, areas, categories and
+sub-categories.
+
+These collections are small and rarely change, so each is loaded whole and
+held in memory keyed by string id. A collection is reloaded when it is older
+than REFERENCE_DATA_TTL seconds, or on next access after the controllers
+that write to it call invalidate_reference_data(). Documents are stored with
+ObjectIds serialized, and callers always get copies they are free to modify.
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.database import (
+    state_collection, city_collection, area_collection, category_collection, sub_category_collection
+)
+from utils.serialization import serialize_objectid
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_DATA_TTL = float(os.getenv("REFERENCE_DATA_TTL", 300))
+
+STATES = "states"
+CITIES = "cities"
+AREAS = "areas"
+CATEGORIES = "categories"
+SUB_CATEGORIES = "sub_categories"
+
+_COLLECTIONS = {
+    STATES: state_collection,
+    CITIES: city_collection,
+    AREAS: area_collection,
+    CATEGORIES: category_collection,
+    SUB_CATEGORIES: sub_category_collection,
+}
+
+
+class ReferenceDataCache:
+    def __init__(self, collections: Dict[str, Any], ttl: float = REFERENCE_DATA_TTL):
+        self._collections = collections
+        self.ttl = ttl
+        self._documents: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+
+    async def _load(self, kind: str):
+        documents = await self._collections[kind].find().to_list(length=None)
+        self._documents[kind] = {str(doc["_id"]): serialize_objectid(doc) for doc in documents}
+        self._loaded_at[kind] = time.monotonic()
+        self.loads += 1
+        logger.info(f"Loaded {len(documents)} {kind} into the reference data cache")
+
+    def _is_fresh(self, kind: str) -> bool:
+        loaded_at = self._loaded_at.get(kind)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    async def _table(self, kind: str) -> Dict[str, Dict[str, Any]]:
+        if not self._is_fresh(kind):
+            # One reload per collection at a time; concurrent callers wait for it
+            lock = self._locks.setdefault(kind, asyncio.Lock())
+            async with lock:
+                if not self._is_fresh(kind):
+                    await self._load(kind)
+        return self._documents[kind]
+
+    async def load_all(self):
+        """
+        Load every collection; called on application startup
+        """
+        await asyncio.gather(*(self._load(kind) for kind in self._collections))
+
+    def invalidate(self, kind: Optional[str] = None):
+        """
+        Force a reload of one collection (or all) on next access
+        """
+        for name in ([kind] if kind else list(self._loaded_at)):
+            self._loaded_at.pop(name, None)
+
+    async def get(self, kind: str, document_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Look up one document by id, or None if it does not exist
+        """
+        if not document_id:
+            return None
+        document = (await self._table(kind)).get(str(document_id))
+        return copy.deepcopy(document) if document else None
+
+    async def get_many(self, kind: str, document_ids: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Look up documents by id in the given order, skipping unknown ids
+        """
+        table = await self._table(kind)
+        return [copy.deepcopy(table[str(i)]) for i in document_ids if str(i) in table]
+
+    async def all(self, kind: str) -> List[Dict[str, Any]]:
+        return copy.deepcopy(list((await self._table(kind)).values()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "loads": self.loads,
+            "sizes": {kind: len(documents) for kind, documents in self._documents.items()}
+        }
+
+
+reference_data = ReferenceDataCache(_COLLECTIONS)
+
+
+def invalidate_reference_data(kind: Optional[str] = None):
+    reference_data.invalidate(kind)
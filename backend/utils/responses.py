@@ -0,0 +1,70 @@
+"""
+BSON-aware JSON responses.
+
+BSONJSONResponse renders documents exactly as Motor returns them: ObjectIds
+become strings and datetimes ISO 8601 strings wherever they occur, inside the
+encoder, so controllers no longer walk each document converting fields with
+str() before building the response. Rendering uses orjson when it is
+installed and the standard library json module otherwise.
+
+It is the application's default response class, and controllers return it
+directly when they need a custom status code.
+"""
+
+import datetime
+import json
+import logging
+import uuid
+from decimal import Decimal
+from typing import Any
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def bson_default(obj: Any) -> Any:
+    """
+    Convert values the JSON encoder does not handle natively
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, (Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=bson_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            default=bson_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+
+
+class BSONJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
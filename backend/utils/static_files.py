@@ -0,0 +1,47 @@
+"""
+Static file serving for uploaded images.
+
+Uploads (utils/uploads.py) and image derivatives (utils/image_derivatives.py)
+are stored under content-hash names, so a URL always refers to the same bytes.
+CachedStaticFiles serves them with a strong ETag derived from that hash and a
+one-year immutable Cache-Control, letting browsers and CDNs skip revalidation
+entirely. Any other file gets a short max-age and Starlette's default
+mtime/size ETag, so conditional requests still answer 304.
+"""
+
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", 3600))
+
+# <sha256>.<ext> from save_upload, <sha256 prefix>-<edge>.<ext> from render_derivatives
+CONTENT_ADDRESSED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{32,64})(?:-\d+)?\.[a-z0-9]+$")
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        match = CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path))
+        if match:
+            response.headers["etag"] = f'"{os.path.basename(full_path)}"'
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = f"public, max-age={STATIC_MAX_AGE}"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,163 @@
+"""
+Uploaded file storage.
+
+save_upload() copies an UploadFile to disk without blocking the event loop:
+the body is read in UPLOAD_CHUNK_SIZE chunks and each chunk is hashed and
+written to a temporary file in a worker thread. Reading stops as soon as the
+upload exceeds its size cap, and the temporary file is removed on any error,
+so a rejected or interrupted upload never leaves a partial file behind.
+
+Files are content-addressed: the stored name is the SHA-256 of the contents
+plus the extension, and the temporary file is renamed into place atomically
+(os.replace). Uploading the same image twice stores it once, and a file is
+never visible under its final name before it is complete.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "gif", "webp")
+
+
+class UploadError(ValueError):
+    """Base class for rejected uploads"""
+
+
+class UploadTooLargeError(UploadError):
+    """Raised when an upload exceeds its size cap"""
+
+
+class UnsupportedUploadError(UploadError):
+    """Raised when an upload is empty or has a disallowed file type"""
+
+
+def upload_extension(filename: Optional[str], allowed_extensions: Iterable[str] = IMAGE_EXTENSIONS) -> str:
+    """
+    Return the lower-cased extension of an uploaded file name
+
+    Raises:
+        UnsupportedUploadError: If the extension is missing or not allowed
+    """
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    if extension not in allowed_extensions:
+        raise UnsupportedUploadError(f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}")
+    return extension
+
+
+def upload_url(path: str) -> str:
+    """
+    Return the URL path a stored upload is served from
+    """
+    return "/" + path.replace(os.sep, "/").lstrip("/")
+
+
+def _too_large_message(max_size: int) -> str:
+    if max_size >= 1024 * 1024:
+        return f"File is larger than the {max_size / (1024 * 1024):g} MB limit"
+    return f"File is larger than the {max_size} byte limit"
+
+
+def _write_chunk(file, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+def _finish(file):
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+
+def _commit(temp_path: str, final_path: str) -> bool:
+    """
+    Move a completed upload into place; returns True if identical content
+    was already stored
+    """
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+        return True
+    os.replace(temp_path, final_path)
+    return False
+
+
+def _discard(temp_path: str):
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(
+    upload: UploadFile,
+    directory: str,
+    allowed_extensions: Iterable[str] = IMAGE_EXTENSIONS,
+    max_size: int = MAX_UPLOAD_SIZE
+) -> Dict[str, Any]:
+    """
+    Store an uploaded file under its content hash
+
+    Args:
+        upload: The uploaded file
+        directory: Directory to store it in, created if missing
+        allowed_extensions: Accepted file extensions
+        max_size: Size cap in bytes
+
+    Returns:
+        Dict[str, Any]: path, url, filename, sha256, size and whether the
+            content was already stored (deduplicated)
+
+    Raises:
+        UnsupportedUploadError: If the file type is not allowed or the file is empty
+        UploadTooLargeError: If the file is larger than max_size
+    """
+    extension = upload_extension(upload.filename, allowed_extensions)
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLargeError(_too_large_message(max_size))
+
+    await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    fd, temp_path = await asyncio.to_thread(tempfile.mkstemp, dir=directory, prefix=".upload-", suffix=".tmp")
+    temp_file = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(_too_large_message(max_size))
+            await asyncio.to_thread(_write_chunk, temp_file, digest, chunk)
+
+        await asyncio.to_thread(_finish, temp_file)
+        if size == 0:
+            raise UnsupportedUploadError("Uploaded file is empty")
+
+        filename = f"{digest.hexdigest()}.{extension}"
+        path = os.path.join(directory, filename)
+        deduplicated = await asyncio.to_thread(_commit, temp_path, path)
+    except BaseException:
+        temp_file.close()
+        await asyncio.shield(asyncio.to_thread(_discard, temp_path))
+        raise
+
+    logger.info(f"Stored upload {path} ({size} bytes{', already present' if deduplicated else ''})")
+    return {
+        "path": path,
+        "url": upload_url(path),
+        "filename": filename,
+        "sha256": digest.hexdigest(),
+        "size": size,
+        "deduplicated": deduplicated
+    }
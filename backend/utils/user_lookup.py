@@ -0,0 +1,134 @@
+"""
+Case-insensitive user lookup by email.
+
+Every user document carries an `email_normalized` field (the trimmed,
+lower-cased email) backed by a unique index, so finding a user by email is a
+single indexed point query however the address was typed. Code that inserts
+a user or changes its email sets the field with with_normalized_email();
+documents created before the field existed are filled in by
+backfill_email_normalized(), run from backfill_email_normalized.py or, when
+a quick check finds users without the field, on startup. Until then
+find_user_by_email() falls back to an exact match on `email` and fills in
+the field for the user it finds.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config.database import user_collection
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """
+    Canonical form of an email address used for lookups and uniqueness
+    """
+    if email is None:
+        return None
+    return str(email).strip().lower()
+
+
+def with_normalized_email(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Set email_normalized on a user document (or $set payload) that has an
+    email; returns the same dict
+    """
+    if document.get("email"):
+        document["email_normalized"] = normalize_email(document["email"])
+    return document
+
+
+async def find_user_by_email(email: Optional[str], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Find a user by email, ignoring case and surrounding whitespace
+    """
+    normalized = normalize_email(email)
+    if not normalized:
+        return None
+    user = await user_collection.find_one({"email_normalized": normalized}, projection)
+    if user is not None:
+        return user
+
+    # Users not backfilled yet only match on the address as stored
+    legacy = await user_collection.find_one(
+        {"email": {"$in": list({str(email).strip(), normalized})}, "email_normalized": {"$exists": False}},
+        projection
+    )
+    if legacy is not None:
+        try:
+            await user_collection.update_one(
+                {"_id": legacy["_id"], "email_normalized": {"$exists": False}},
+                {"$set": {"email_normalized": normalized}}
+            )
+        except DuplicateKeyError:
+            logger.warning(f"Email {normalized} is already held by another user ignoring case")
+    return legacy
+
+
+async def backfill_email_normalized() -> Dict[str, Any]:
+    """
+    Set email_normalized on users that are missing it or have a stale value.
+
+    When several users share an address that differs only in case, the oldest
+    keeps it and the others are left without the field and reported, since
+    they cannot all hold it under the unique index.
+
+    Returns:
+        dict: Number of users "updated" and the ids of "conflicts" per address
+    """
+    owners: Dict[str, Any] = {}
+    conflicts: Dict[str, List[str]] = {}
+    unsets: List[UpdateOne] = []
+    sets: List[UpdateOne] = []
+
+    cursor = user_collection.find(
+        {"email": {"$type": "string"}}, {"email": 1, "email_normalized": 1}
+    ).sort("_id", 1)
+    async for user in cursor:
+        normalized = normalize_email(user["email"])
+        if not normalized:
+            continue
+
+        if normalized in owners:
+            conflicts.setdefault(normalized, [str(owners[normalized])]).append(str(user["_id"]))
+            if "email_normalized" in user:
+                unsets.append(UpdateOne({"_id": user["_id"]}, {"$unset": {"email_normalized": ""}}))
+            continue
+        owners[normalized] = user["_id"]
+
+        if user.get("email_normalized") != normalized:
+            sets.append(UpdateOne({"_id": user["_id"]}, {"$set": {"email_normalized": normalized}}))
+
+    # Release values held by conflicting users before handing them to the owners
+    updated = 0
+    operations = unsets + sets
+    for start in range(0, len(operations), BACKFILL_BATCH_SIZE):
+        result = await user_collection.bulk_write(operations[start:start + BACKFILL_BATCH_SIZE])
+        updated += result.modified_count
+
+    for email, user_ids in conflicts.items():
+        logger.warning(f"Users share the email {email} ignoring case, only {user_ids[0]} can sign in with it: {', '.join(user_ids)}")
+
+    return {"updated": updated, "conflicts": conflicts}
+
+
+async def backfill_email_normalized_if_needed() -> Optional[Dict[str, Any]]:
+    """
+    Run backfill_email_normalized() only if some user with an email lacks
+    email_normalized, so a backfilled database is not scanned on every start
+
+    Returns:
+        Optional[dict]: The backfill result, or None if nothing was missing
+    """
+    missing = await user_collection.count_documents(
+        {"email": {"$type": "string"}, "email_normalized": {"$exists": False}}, limit=1
+    )
+    if not missing:
+        return None
+    return await backfill_email_normalized()
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { FaUsers, FaSearch, FaSync } from 'react-icons/fa';
 import AdminSidebar from '../layouts/AdminSidebar';
-import axios from 'axios';
+import { getAllPages } from '../../services/pagination';
 import { toast, ToastContainer } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import './adminStyles.css';
@@ -31,7 +31,8 @@ export const AdminCustomers = () => {
       for (const endpoint of apiEndpoints) {
         try {
           console.log(`Trying API endpoint: ${endpoint}`);
-          response = await axios.get(endpoint, {
+          // The list is paginated; follow the cursor so every user is loaded
+          response = await getAllPages(endpoint, {
             headers: {
               'Accept': 'application/json',
               'Content-Type': 'application/json'
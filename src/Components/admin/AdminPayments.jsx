@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { FaMoneyBill, FaSearch, FaSync, FaFileExport } from 'react-icons/fa';
 import AdminSidebar from '../layouts/AdminSidebar';
-import axios from 'axios';
+import { getAllPages } from '../../services/pagination';
 import { toast, ToastContainer } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import './adminStyles.css'; // Import CSS if it exists (or we'll create it)
@@ -20,7 +20,8 @@ export const AdminPayments = () => {
     setLoading(true);
     try {
       console.log('Fetching payments from API...');
-      const response = await axios.get('http://localhost:8000/api/payments', {
+      // The list is paginated; follow the cursor so every payment is loaded
+      const response = await getAllPages('http://localhost:8000/api/payments', {
         headers: {
           'Accept': 'application/json',
           'Content-Type': 'application/json'
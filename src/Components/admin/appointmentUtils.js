@@ -2,6 +2,8 @@
  * Utility functions for handling appointments
  */
 
+import { getAllPages } from '../../services/pagination';
+
 // Mock data for when API fails
 const MOCK_APPOINTMENTS = [
   {
@@ -77,18 +79,15 @@ export async function fetchAppointments() {
     // Use the dedicated admin appointments endpoint
     const url = 'http://localhost:8000/api/bookings/admin/appointments';
     
-    const response = await fetch(url, {
+    // The list is paginated; follow the cursor so every appointment is loaded
+    const response = await getAllPages(url, {
+      itemsKey: 'bookings',
       headers: {
         'Accept': 'application/json'
       }
     });
     
-    if (!response.ok) {
-      console.warn(`API request failed with status ${response.status}`);
-      throw new Error(`API request failed with status ${response.status}`);
-    }
-    
-    const data = await response.json();
+    const data = response.data;
     
     // Check if the response has the expected structure
     if (data && data.bookings && Array.isArray(data.bookings)) {
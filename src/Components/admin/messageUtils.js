@@ -2,12 +2,28 @@
  * Utility functions for handling contact messages
  */
 
+import { getAllPages } from '../../services/pagination';
+
 // Fetch messages from the API
 export async function fetchMessages() {
   console.log('Fetching messages from API...');
   
   try {
-    // Try debug endpoint first
+    // The main endpoint is paginated; follow the cursor so every message is loaded
+    const response = await getAllPages('http://localhost:8000/api/contact/', {
+      itemsKey: 'contact_messages',
+      headers: {
+        'Accept': 'application/json'
+      }
+    });
+    
+    return processData(response.data);
+  } catch (error) {
+    console.warn(`Main endpoint failed: ${error.message}. Trying debug endpoint...`);
+  }
+  
+  try {
+    // Try debug endpoint as fallback
     const debugResponse = await fetch('http://localhost:8000/api/contact/debug', {
       headers: {
         'Accept': 'application/json'
@@ -15,20 +31,7 @@ export async function fetchMessages() {
     });
     
     if (!debugResponse.ok) {
-      console.warn(`Debug endpoint failed with status ${debugResponse.status}`);
-      
-      // Try main endpoint as fallback
-      const mainResponse = await fetch('http://localhost:8000/api/contact/', {
-        headers: {
-          'Accept': 'application/json'
-        }
-      });
-      
-      if (!mainResponse.ok) {
-        throw new Error(`All endpoints failed. Main endpoint returned ${mainResponse.status}`);
-      }
-      
-      return processResponse(await mainResponse.text());
+      throw new Error(`All endpoints failed. Debug endpoint returned ${debugResponse.status}`);
     }
     
     return processResponse(await debugResponse.text());
@@ -66,38 +69,41 @@ function processResponse(responseText) {
     }
     
     // Parse the response
-    const data = JSON.parse(fixedText);
-    
-    // Check if the response has the expected structure
-    if (data && data.contact_messages && Array.isArray(data.contact_messages)) {
-      console.log(`Found ${data.contact_messages.length} messages in response`);
-      
-      return {
-        messages: formatMessages(data.contact_messages),
-        count: data.count || data.contact_messages.length,
-        status: data.status
-      };
-    } else {
-      console.warn('Unexpected API response format:', data);
-      
-      // Try to extract messages if data is an array directly
-      if (Array.isArray(data)) {
-        console.log('Response appears to be a direct array of messages');
-        return {
-          messages: formatMessages(data),
-          count: data.length,
-          status: true
-        };
-      }
-      
-      throw new Error('API response does not contain message data in expected format');
-    }
+    return processData(JSON.parse(fixedText));
   } catch (error) {
     console.error('Error processing response:', error);
     throw error;
   }
 }
 
+// Extract the messages from parsed response data
+function processData(data) {
+  // Check if the response has the expected structure
+  if (data && data.contact_messages && Array.isArray(data.contact_messages)) {
+    console.log(`Found ${data.contact_messages.length} messages in response`);
+    
+    return {
+      messages: formatMessages(data.contact_messages),
+      count: data.count || data.contact_messages.length,
+      status: data.status
+    };
+  }
+  
+  console.warn('Unexpected API response format:', data);
+  
+  // Try to extract messages if data is an array directly
+  if (Array.isArray(data)) {
+    console.log('Response appears to be a direct array of messages');
+    return {
+      messages: formatMessages(data),
+      count: data.length,
+      status: true
+    };
+  }
+  
+  throw new Error('API response does not contain message data in expected format');
+}
+
 // Format messages for display
 function formatMessages(messages) {
   return messages.map(msg => ({
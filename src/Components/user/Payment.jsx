@@ -243,8 +243,11 @@ export const Payment = () => {
           updated_at: new Date().toISOString()
         };
         
-        // First, create the payment record
-        const createResponse = await axios.post('/api/payments/', paymentData);
+        // First, create the payment record; keyed on the Razorpay payment so a
+        // retried request returns the same record instead of a duplicate
+        const createResponse = await axios.post('/api/payments/', paymentData, {
+          headers: { 'Idempotency-Key': response.razorpay_payment_id }
+        });
         console.log("Payment saved to database:", createResponse.data);
         
         // Then, verify the payment with Razorpay
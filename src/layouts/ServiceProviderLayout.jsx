@@ -26,6 +26,16 @@ const ServiceProviderLayout = () => {
     document.body.classList.add('dark-mode');
   }, []);
 
+  useEffect(() => {
+    const user = AuthService.getCurrentUser();
+    if (!user || typeof EventSource === 'undefined') return;
+
+    // New notifications are pushed by the server instead of polled
+    const events = new EventSource(`${import.meta.env.VITE_API_URL || ''}/events/user/${user.id}`);
+    events.addEventListener('notification', () => setUnreadNotifications((count) => count + 1));
+    return () => events.close();
+  }, []);
+
   const fetchProfile = async () => {
     try {
       // Get user from AuthService instead of localStorage
@@ -48,7 +58,7 @@ const ServiceProviderLayout = () => {
       const user = AuthService.getCurrentUser();
       if (!user) return;
       
-      const response = await axios.get(`${import.meta.env.VITE_API_URL || ''}/notifications/${user.id}/unread-count`);
+      const response = await axios.get(`${import.meta.env.VITE_API_URL || ''}/notifications/user/${user.id}/unread-count`);
       if (response.data) {
         setUnreadNotifications(response.data.count || 0);
       }
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { getAllPages } from './pagination';
 
 const BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 const API_URL = `${BASE_URL}/api`; // Add /api prefix
@@ -200,7 +201,7 @@ const AuthService = {
   // GET - Get all users (admin only)
   getAllUsers: async () => {
     try {
-      const response = await axios.get(`${API_URL}/users`);
+      const response = await getAllPages(`${API_URL}/users`);
       return response.data;
     } catch (error) {
       throw error.response?.data || { message: 'Error fetching users' };
@@ -0,0 +1,51 @@
+import axios from 'axios';
+
+// Page size requested from cursor-paginated list endpoints (the backend caps it at 500)
+export const PAGE_SIZE = 500;
+
+/**
+ * GET every page of a cursor-paginated list endpoint.
+ *
+ * Endpoints that return a bare array pass the next page's cursor in the
+ * X-Next-Cursor header; envelope responses carry it as next_cursor, next to
+ * the list stored under `itemsKey`.
+ *
+ * @param {string} url - The list endpoint
+ * @param {Object} options - axios request config, plus itemsKey for envelope responses
+ * @returns {Promise<Object>} The first page's axios response, its data holding the items of every page
+ */
+export async function getAllPages(url, { itemsKey, ...config } = {}) {
+  let result = null;
+  let cursor = null;
+
+  do {
+    const response = await axios.get(url, {
+      ...config,
+      params: { ...config.params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+    });
+    const data = response.data;
+    const items = Array.isArray(data) ? data : data?.[itemsKey];
+
+    if (!Array.isArray(items)) {
+      // Not a list response; hand the first one back to the caller as is
+      return result || response;
+    }
+
+    if (result === null) {
+      result = response;
+      result.data = Array.isArray(data) ? [...items] : { ...data, [itemsKey]: [...items] };
+    } else {
+      (Array.isArray(result.data) ? result.data : result.data[itemsKey]).push(...items);
+    }
+
+    cursor = response.headers['x-next-cursor'] || (!Array.isArray(data) && data.next_cursor) || null;
+  } while (cursor);
+
+  if (!Array.isArray(result.data)) {
+    result.data.next_cursor = null;
+    if ('count' in result.data) {
+      result.data.count = result.data[itemsKey].length;
+    }
+  }
+  return result;
+}